@@ -1,9 +1,16 @@
 import ccxt.pro as ccxtpro
 import asyncio
+import copy
 import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Tuple
 
 class AccountManager:
-    def __init__(self, exchange_id='binance', api_key=None, secret_key=None, password=None, config=None):
+    MAX_TERMINAL_FILLS = 10_000
+
+    def __init__(self, exchange_id='binance', api_key=None, secret_key=None, password=None, config=None,
+                 exchange=None, exchange_pool=None, sandbox_mode: bool = False, balance_max_staleness: float = 5.0, balance_poll_interval: float = 2.0):
         """
         初始化 AccountManager。
 
@@ -13,11 +20,33 @@ class AccountManager:
         :param password: API password (某些交易所需要，如 kucoin, okx)
         :param config: 一个包含交易所特定参数的字典，例如 {'apiKey': ..., 'secret': ..., 'password': ...}
                        如果提供了 config，则会优先使用它。
+        :param exchange: 可选，直接使用已创建的交易所对象 (例如测试用的假交易所)，此时忽略其他连接参数。
+        :param exchange_pool: 可选的 ExchangePool。提供时从池中获取与其他组件共享的实例，close() 时只释放引用。
+        :param sandbox_mode: 是否使用沙箱/测试网 (与 OrderExecutor 相同，共享实例时需与其保持一致)。
+        :param balance_max_staleness: 轮询或 watch_balance 出错 (降级) 时余额缓存的最长有效时间 (秒)，超过后
+                                      get_cached_balance 会重新 fetch_balance。watch_balance 正常运行时缓存始终有效。
+        :param balance_poll_interval: 交易所不支持 watch_balance 时，后台轮询 fetch_balance 的间隔 (秒)。
         """
-        if exchange_id not in ccxtpro.exchanges:
-            raise ValueError(f"不支持的交易所: {exchange_id}. 可用交易所: {', '.join(ccxtpro.exchanges)}")
+        # 余额缓存: 最近一次余额快照 ({'free': {...}, 'used': {...}, 'total': {...}}) 及其更新时间 (time.monotonic)
+        self.balance_max_staleness = balance_max_staleness
+        self.balance_poll_interval = balance_poll_interval
+        self._balance_cache: Optional[Dict[str, Any]] = None
+        self._balance_updated_at: Optional[float] = None
+        self._balance_sync_task: Optional[asyncio.Task] = None
+        # watch_balance 推送流正常运行 (未出错) 时为True。交易所只在余额变化时推送，安静期间缓存仍然是最新的
+        self._balance_streaming = False
+        self._applied_fills: Dict[str, Tuple[float, float]] = {} # 未终结订单: order_id -> 已计入缓存的 (成交数量, 手续费)
+        # 已终结订单的最终 (成交数量, 手续费)，按LRU保留最近 MAX_TERMINAL_FILLS 个，使重复的终结回报 (例如
+        # create_order 的返回值与 watch_orders 的回显) 不会被再次计入
+        self._terminal_fills: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._exchange_pool = exchange_pool
+
+        if exchange is not None:
+            self.exchange = exchange
+            return
 
-        exchange_class = getattr(ccxtpro, exchange_id)
+        if exchange_pool is None and exchange_id not in ccxtpro.exchanges:
+            raise ValueError(f"不支持的交易所: {exchange_id}. 可用交易所: {', '.join(ccxtpro.exchanges)}")
 
         exchange_config = {
             'enableRateLimit': True,
@@ -42,7 +71,13 @@ class AccountManager:
             if final_password: # 只有在提供时才添加 password
                  exchange_config['password'] = final_password
 
-        self.exchange = exchange_class(exchange_config)
+        if exchange_pool is not None:
+            self.exchange = exchange_pool.acquire(exchange_id, exchange_config, sandbox=sandbox_mode)
+        else:
+            self.exchange = getattr(ccxtpro, exchange_id)(exchange_config)
+            if sandbox_mode:
+                from exchange_pool import ExchangePool
+                ExchangePool._apply_sandbox(self.exchange)
 
     async def get_balance(self):
         """
@@ -59,6 +94,7 @@ class AccountManager:
 
         try:
             balance = await self.exchange.fetch_balance()
+            self._store_balance(balance)
             return balance
         except ccxtpro.AuthenticationError as e:
             print(f"获取余额时发生认证错误: {e}. 请检查您的 API Key 和 Secret 是否正确且具有查询权限。")
@@ -73,11 +109,154 @@ class AccountManager:
             print(f"获取余额时发生未知错误: {e}")
             return None
 
+    # --- 余额缓存 ---
+
+    def _store_balance(self, balance: Optional[Dict[str, Any]]):
+        """用交易所返回的权威余额替换缓存。"""
+        if not balance:
+            return
+        self._balance_cache = {key: dict(balance.get(key) or {}) for key in ('free', 'used', 'total')}
+        self._balance_updated_at = time.monotonic()
+
+    def balance_age(self) -> Optional[float]:
+        """缓存距上次权威更新的秒数；没有缓存时返回None。"""
+        if self._balance_updated_at is None:
+            return None
+        return time.monotonic() - self._balance_updated_at
+
+    async def get_cached_balance(self, max_staleness: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        返回进程内的余额快照，供下单前的风险检查使用。
+        watch_balance 推送流正常运行时直接返回缓存，不论距上次推送多久 (交易所只在余额变化时推送)。
+        轮询或推送流出错时，缓存不存在或超过 max_staleness (默认 balance_max_staleness) 秒未更新，
+        则退回到 get_balance() 并刷新缓存。
+
+        :return: 余额字典的拷贝 (包含 'free', 'used', 'total')，获取失败时返回None。
+        """
+        bound = self.balance_max_staleness if max_staleness is None else max_staleness
+        age = self.balance_age()
+        if self._balance_cache is None or (not self._balance_streaming and (age is None or age > bound)):
+            if await self.get_balance() is None:
+                return None
+        return copy.deepcopy(self._balance_cache)
+
+    def apply_fill(self, order: Dict[str, Any]):
+        """
+        根据本地收到的成交乐观地更新余额缓存，下一次权威快照 (watch_balance 或轮询) 会覆盖这里的估算。
+        同一订单多次调用时只计入新增的成交数量和手续费 (ccxt 订单中的 filled 和 fee 都是累计值)。
+
+        :param order: ccxt 订单结构，需要 'id', 'symbol', 'side', 'filled'，以及 'average' 或 'price'。
+        """
+        if self._balance_cache is None:
+            return
+        order_id = order.get('id')
+        symbol = order.get('symbol') or ''
+        filled = order.get('filled') or 0.0
+        price = order.get('average') or order.get('price')
+        if not order_id or '/' not in symbol or not price:
+            return
+
+        fee = order.get('fee') or {}
+        fee_cost = fee.get('cost') or 0.0
+        applied = self._terminal_fills.get(order_id)
+        if applied is not None: # 已终结订单的重复回报
+            self._terminal_fills.move_to_end(order_id)
+            applied_filled, applied_fee = applied
+        else:
+            applied_filled, applied_fee = self._applied_fills.get(order_id, (0.0, 0.0))
+        final = (max(filled, applied_filled), max(fee_cost, applied_fee))
+        if order.get('status') in ('closed', 'canceled', 'rejected', 'expired'):
+            self._applied_fills.pop(order_id, None)
+            self._terminal_fills[order_id] = final
+            self._terminal_fills.move_to_end(order_id)
+            if len(self._terminal_fills) > self.MAX_TERMINAL_FILLS:
+                self._terminal_fills.popitem(last=False)
+        else:
+            self._applied_fills[order_id] = final
+        delta = filled - applied_filled
+        fee_delta = fee_cost - applied_fee
+        if delta <= 0 and fee_delta <= 0:
+            return
+
+        base, quote = symbol.split(':')[0].split('/')
+        sign = 1.0 if order.get('side') == 'buy' else -1.0
+        changes = {base: sign * max(delta, 0.0), quote: -sign * max(delta, 0.0) * price}
+        if fee_delta > 0 and fee.get('currency') in changes:
+            changes[fee['currency']] -= fee_delta
+
+        for currency, change in changes.items():
+            for key in ('free', 'total'):
+                bucket = self._balance_cache[key]
+                bucket[currency] = (bucket.get(currency) or 0.0) + change
+
+    async def _watch_balance_loop(self):
+        retry_delay = 1.0
+        self._balance_streaming = True # start_balance_sync 刚取过完整快照，之后的变化由推送送达
+        try:
+            while True:
+                try:
+                    self._store_balance(await self.exchange.watch_balance())
+                    self._balance_streaming = True
+                    retry_delay = 1.0
+                except asyncio.CancelledError:
+                    raise
+                except ccxtpro.AuthenticationError as e:
+                    self._balance_streaming = False
+                    print(f"AccountManager: watch_balance 认证失败: {e}. 改为轮询 fetch_balance。")
+                    await self._poll_balance_loop()
+                    return
+                except Exception as e:
+                    # 降级: 重新收到推送之前，缓存按 balance_max_staleness 判断是否过期
+                    self._balance_streaming = False
+                    print(f"AccountManager: watch_balance 出错: {type(e).__name__}: {e}. {retry_delay}s 后重试...")
+                    await asyncio.sleep(retry_delay)
+                    retry_delay = min(retry_delay * 2, 60.0)
+        finally:
+            self._balance_streaming = False
+
+    async def _poll_balance_loop(self):
+        while True:
+            await asyncio.sleep(self.balance_poll_interval)
+            await self.get_balance() # 成功时自动刷新缓存，失败时保留旧快照 (随后由 staleness 限制触发同步获取)
+
+    async def start_balance_sync(self) -> Optional[asyncio.Task]:
+        """
+        启动后台余额同步：交易所支持 watch_balance 时使用 WebSocket 推送，否则按 balance_poll_interval 轮询。
+
+        :return: 后台任务；未配置 API Key 时返回None。
+        """
+        if not self.exchange.apiKey or not self.exchange.secret:
+            print("AccountManager: API Key 未配置，不启动余额同步。")
+            return None
+        if self._balance_sync_task and not self._balance_sync_task.done():
+            return self._balance_sync_task
+
+        await self.get_balance() # 先取一次完整快照，避免启动后的第一笔订单等待推送
+        if self.exchange.has.get('watchBalance') and hasattr(self.exchange, 'watch_balance'):
+            print(f"AccountManager ({self.exchange.id}): 通过 watch_balance 同步余额。")
+            self._balance_sync_task = asyncio.create_task(self._watch_balance_loop())
+        else:
+            print(f"AccountManager ({self.exchange.id}): 不支持 watch_balance，每 {self.balance_poll_interval}s 轮询 fetch_balance。")
+            self._balance_sync_task = asyncio.create_task(self._poll_balance_loop())
+        return self._balance_sync_task
+
+    async def stop_balance_sync(self):
+        task, self._balance_sync_task = self._balance_sync_task, None
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
     async def close(self):
         """
         关闭交易所连接。
         """
-        if hasattr(self.exchange, 'close'):
+        await self.stop_balance_sync()
+        if self._exchange_pool is not None:
+            await self._exchange_pool.release(self.exchange)
+        elif hasattr(self.exchange, 'close'):
             await self.exchange.close()
 
 # 简单使用示例
@@ -136,8 +315,82 @@ async def main_example():
             await manager.close()
             print("\n交易所连接已关闭。")
 
+async def balance_cache_demo():
+    """离线演示余额缓存：使用只支持 fetch_balance 的假交易所，对比每次下单前 REST 查询与读取缓存。"""
+    class FakeExchange:
+        id = 'fake'
+        apiKey = 'key'
+        secret = 'secret'
+        has = {'fetchBalance': True, 'watchBalance': False}
+
+        def __init__(self):
+            self.fetch_calls = 0
+
+        async def fetch_balance(self):
+            self.fetch_calls += 1
+            await asyncio.sleep(0.05) # 模拟一次 REST 往返
+            return {'free': {'USDT': 1000.0, 'BTC': 0.0}, 'used': {}, 'total': {'USDT': 1000.0, 'BTC': 0.0}}
+
+        async def close(self):
+            pass
+
+    fake = FakeExchange()
+    manager = AccountManager(exchange=fake, balance_max_staleness=5.0, balance_poll_interval=1.0)
+    t0 = time.perf_counter()
+    for _ in range(5): await manager.get_balance()
+    rest_s = time.perf_counter() - t0
+
+    await manager.start_balance_sync()
+    t0 = time.perf_counter()
+    for _ in range(5): await manager.get_cached_balance()
+    cached_s = time.perf_counter() - t0
+    print(f"5 pre-trade balance reads: REST {rest_s * 1000:.1f} ms vs cache {cached_s * 1000:.3f} ms")
+
+    manager.apply_fill({'id': '1', 'symbol': 'BTC/USDT', 'side': 'buy', 'status': 'open', 'filled': 0.01, 'average': 20000.0})
+    manager.apply_fill({'id': '1', 'symbol': 'BTC/USDT', 'side': 'buy', 'status': 'closed', 'filled': 0.02, 'average': 20000.0,
+                        'fee': {'cost': 0.4, 'currency': 'USDT'}})
+    print(f"After optimistic fills: free={(await manager.get_cached_balance())['free']}")
+
+    # 同一笔已成交订单先由 create_order 的返回值、再由 watch_orders 的回显各计入一次，第二次应无影响
+    closed_order = {'id': '2', 'symbol': 'BTC/USDT', 'side': 'buy', 'status': 'closed', 'filled': 0.01, 'average': 20000.0,
+                    'fee': {'cost': 0.2, 'currency': 'USDT'}}
+    before = (await manager.get_cached_balance())['free']
+    manager.apply_fill(closed_order)
+    after_first = (await manager.get_cached_balance())['free']
+    manager.apply_fill(dict(closed_order))
+    after_second = (await manager.get_cached_balance())['free']
+    print(f"Closed order applied twice: free={after_second} "
+          f"(USDT -{before['USDT'] - after_first['USDT']:.1f} once, duplicate ignored: {after_first == after_second})")
+    await manager.close()
+    print(f"fetch_balance calls: {fake.fetch_calls}")
+
+    class FakeStreamingExchange(FakeExchange):
+        """支持 watch_balance，但余额不变时不推送；fail_stream 置位后推送流出错。"""
+        has = {'fetchBalance': True, 'watchBalance': True}
+        fail_stream = False
+
+        async def watch_balance(self):
+            while not self.fail_stream:
+                await asyncio.sleep(0.01)
+            raise ccxtpro.NetworkError("simulated disconnect")
+
+    streaming = FakeStreamingExchange()
+    manager = AccountManager(exchange=streaming, balance_max_staleness=0.1)
+    await manager.start_balance_sync()
+    await asyncio.sleep(0.3) # 安静期长于 balance_max_staleness
+    calls_before = streaming.fetch_calls
+    await manager.get_cached_balance()
+    print(f"Healthy watch_balance, quiet for 3x max staleness: fetch_balance calls {streaming.fetch_calls - calls_before} (expect 0)")
+    streaming.fail_stream = True
+    await asyncio.sleep(0.05)
+    calls_before = streaming.fetch_calls
+    await manager.get_cached_balance()
+    print(f"Degraded watch_balance with a stale cache: fetch_balance calls {streaming.fetch_calls - calls_before} (expect 1)")
+    await manager.close()
+
 if __name__ == '__main__':
     try:
+        asyncio.run(balance_cache_demo())
         asyncio.run(main_example())
     except KeyboardInterrupt:
         print("\n程序被用户中断。")
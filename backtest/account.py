@@ -1,7 +1,10 @@
+import math
 from typing import Dict, List, Tuple, Optional
 from collections import defaultdict
 import pandas as pd # For equity curve DataFrame
 
+from .record_buffer import EquityCurveBuffer, TradeHistoryBuffer
+
 class SimulatedAccount:
     """
     模拟账户，用于在回测过程中跟踪资产、持仓和盈亏。
@@ -34,9 +37,18 @@ class SimulatedAccount:
         self.realized_pnl_per_symbol: Dict[str, float] = defaultdict(float)
         self.total_realized_pnl: float = 0.0
 
-        self.trade_history: List[Dict] = []
+        # 成交记录和权益曲线保存在可增长的 NumPy 结构化数组中 (用法与 list 相同)，长回测中不再为每条记录分配 dict/tuple
+        self.trade_history = TradeHistoryBuffer()
         # 权益曲线: [(timestamp, total_equity_value)]
-        self.equity_curve: List[Tuple[int, float]] = [(0, initial_balance)] # Start with initial balance at time 0 or first bar time
+        self.equity_curve = EquityCurveBuffer()
+        self.equity_curve.append((0, initial_balance)) # Start with initial balance at time 0 or first bar time
+
+        # 逐交易对的最新价格和持仓市值，增量维护组合市值总和: 每根K线只更新该交易对的差值，O(1)
+        self._last_prices: Dict[str, float] = {}
+        self._market_values: Dict[str, float] = {}  # {symbol: quantity * last_price}
+        self._entry_values: Dict[str, float] = {}   # {symbol: quantity * avg_entry_price}
+        self._market_value_total: float = 0.0
+        self._entry_value_total: float = 0.0
 
         print(f"SimulatedAccount initialized: Balance={self.initial_balance} {self.quote_currency}, FeeRate={self.fee_rate*100:.2f}%")
 
@@ -52,6 +64,49 @@ class SimulatedAccount:
         """返回指定符号的当前持仓平均入场价格。"""
         return self.positions[symbol]['avg_entry_price']
 
+    def mark_price(self, symbol: str, price: float):
+        """
+        更新交易对的最新价格，并把其持仓市值的变化计入组合市值总和 (O(1)，不遍历其他持仓)。
+        """
+        self._last_prices[symbol] = price
+        pos_details = self.positions.get(symbol)
+        if pos_details is not None and (pos_details['quantity'] != 0 or symbol in self._market_values):
+            self._revalue(symbol)
+
+    def _revalue(self, symbol: str):
+        """持仓数量或价格变化后，重新计算单个交易对的市值/入场价值，并把差值计入总和。"""
+        pos_details = self.positions[symbol]
+        qty = pos_details['quantity']
+        market_value = qty * self._last_prices[symbol]
+        entry_value = qty * pos_details['avg_entry_price']
+        self._market_value_total += market_value - self._market_values.get(symbol, 0.0)
+        self._entry_value_total += entry_value - self._entry_values.get(symbol, 0.0)
+        if qty != 0:
+            self._market_values[symbol] = market_value
+            self._entry_values[symbol] = entry_value
+        else: # 平仓后不再参与估值，并按剩余持仓重新求和，避免增量更新累积的浮点误差
+            self._market_values.pop(symbol, None)
+            self._entry_values.pop(symbol, None)
+            self._market_value_total = math.fsum(self._market_values.values())
+            self._entry_value_total = math.fsum(self._entry_values.values())
+
+    @property
+    def unrealized_pnl(self) -> float:
+        """按各交易对最新价格计算的未实现盈亏总和 (不含手续费)。"""
+        return self._market_value_total - self._entry_value_total
+
+    def get_equity(self) -> float:
+        """当前总权益 = 余额 + 所有持仓按最新价格计算的市值 (空头市值为负)。"""
+        return self.current_balance + self._market_value_total
+
+    def get_market_value_per_symbol(self) -> Dict[str, float]:
+        """各未平仓交易对按最新价格计算的持仓市值 {symbol: quantity * last_price}。"""
+        return dict(self._market_values)
+
+    def get_unrealized_pnl_per_symbol(self) -> Dict[str, float]:
+        """各未平仓交易对按最新价格计算的未实现盈亏。"""
+        return {symbol: value - self._entry_values[symbol] for symbol, value in self._market_values.items()}
+
     def update_on_fill(self,
                        timestamp: int, # Fill timestamp
                        symbol: str,
@@ -109,6 +164,7 @@ class SimulatedAccount:
                     qty_opened_long = filled_qty - abs(current_qty)
                     pos_details['total_cost_basis'] = qty_opened_long * avg_fill_price # 新多头的成本基础
                     pos_details['avg_entry_price'] = avg_fill_price # 新多头的平均价格
+                    new_quantity = qty_opened_long
                 elif new_quantity == 0: # 空仓完全平掉
                      pos_details['avg_entry_price'] = 0.0
                      pos_details['total_cost_basis'] = 0.0
@@ -134,6 +190,7 @@ class SimulatedAccount:
                     qty_opened_short = filled_qty - current_qty
                     pos_details['total_cost_basis'] = qty_opened_short * avg_fill_price # 新空头的“收入”基础
                     pos_details['avg_entry_price'] = avg_fill_price # 新空头的平均价格
+                    new_quantity = -qty_opened_short
                 elif new_quantity == 0: # 多仓完全平掉
                     pos_details['avg_entry_price'] = 0.0
                     pos_details['total_cost_basis'] = 0.0
@@ -146,6 +203,9 @@ class SimulatedAccount:
 
             pos_details['quantity'] = new_quantity
 
+        self._last_prices.setdefault(symbol, avg_fill_price) # 还没有行情时以成交价估值
+        self._revalue(symbol)
+
         if pnl_this_trade != 0.0:
             self.realized_pnl_per_symbol[symbol] += pnl_this_trade
             self.total_realized_pnl += pnl_this_trade
@@ -170,59 +230,16 @@ class SimulatedAccount:
     def record_equity(self, timestamp: int, current_market_prices: Optional[Dict[str, float]] = None):
         """
         记录当前时间的账户总权益。
-        总权益 = 当前余额 + 所有持仓的当前市值 - (如果是空头，则为开仓时的名义价值)
+        总权益 = 当前余额 + 所有持仓按各自最新价格计算的市值 (空头数量为负，市值也为负)。
 
         :param timestamp: 当前时间戳。
-        :param current_market_prices: 可选，一个字典 {symbol: current_price}，用于计算未实现盈亏。
-                                      如果未提供，则未实现PnL部分无法精确计算，总权益可能只反映已实现部分。
+        :param current_market_prices: 可选，一个字典 {symbol: current_price}，先用这些价格更新对应交易对的最新价格。
+                                      未出现在其中的交易对沿用上一次的价格，因此组合中的其他持仓不会从权益中消失。
         """
-        unrealized_pnl = 0.0
-        total_position_market_value = 0.0
-
         if current_market_prices:
-            for symbol, pos_details in self.positions.items():
-                qty = pos_details['quantity']
-                if qty != 0 and symbol in current_market_prices:
-                    market_price = current_market_prices[symbol]
-                    avg_entry = pos_details['avg_entry_price']
-
-                    if qty > 0: # Long position
-                        total_position_market_value += qty * market_price
-                        # unrealized_pnl += (market_price - avg_entry) * qty # Simple PnL
-                    elif qty < 0: # Short position
-                        total_position_market_value += qty * market_price # This will be negative value
-                        # unrealized_pnl += (avg_entry - market_price) * abs(qty) # Simple PnL
-        else: # If no market prices, estimate position value at cost basis for equity calc (no unrealized PnL)
-            for symbol, pos_details in self.positions.items():
-                 # total_value_at_entry for longs is positive cost, for shorts is positive "proceeds"
-                 # If long, it's an asset. If short, it's a liability reflected by avg_entry_price.
-                 # This part is tricky without current market prices.
-                 # A simpler equity without live prices: balance + sum of (qty * avg_entry_price for longs) - sum of (abs(qty) * avg_entry_price for shorts)
-                 # This is essentially (balance + realized_pnl + total_entry_cost_basis for longs - total_entry_cost_basis for shorts)
-                 # For now, let's use a simpler equity calculation if no market_prices:
-                 # Just use current_balance + total_realized_pnl as a proxy if market prices are unavailable.
-                 # This isn't true equity but a measure of cash + realized gains.
-                 pass
-
-
-        # More accurate equity = current_balance + sum of (current_qty * current_market_price) for all symbols
-        # This is complex if current_market_prices are not available for all positions.
-        # Simplified equity for now:
-        # If we have market prices, equity is cash + market value of all positions
-        # If not, equity is just cash + realized PnL (less accurate as it ignores unrealized)
-
-        current_equity = self.current_balance
-        if current_market_prices:
-            for symbol, pos_details in self.positions.items():
-                qty = pos_details['quantity']
-                if qty != 0 and symbol in current_market_prices:
-                    current_equity += qty * current_market_prices[symbol] # Adds market value of longs, subtracts market value of shorts (qty is negative)
-        else: # Fallback if no market prices for UPL calculation
-            current_equity += self.total_realized_pnl # This is not quite right, but a placeholder
-            # A better fallback: sum of (qty * avg_entry_price)
-            # for symbol, pos_details in self.positions.items():
-            #     current_equity += pos_details['quantity'] * pos_details['avg_entry_price']
-
+            for symbol, price in current_market_prices.items():
+                self.mark_price(symbol, price)
+        current_equity = self.current_balance + self._market_value_total
 
         if not self.equity_curve or self.equity_curve[-1][0] < timestamp:
             self.equity_curve.append((timestamp, current_equity))
@@ -233,7 +250,8 @@ class SimulatedAccount:
     def get_equity_curve(self) -> pd.DataFrame:
         if not self.equity_curve:
             return pd.DataFrame(columns=['timestamp', 'equity'])
-        df = pd.DataFrame(self.equity_curve, columns=['timestamp', 'equity'])
+        df = pd.DataFrame({'timestamp': self.equity_curve.column('timestamp').copy(),
+                           'equity': self.equity_curve.column('equity').copy()})
         df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
         df.set_index('timestamp', inplace=True)
         return df
@@ -241,7 +259,7 @@ class SimulatedAccount:
     def get_trade_history(self) -> pd.DataFrame:
         if not self.trade_history:
             return pd.DataFrame()
-        df = pd.DataFrame(self.trade_history)
+        df = pd.DataFrame(self.trade_history.to_columns())
         df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
         return df
 
@@ -318,4 +336,39 @@ if __name__ == '__main__':
     print(f"After Close Short: Balance={account_short.current_balance:.2f}, Pos={account_short.get_position_quantity('ETH/USDT')}, AvgPx={account_short.get_position_avg_price('ETH/USDT')}")
     print(f"  Realized PnL (ETH/USDT): {account_short.realized_pnl_per_symbol['ETH/USDT']:.2f}, Total PnL: {account_short.total_realized_pnl:.2f}")
 
+    print("\n--- Portfolio Equity Across Symbols (incremental mark-to-market) ---")
+    import time
+    import numpy as np
+    rng = np.random.default_rng(7)
+    symbols = [f"SYM{i}/USDT" for i in range(50)]
+    account_pf = SimulatedAccount(initial_balance=1_000_000, fee_rate=0.001)
+    prices = {s: 100.0 for s in symbols}
+    n_bars = 200_000
+    bar_symbols = rng.integers(0, len(symbols), n_bars)
+    returns = rng.normal(0, 0.002, n_bars)
+    max_err = 0.0
+    t0 = time.perf_counter()
+    for i in range(n_bars):
+        symbol = symbols[bar_symbols[i]]
+        prices[symbol] *= 1.0 + returns[i]
+        if i % 97 == 0: # 偶尔成交，多空都有
+            side = 'buy' if rng.random() < 0.5 else 'sell'
+            account_pf.update_on_fill(i, symbol, side, 1.0, prices[symbol], f"pf{i}")
+        account_pf.record_equity(i, {symbol: prices[symbol]}) # 每根K线只传入当前交易对的价格
+        if i % 10_000 == 0:
+            # 逐持仓全量重算作为参照
+            expected = account_pf.current_balance + sum(p['quantity'] * prices[s] for s, p in account_pf.positions.items())
+            max_err = max(max_err, abs(account_pf.equity_curve[-1][1] - expected))
+    elapsed = time.perf_counter() - t0
+    expected = account_pf.current_balance + sum(p['quantity'] * prices[s] for s, p in account_pf.positions.items())
+    expected_upl = sum(p['quantity'] * (prices[s] - p['avg_entry_price']) for s, p in account_pf.positions.items())
+    open_positions = sum(1 for p in account_pf.positions.values() if p['quantity'] != 0)
+    print(f"{n_bars:,} bars over {len(symbols)} symbols ({open_positions} open positions) in {elapsed:.2f}s")
+    print(f"Final equity {account_pf.get_equity():.4f} vs full revaluation {expected:.4f}, max sampled error {max_err:.2e}")
+    print(f"Unrealized PnL {account_pf.unrealized_pnl:.4f} vs full revaluation {expected_upl:.4f}")
+    for s, p in list(account_pf.positions.items()): # 全部平仓后总市值应精确归零，不残留浮点误差
+        if p['quantity'] != 0:
+            account_pf.update_on_fill(n_bars, s, 'sell' if p['quantity'] > 0 else 'buy', abs(p['quantity']), prices[s], f"flat-{s}")
+    print(f"All flat: market value total {account_pf._market_value_total!r}, unrealized PnL {account_pf.unrealized_pnl!r}")
+
     print("--- SimulatedAccount Demo End ---")
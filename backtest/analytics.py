@@ -0,0 +1,240 @@
+import math
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from .account import SimulatedAccount
+
+MS_PER_YEAR = 365 * 24 * 3600 * 1000 # 加密货币市场全年无休
+
+def infer_periods_per_year(timestamps: np.ndarray) -> float:
+    """根据权益曲线时间戳的典型间隔 (中位数，毫秒) 推断每年的周期数，用于年化。"""
+    valid = timestamps[timestamps > 0] # 跳过账户初始化时写入的时间戳0
+    if len(valid) < 2:
+        return 1.0
+    step = float(np.median(np.diff(valid)))
+    return MS_PER_YEAR / step if step > 0 else 1.0
+
+def compute_metrics(timestamps: np.ndarray,
+                    equity: np.ndarray,
+                    initial_balance: Optional[float] = None,
+                    trade_amount: Optional[np.ndarray] = None,
+                    trade_price: Optional[np.ndarray] = None,
+                    trade_fee: Optional[np.ndarray] = None,
+                    trade_realized_pnl: Optional[np.ndarray] = None,
+                    periods_per_year: Optional[float] = None,
+                    risk_free_rate: float = 0.0) -> Dict[str, float]:
+    """
+    在一次遍历中计算权益曲线与成交记录的绩效指标 (全部为NumPy向量运算，不构造DataFrame)。
+
+    :param timestamps: 权益曲线时间戳 (毫秒)。
+    :param equity: 权益曲线数值，与 timestamps 等长。
+    :param initial_balance: 初始资金，默认取权益曲线第一个值。
+    :param trade_amount: 成交数量 (正数)。
+    :param trade_price: 成交价格。
+    :param trade_fee: 手续费。
+    :param trade_realized_pnl: 每笔成交的已实现盈亏。
+    :param periods_per_year: 每年的周期数，用于年化。默认根据时间戳间隔推断。
+    :param risk_free_rate: 年化无风险利率 (例如 0.02)，用于 Sharpe/Sortino。
+    :return: 指标字典，键见下方代码。
+    """
+    n = len(equity)
+    initial = float(equity[0]) if initial_balance is None and n else float(initial_balance or 0.0)
+    final = float(equity[-1]) if n else initial
+    ppy = periods_per_year or infer_periods_per_year(timestamps)
+
+    # --- 收益率 ---
+    prev = equity[:-1]
+    returns = np.divide(np.diff(equity), prev, out=np.zeros(max(n - 1, 0)), where=prev != 0)
+    n_returns = len(returns)
+    excess = returns - risk_free_rate / ppy
+    mean_excess = float(excess.mean()) if n_returns else 0.0
+    std = float(returns.std(ddof=1)) if n_returns > 1 else 0.0
+    downside = float(np.sqrt(np.mean(np.minimum(excess, 0.0) ** 2))) if n_returns else 0.0
+    sqrt_ppy = math.sqrt(ppy)
+
+    # --- 回撤与回撤持续时间 ---
+    if n:
+        peak = np.maximum.accumulate(equity)
+        drawdown = np.divide(peak - equity, peak, out=np.zeros(n), where=peak > 0)
+        index = np.arange(n)
+        last_peak = np.maximum.accumulate(np.where(equity >= peak, index, 0))
+        # 第一条记录通常是账户初始化时写入的时间戳0，计算时长时用第二条记录的时间代替
+        ts = timestamps if n < 2 or timestamps[0] > 0 else np.concatenate((timestamps[1:2], timestamps[1:]))
+        max_drawdown = float(drawdown.max())
+        max_dd_bars = int((index - last_peak).max())
+        max_dd_ms = int((ts - ts[last_peak]).max())
+        current_dd_bars = int(n - 1 - last_peak[-1])
+        mean_equity = float(equity.mean())
+    else:
+        max_drawdown, max_dd_bars, max_dd_ms, current_dd_bars, mean_equity = 0.0, 0, 0, 0, initial
+
+    total_return = (final - initial) / initial if initial else 0.0
+    if n_returns and initial > 0 and final > 0:
+        with np.errstate(over='ignore'):
+            annual_return = float(np.expm1(math.log(final / initial) * ppy / n_returns))
+    else:
+        annual_return = -1.0 if n_returns and final <= 0 < initial else 0.0
+
+    # --- 成交统计 ---
+    num_trades = len(trade_amount) if trade_amount is not None else 0
+    if num_trades:
+        notional = float(np.dot(trade_amount, trade_price))
+        total_fees = float(trade_fee.sum())
+        realized = trade_realized_pnl
+        closing = int(np.count_nonzero(realized))
+        win_rate = float(np.count_nonzero(realized > 0)) / closing if closing else 0.0
+        total_realized = float(realized.sum())
+    else:
+        notional = total_fees = win_rate = total_realized = 0.0
+    turnover = notional / mean_equity if mean_equity > 0 else 0.0
+
+    return {
+        'final_equity': final,
+        'total_return_pct': total_return * 100,
+        'annual_return_pct': annual_return * 100,
+        'annual_volatility_pct': std * sqrt_ppy * 100,
+        'sharpe': mean_excess / std * sqrt_ppy if std > 0 else 0.0,
+        'sortino': mean_excess / downside * sqrt_ppy if downside > 0 else 0.0,
+        'max_drawdown_pct': max_drawdown * 100,
+        'calmar': annual_return / max_drawdown if max_drawdown > 0 else 0.0,
+        'max_drawdown_duration_bars': max_dd_bars,
+        'max_drawdown_duration_ms': max_dd_ms,
+        'current_drawdown_duration_bars': current_dd_bars,
+        'total_realized_pnl': total_realized,
+        'num_trades': num_trades,
+        'win_rate': win_rate,
+        'traded_notional': notional,
+        'total_fees': total_fees,
+        'turnover': turnover, # 成交额 / 平均权益
+        'annual_turnover': turnover * ppy / n_returns if n_returns else 0.0,
+    }
+
+def symbol_attribution(trade_symbol: np.ndarray,
+                       trade_side: np.ndarray,
+                       trade_amount: np.ndarray,
+                       trade_price: np.ndarray,
+                       trade_fee: np.ndarray,
+                       trade_realized_pnl: np.ndarray,
+                       market_values: Optional[Dict[str, float]] = None,
+                       unrealized_pnl: Optional[Dict[str, float]] = None,
+                       initial_balance: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+    """
+    按交易对归因盈亏。
+
+    每个交易对的 pnl = 该交易对全部成交的现金流 (含手续费) + 当前持仓市值，
+    因此所有交易对的 pnl 之和恰好等于 最终权益 - 初始资金。
+
+    :param market_values: {symbol: 持仓市值}，见 SimulatedAccount.get_market_value_per_symbol()。
+    :param unrealized_pnl: {symbol: 未实现盈亏}，见 SimulatedAccount.get_unrealized_pnl_per_symbol()。
+    :param initial_balance: 提供时额外计算 'return_contribution_pct'。
+    :return: {symbol: {'trades', 'notional', 'fees', 'realized_pnl', 'unrealized_pnl', 'pnl', ...}}
+    """
+    market_values = market_values or {}
+    unrealized_pnl = unrealized_pnl or {}
+    if len(trade_symbol):
+        symbols, codes = np.unique(trade_symbol, return_inverse=True)
+        symbols = symbols.tolist()
+    else:
+        symbols, codes = [], np.zeros(0, dtype=np.int64)
+    symbols += [s for s in market_values if s not in symbols]
+    k = len(symbols)
+
+    notional = trade_amount * trade_price
+    signed_notional = np.where(trade_side == 'buy', notional, -notional)
+    columns = {
+        'trades': np.bincount(codes, minlength=k),
+        'notional': np.bincount(codes, weights=notional, minlength=k),
+        'fees': np.bincount(codes, weights=trade_fee, minlength=k),
+        'realized_pnl': np.bincount(codes, weights=trade_realized_pnl, minlength=k),
+        'cash_flow': np.bincount(codes, weights=-signed_notional - trade_fee, minlength=k),
+    }
+
+    attribution = {}
+    for i, symbol in enumerate(symbols):
+        row = {name: values[i].item() for name, values in columns.items()}
+        row['unrealized_pnl'] = unrealized_pnl.get(symbol, 0.0)
+        row['pnl'] = row.pop('cash_flow') + market_values.get(symbol, 0.0)
+        if initial_balance:
+            row['return_contribution_pct'] = row['pnl'] / initial_balance * 100
+        attribution[symbol] = row
+    return attribution
+
+def analyze_account(account: SimulatedAccount,
+                    periods_per_year: Optional[float] = None,
+                    risk_free_rate: float = 0.0,
+                    by_symbol: bool = True) -> Dict[str, Any]:
+    """
+    直接读取 SimulatedAccount 的权益曲线和成交记录列 (零拷贝视图) 计算绩效指标。
+
+    :param by_symbol: 为True时在结果中加入 'by_symbol' 归因字典。参数扫描只需要标量指标时可关闭。
+    """
+    equity_curve, trades = account.equity_curve, account.trade_history
+    amount, price, fee, realized = (trades.column(name) for name in ('amount', 'price', 'fee', 'realized_pnl'))
+    metrics: Dict[str, Any] = compute_metrics(
+        equity_curve.column('timestamp'), equity_curve.column('equity'), account.initial_balance,
+        amount, price, fee, realized, periods_per_year=periods_per_year, risk_free_rate=risk_free_rate)
+    if by_symbol:
+        metrics['by_symbol'] = symbol_attribution(
+            trades.column('symbol'), trades.column('side'), amount, price, fee, realized,
+            account.get_market_value_per_symbol(), account.get_unrealized_pnl_per_symbol(), account.initial_balance)
+    return metrics
+
+
+if __name__ == '__main__':
+    import contextlib
+    import io
+    import time
+    import pandas as pd
+
+    rng = np.random.default_rng(3)
+    n_bars, symbols = 5_000, ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']
+    start_ts, step_ms = 1_672_531_200_000, 60_000
+    with contextlib.redirect_stdout(io.StringIO()):
+        account = SimulatedAccount(initial_balance=100_000, fee_rate=0.001)
+    prices = {s: p for s, p in zip(symbols, (20_000.0, 1_500.0, 20.0))}
+    for i in range(n_bars):
+        ts = start_ts + i * step_ms
+        for s in symbols:
+            prices[s] *= math.exp(rng.normal(0, 0.002))
+        if i % 10 == 0:
+            s = symbols[int(rng.integers(len(symbols)))]
+            side = 'buy' if rng.random() < 0.5 else 'sell'
+            account.update_on_fill(ts, s, side, 2_000 / prices[s], prices[s], f"o{i}")
+        account.record_equity(ts, prices)
+
+    metrics = analyze_account(account)
+    print("--- Performance metrics ---")
+    for name, value in metrics.items():
+        if name != 'by_symbol':
+            print(f"  {name:32s} {value:,.4f}")
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(pd.DataFrame.from_dict(metrics['by_symbol'], orient='index').round(2))
+
+    # --- 用 pandas 逐项重新计算作为参照 ---
+    curve = account.get_equity_curve()
+    returns = curve['equity'].pct_change().dropna()
+    ppy = MS_PER_YEAR / step_ms
+    dd = 1 - curve['equity'] / curve['equity'].cummax()
+    underwater_run = (dd > 0).astype(int).groupby((dd == 0).cumsum()).cumsum()
+    history = account.get_trade_history()
+    reference = {
+        'sharpe': returns.mean() / returns.std() * math.sqrt(ppy),
+        'sortino': returns.mean() / math.sqrt((returns.clip(upper=0) ** 2).mean()) * math.sqrt(ppy),
+        'max_drawdown_pct': dd.max() * 100,
+        'max_drawdown_duration_bars': underwater_run.max(),
+        'turnover': (history['amount'] * history['price']).sum() / curve['equity'].mean(),
+    }
+    ok = all(math.isclose(metrics[k], v, rel_tol=1e-9) for k, v in reference.items())
+    attributed = sum(row['pnl'] for row in metrics['by_symbol'].values())
+    print(f"Matches pandas reference: {ok}")
+    print(f"Attributed PnL {attributed:.6f} vs final equity - initial {metrics['final_equity'] - account.initial_balance:.6f}")
+
+    n_calls = 10_000
+    for by_symbol in (False, True):
+        t0 = time.perf_counter()
+        for _ in range(n_calls):
+            analyze_account(account, by_symbol=by_symbol)
+        elapsed = time.perf_counter() - t0
+        print(f"analyze_account(by_symbol={by_symbol}) x {n_calls:,} on {len(account.equity_curve):,} bars / "
+              f"{len(account.trade_history)} trades: {elapsed:.2f}s ({elapsed / n_calls * 1e6:.0f} us/call)")
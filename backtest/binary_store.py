@@ -0,0 +1,134 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict
+
+# 每列一个定长二进制文件 (小端序)。时间戳为 int64 毫秒，其余为 float64。
+STORE_COLUMNS: Dict[str, str] = {
+    'timestamp': '<i8',
+    'open': '<f8',
+    'high': '<f8',
+    'low': '<f8',
+    'close': '<f8',
+    'volume': '<f8',
+}
+
+class OHLCVStore:
+    """
+    按 (交易对, 周期) 存放的列式二进制K线库，读取时通过 numpy.memmap 映射。
+
+    目录结构: {root}/{SYMBOL}-{TIMEFRAME}/{column}.bin，例如 data/store/BTCUSDT-1m/close.bin。
+    打开数据不需要解析，几乎是瞬时的；多个回测进程映射同一文件时共享操作系统页缓存，
+    只有实际访问到的页才会被读入内存。
+    """
+    def __init__(self, root: str):
+        """
+        :param root: 库的根目录。
+        """
+        self.root = root
+
+    def path_for(self, symbol: str, timeframe: str) -> str:
+        """返回某个交易对和周期的数据目录 (与CSV文件命名一致，例如 'BTCUSDT-1m')。"""
+        return os.path.join(self.root, f"{symbol.replace('/', '')}-{timeframe}")
+
+    def exists(self, symbol: str, timeframe: str) -> bool:
+        path = self.path_for(symbol, timeframe)
+        return all(os.path.exists(os.path.join(path, f"{col}.bin")) for col in STORE_COLUMNS)
+
+    def write(self, symbol: str, timeframe: str, columns: Dict[str, np.ndarray]):
+        """
+        写入 (覆盖) 一个交易对的全部K线。数据必须已按时间戳升序排列。
+        每列先写入临时文件再原子替换，正在映射旧文件的进程不受影响。
+        """
+        lengths = {col: len(columns[col]) for col in STORE_COLUMNS}
+        if len(set(lengths.values())) != 1:
+            raise ValueError(f"OHLCVStore: 各列长度不一致: {lengths}")
+
+        path = self.path_for(symbol, timeframe)
+        os.makedirs(path, exist_ok=True)
+        for col, dtype in STORE_COLUMNS.items():
+            final_path = os.path.join(path, f"{col}.bin")
+            tmp_path = final_path + ".tmp"
+            np.ascontiguousarray(columns[col], dtype=dtype).tofile(tmp_path)
+            os.replace(tmp_path, final_path)
+
+    def open(self, symbol: str, timeframe: str) -> Dict[str, np.ndarray]:
+        """
+        以只读方式映射一个交易对的全部列。
+
+        :return: 列名到 numpy.memmap (空数据时为空数组) 的映射。
+        :raises FileNotFoundError: 如果库中没有该交易对/周期。
+        """
+        path = self.path_for(symbol, timeframe)
+        if not self.exists(symbol, timeframe):
+            raise FileNotFoundError(f"OHLCVStore: '{path}' 中没有 {symbol}@{timeframe} 的数据。")
+
+        columns: Dict[str, np.ndarray] = {}
+        for col, dtype in STORE_COLUMNS.items():
+            file_path = os.path.join(path, f"{col}.bin")
+            if os.path.getsize(file_path) == 0: # 空文件无法被 mmap
+                columns[col] = np.zeros(0, dtype=dtype)
+            else:
+                columns[col] = np.memmap(file_path, dtype=dtype, mode='r')
+
+        lengths = {col: len(arr) for col, arr in columns.items()}
+        if len(set(lengths.values())) != 1:
+            raise ValueError(f"OHLCVStore: '{path}' 中各列长度不一致 (文件可能损坏): {lengths}")
+        return columns
+
+    def convert_csv(self, csv_filepath: str, symbol: str, timeframe: str) -> int:
+        """
+        一次性把CSV (与 HistoricalDataFeeder 相同的格式) 转换为二进制库。
+        会按时间戳排序并去掉重复的时间戳 (保留最后一条)。
+
+        :return: 写入的K线数量。
+        """
+        print(f"OHLCVStore: Converting {csv_filepath} -> {self.path_for(symbol, timeframe)} ...")
+        df = pd.read_csv(csv_filepath)
+        missing = [col for col in STORE_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"CSV文件缺少必要的列: {missing}, 实际: {df.columns.tolist()}")
+
+        df = df.sort_values(by='timestamp', kind='stable').drop_duplicates(subset='timestamp', keep='last')
+        self.write(symbol, timeframe, {col: pd.to_numeric(df[col]).to_numpy(dtype=dtype)
+                                       for col, dtype in STORE_COLUMNS.items()})
+        print(f"OHLCVStore: Wrote {len(df)} bars for {symbol}@{timeframe}.")
+        return len(df)
+
+
+if __name__ == '__main__':
+    import tempfile
+    import time
+    from .historical_data import HistoricalDataFeeder
+
+    print("--- OHLCVStore 演示 ---")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = OHLCVStore(os.path.join(tmp_dir, 'store'))
+
+        # 1. 转换仓库自带的示例CSV，并确认两种后端输出一致
+        csv_path = 'data/historical/BTCUSDT-1m.csv'
+        if os.path.exists(csv_path):
+            store.convert_csv(csv_path, "BTC/USDT", "1m")
+            csv_feeder = HistoricalDataFeeder(csv_path, "BTC/USDT", "1m", columnar=True)
+            store_feeder = HistoricalDataFeeder.from_store(store.root, "BTC/USDT", "1m")
+            same = all(np.array_equal(csv_feeder.columns[c], store_feeder.columns[c]) for c in STORE_COLUMNS)
+            print(f"CSV and store feeders identical: {same}; first bar from store: {store_feeder.next_bar()!r}")
+
+        # 2. 启动耗时对比：大文件的 CSV 解析 vs memmap 打开
+        n_bars = 1_000_000
+        rng = np.random.default_rng(0)
+        close = 20_000 + np.cumsum(rng.normal(0, 5, n_bars))
+        big_csv = os.path.join(tmp_dir, 'SYNTH-1m.csv')
+        pd.DataFrame({'timestamp': 1_672_531_200_000 + np.arange(n_bars, dtype=np.int64) * 60_000,
+                      'open': close, 'high': close + 5, 'low': close - 5, 'close': close,
+                      'volume': rng.uniform(1, 20, n_bars)}).to_csv(big_csv, index=False)
+        store.convert_csv(big_csv, "SYNTH/USDT", "1m")
+
+        t0 = time.perf_counter()
+        HistoricalDataFeeder(big_csv, "SYNTH/USDT", "1m", columnar=True)
+        csv_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        HistoricalDataFeeder.from_store(store.root, "SYNTH/USDT", "1m")
+        store_s = time.perf_counter() - t0
+        print(f"Startup for {n_bars:,} bars: CSV {csv_s:.3f}s vs memmap store {store_s:.4f}s")
+    print("--- OHLCVStore 演示结束 ---")
@@ -7,7 +7,10 @@ import datetime
 from .historical_data import HistoricalDataFeeder
 from .account import SimulatedAccount
 from .exchange import SimulatedExchange
+from .scheduler import BarEventScheduler
+from .analytics import analyze_account
 from strategy import Strategy # From project root
+from indicators import IndicatorRegistry # From project root
 from risk_manager import RiskManagerBase # From project root
 
 class Backtester:
@@ -39,6 +42,7 @@ class Backtester:
 
         self._running = False
         self.current_timestamp: Optional[int] = None
+        self.indicators = IndicatorRegistry() # Shared indicators, updated once per bar before on_bar
 
         # Link strategies to this backtesting engine (acting as the 'engine' for strategies)
         for strat in self.strategies:
@@ -55,7 +59,7 @@ class Backtester:
         处理来自策略的订单请求，包括风险检查和通过模拟交易所执行。
         这是策略的 buy/sell/etc. 方法最终调用的地方。
         """
-        if not self.current_bar_for_symbol.get(symbol): # Ensure current bar is set for the symbol
+        if self.current_bar_for_symbol.get(symbol) is None: # Ensure current bar is set for the symbol
             print(f"Backtester ({strategy.name}): No current market data for {symbol} to process order.")
             return None
 
@@ -126,6 +130,17 @@ class Backtester:
         return simulated_order_result
 
 
+    async def _notify_pending_fills(self, filled_pending: List[Dict]):
+        """Relay fills of resting orders to the owning strategy and the risk manager."""
+        for filled_order_info in filled_pending:
+            strategy_inst = next((s for s in self.strategies if s.name == filled_order_info['info'].get('strategy_name')), None)
+            if strategy_inst:
+                await strategy_inst.on_order_update(filled_order_info.copy())
+                if filled_order_info['status'] == 'closed': # partial fills only produce order updates
+                    await strategy_inst.on_fill(filled_order_info.copy())
+                    if self.risk_manager:
+                        await self.risk_manager.update_on_fill(strategy_inst.name, filled_order_info.copy())
+
     async def run(self,
                   start_datetime_str: Optional[str] = None,
                   end_datetime_str: Optional[str] = None):
@@ -149,82 +164,53 @@ class Backtester:
 
 
         # Main backtesting loop - event-driven by time
-        # We need to get the "next" bar across all data feeders, ordered by time.
-        # This is a simplified loop assuming one primary data feeder for now, or feeders are pre-aligned.
-        # For multiple, unaligned data feeds, a heap-based event queue is better.
+        # The scheduler does a heap-based k-way merge over all data feeders, so each bar costs
+        # O(log k) regardless of how many feeds are loaded. Ties are broken by feeder key.
 
         # For now, assume strategies subscribe to symbols found in data_feeders keys (e.g. "BTC/USDT@1m")
         # And a strategy is interested in a symbol if data_feeder keySymbol@timeframe matches strategy.symbols and strategy.timeframe
 
         self.current_bar_for_symbol: Dict[str, pd.Series] = {} # Stores the current bar for each symbol being processed
 
-        # Create a list of (timestamp, feeder_key, bar_data) for all initial bars
-        # This is a simplified way to manage multiple feeds. A proper event queue would be better.
-        event_queue = []
-        for key, feeder in self.data_feeders.items():
-            feeder.reset()
-            ts = feeder.peek_next_timestamp()
-            if ts is not None and (start_ts is None or ts >= start_ts):
-                bar = feeder.next_bar() # Consume it
-                if bar is not None: # Should always be true if ts was not None
-                     event_queue.append({'timestamp': bar['timestamp'], 'key': key, 'bar': bar, 'type': 'BAR'})
-
-        event_queue.sort(key=lambda x: x['timestamp']) # Sort by timestamp initially
+        scheduler = BarEventScheduler(self.data_feeders)
+        scheduler.prime(start_ts, end_ts) # feeders binary-search their [start, end] window
 
         loop_count = 0
-        while self._running and event_queue:
+        while self._running:
+            current_event = scheduler.pop() # (timestamp, feeder_key, bar), earliest timestamp first
+            if current_event is None:
+                break
+
             loop_count+=1
             if loop_count % 1000 == 0: print(f"Backtester: Loop {loop_count}...")
 
-            current_event = event_queue.pop(0) # Get next event (earliest timestamp)
-
-            self.current_timestamp = current_event['timestamp']
+            self.current_timestamp, feeder_key, bar_data = current_event
 
             if end_ts is not None and self.current_timestamp > end_ts:
                 print(f"Backtester: Reached end_datetime {end_datetime_str}. Stopping.")
                 break
 
-            event_type = current_event['type']
-
-            if event_type == 'BAR':
-                bar_data = current_event['bar']
-                feeder_key = current_event['key'] # "SYMBOL@TIMEFRAME"
-                symbol, timeframe = feeder_key.split('@') # Crude split, assumes format
-
-                self.current_bar_for_symbol[symbol] = bar_data
-                self.exchange_sim.set_current_bar(bar_data) # Update exchange with current market prices
-
-                # 1. Check pending limit orders based on the new bar
-                filled_pending = self.exchange_sim.check_pending_limit_orders()
-                for filled_order_info in filled_pending:
-                    # Notify relevant strategy and risk manager
-                    strategy_inst = next((s for s in self.strategies if s.name == filled_order_info['info'].get('strategy_name')), None)
-                    if strategy_inst:
-                        await strategy_inst.on_order_update(filled_order_info.copy())
-                        await strategy_inst.on_fill(filled_order_info.copy())
-                        if self.risk_manager:
-                            await self.risk_manager.update_on_fill(strategy_inst.name, filled_order_info.copy())
-
-                # 2. Dispatch bar to strategies
-                for strategy in self.strategies:
-                    if symbol in strategy.symbols and strategy.timeframe == timeframe and strategy.active:
-                        # print(f"Backtester: Dispatching bar {symbol}@{timeframe} to {strategy.name}") # DEBUG
-                        await strategy.on_bar(symbol, bar_data.copy())
-
-                # 3. Record equity after processing bar and any resulting trades
-                # For accurate UPL, need market prices for ALL open positions
-                # Simplified: use current bar's close for the symbol of this bar for equity calc
-                # This isn't perfect for a portfolio but a start.
-                self.account_sim.record_equity(self.current_timestamp, {symbol: bar_data['close']})
-
-
-                # Add next bar from this feeder back to the queue
-                next_bar_from_feeder = self.data_feeders[feeder_key].next_bar()
-                if next_bar_from_feeder is not None:
-                    event_queue.append({'timestamp': next_bar_from_feeder['timestamp'], 'key': feeder_key, 'bar': next_bar_from_feeder, 'type': 'BAR'})
-                    event_queue.sort(key=lambda x: x['timestamp']) # Re-sort to maintain time order
-
-            # Placeholder for other event types (e.g., 'ORDER_FILLED_EVENT' if not handled immediately)
+            symbol, timeframe = feeder_key.split('@') # Crude split, assumes format
+
+            self.current_bar_for_symbol[symbol] = bar_data
+            self.exchange_sim.set_current_bar(bar_data, symbol) # Update exchange with current market prices
+
+            # 1. Check pending limit orders based on the new bar
+            filled_pending = self.exchange_sim.check_pending_limit_orders(symbol) # only this symbol's crossed price levels
+            await self._notify_pending_fills(filled_pending)
+
+            # 2. Update shared indicators once, then dispatch bar to strategies
+            self.indicators.update(symbol, timeframe, self.current_timestamp, bar_data['high'], bar_data['low'], bar_data['close'])
+            for strategy in self.strategies:
+                if symbol in strategy.symbols and strategy.timeframe == timeframe and strategy.active:
+                    # print(f"Backtester: Dispatching bar {symbol}@{timeframe} to {strategy.name}") # DEBUG
+                    await strategy.on_bar(symbol, bar_data.copy())
+
+            # 3. Record equity after processing bar and any resulting trades.
+            # Only this bar's symbol is re-marked at its close; the account keeps every other
+            # open position at its last known price, so portfolio equity stays complete.
+            self.account_sim.record_equity(self.current_timestamp, {symbol: bar_data['close']})
+
             # await asyncio.sleep(0) # Yield control briefly if in a very tight loop
 
         print("--- Backtest Finished ---")
@@ -232,24 +218,35 @@ class Backtester:
         for strat in self.strategies:
             result = strat.on_stop()
             if asyncio.iscoroutine(result): await result
+            strat.release_indicators()
 
         self.display_results()
 
 
     def display_results(self):
+        account = self.account_sim
+        currency = account.quote_currency
+        metrics = analyze_account(account)
         print("\n--- Backtest Results ---")
-        print(f"Initial Balance: {self.account_sim.initial_balance:.2f} {self.account_sim.quote_currency}")
-        print(f"Final Balance: {self.account_sim.current_balance:.2f} {self.account_sim.quote_currency}")
-        print(f"Total Realized PnL: {self.account_sim.total_realized_pnl:.2f} {self.account_sim.quote_currency}")
-
-        final_equity = self.account_sim.equity_curve[-1][1] if self.account_sim.equity_curve else self.account_sim.initial_balance
-        print(f"Final Equity (approx): {final_equity:.2f} {self.account_sim.quote_currency}")
-
-        total_return_pct = ((final_equity - self.account_sim.initial_balance) / self.account_sim.initial_balance) * 100
-        print(f"Total Return: {total_return_pct:.2f}%")
-
-        print(f"\nNumber of Trades: {len(self.account_sim.trade_history)}")
-        # Further metrics: Sharpe, Max Drawdown, etc. would require more detailed equity/returns series.
+        print(f"Initial Balance: {account.initial_balance:.2f} {currency}")
+        print(f"Final Balance: {account.current_balance:.2f} {currency}")
+        print(f"Total Realized PnL: {account.total_realized_pnl:.2f} {currency}")
+        print(f"Final Equity: {metrics['final_equity']:.2f} {currency}")
+        print(f"Total Return: {metrics['total_return_pct']:.2f}% (annualized {metrics['annual_return_pct']:.2f}%, "
+              f"volatility {metrics['annual_volatility_pct']:.2f}%)")
+        print(f"Sharpe: {metrics['sharpe']:.2f}, Sortino: {metrics['sortino']:.2f}, Calmar: {metrics['calmar']:.2f}")
+        print(f"Max Drawdown: {metrics['max_drawdown_pct']:.2f}%, longest drawdown: "
+              f"{metrics['max_drawdown_duration_bars']} bars ({pd.Timedelta(milliseconds=metrics['max_drawdown_duration_ms'])})")
+
+        print(f"\nNumber of Trades: {metrics['num_trades']}, win rate of closing trades: {metrics['win_rate'] * 100:.1f}%")
+        print(f"Traded Notional: {metrics['traded_notional']:.2f} {currency}, fees: {metrics['total_fees']:.2f} {currency}, "
+              f"turnover: {metrics['turnover']:.2f}x equity")
+        if metrics['by_symbol']:
+            print("\nPer-symbol attribution:")
+            for symbol, row in metrics['by_symbol'].items():
+                print(f"  {symbol}: PnL {row['pnl']:.2f} ({row['return_contribution_pct']:.2f}%), "
+                      f"realized {row['realized_pnl']:.2f}, unrealized {row['unrealized_pnl']:.2f}, "
+                      f"fees {row['fees']:.2f}, trades {row['trades']}")
 
     # This method is called by strategies (e.g. self.buy() in strategy calls self.engine.create_order())
     # It needs to match the signature expected by Strategy.buy/sell
@@ -1,6 +1,11 @@
-from typing import Dict, Optional, List, Any, Tuple
+from typing import Dict, Optional, List, Any, Tuple, Callable
 from collections import deque
+from bisect import bisect_left, insort
+import itertools
+import math
 import uuid # For generating unique order IDs
+import numpy as np
+import pandas as pd
 
 # Assuming SimulatedAccount is in the same directory or accessible
 from .account import SimulatedAccount
@@ -9,7 +14,8 @@ class SimulatedExchange:
     """
     模拟交易所，处理订单的撮合和执行。
     """
-    def __init__(self, account: SimulatedAccount, fee_rate: float = 0.001, slippage_model: Optional[Callable] = None):
+    def __init__(self, account: SimulatedAccount, fee_rate: float = 0.001, slippage_model: Optional[Callable] = None,
+                 max_volume_participation: Optional[float] = None):
         """
         初始化模拟交易所。
 
@@ -17,40 +23,161 @@ class SimulatedExchange:
         :param fee_rate: 交易手续费率 (例如 0.001 for 0.1%)。
         :param slippage_model: 可选的滑点模型函数。
                                签名: (symbol, side, order_type, price, amount, current_bar) -> actual_fill_price
+        :param max_volume_participation: 可选，每根K线上每个交易对可成交的数量占该K线 volume 的最大比例 (例如 0.1)。
+                                         超出部分留在挂单中，在后续K线上继续成交 (部分成交)。None 表示不限制，订单一次全部成交。
         """
+        if max_volume_participation is not None and max_volume_participation <= 0:
+            raise ValueError(f"max_volume_participation 必须大于0，实际: {max_volume_participation}")
         self.account = account
         self.fee_rate = fee_rate # Overrides account's fee_rate if needed, or use account.fee_rate
         self.slippage_model = slippage_model # TODO: Implement a basic slippage model
 
         self.current_bar: Optional[pd.Series] = None # 由回测引擎在每个bar更新
+        self._current_bars: Dict[str, pd.Series] = {} # {symbol: 该交易对最新的bar}
         self.open_orders: Dict[str, Dict] = {} # {order_id: order_dict}
 
+        # 挂单价格阶梯: {symbol: {side: [(key, seq, order_id), ...]}}，按 key 升序排列。
+        # 买单 key = price，卖单 key = -price，因此两边最容易成交的挂单都在列表末尾，
+        # 每根bar只需二分查找并截掉末尾的成交部分，耗时与成交数量成正比，与挂单总数无关。
+        self._ladders: Dict[str, Dict[str, List[Tuple[float, int, str]]]] = {}
+        self._ladder_entries: Dict[str, Tuple[str, str, Tuple[float, int, str]]] = {} # {order_id: (symbol, side, entry)}
+        self._order_seq = itertools.count() # 挂单顺序，同一根bar内按下单先后成交
+
+        self.max_volume_participation = max_volume_participation
+        self._volume_used: Dict[str, Tuple[int, float]] = {} # {symbol: (bar timestamp, 该bar已成交数量)}
+
         print(f"SimulatedExchange initialized. Fee rate: {self.fee_rate*100:.3f}%")
 
-    def set_current_bar(self, bar: pd.Series):
+    def set_current_bar(self, bar: pd.Series, symbol: Optional[str] = None):
         """
         由回测引擎调用，设置当前的K线数据，用于订单撮合。
         :param bar: pd.Series 代表当前K线 (应包含 'open', 'high', 'low', 'close', 'timestamp')
+        :param symbol: 该K线所属的交易对。未提供时取K线的 'symbol' 字段；两者都没有时这根K线不参与任何撮合
+                       (不知道它属于哪个交易对，就不能拿它去撮合其他交易对的订单)。
         """
         self.current_bar = bar
+        if symbol is None:
+            symbol = bar.get('symbol')
+        if symbol is not None:
+            self._current_bars[symbol] = bar
         # print(f"SimulatedExchange: Current bar set for timestamp {bar['timestamp']}") # DEBUG
 
+    def _bar_for(self, symbol: str):
+        """返回交易对最新的K线；该交易对还没有K线时返回None (视为没有行情)，不会借用其他交易对的K线。"""
+        return self._current_bars.get(symbol)
+
     def _generate_order_id(self) -> str:
         return str(uuid.uuid4())
 
+    def _add_to_ladder(self, order: Dict):
+        # 未成交完的市价单 key 为 inf，在之后每根K线上都会被取出，以收盘价继续成交
+        if order['type'] == 'market':
+            key = math.inf
+        else:
+            key = order['price'] if order['side'] == 'buy' else -order['price']
+        entry = (key, next(self._order_seq), order['id'])
+        insort(self._ladders.setdefault(order['symbol'], {}).setdefault(order['side'], []), entry)
+        self._ladder_entries[order['id']] = (order['symbol'], order['side'], entry)
+
+    def _remove_from_ladder(self, order_id: str):
+        symbol, side, entry = self._ladder_entries.pop(order_id)
+        ladder = self._ladders[symbol][side]
+        del ladder[bisect_left(ladder, entry)]
+
+    def resting_price_bounds(self, symbol: str) -> Tuple[float, float]:
+        """
+        返回该交易对最容易成交的挂单价格 (最高买价, 最低卖价)；没有挂单的一侧为 -inf / inf。
+        未成交完的市价单视为买价 inf / 卖价 -inf。供逐笔回放快速判断一笔成交是否可能触发撮合。
+        """
+        ladders = self._ladders.get(symbol, {})
+        buys, sells = ladders.get('buy'), ladders.get('sell')
+        return (buys[-1][0] if buys else -math.inf), (-sells[-1][0] if sells else math.inf)
+
+    def _available_volume(self, symbol: str, bar) -> float:
+        """该交易对在当前K线上还可成交的数量 (受 max_volume_participation 限制)。"""
+        if self.max_volume_participation is None:
+            return math.inf
+        ts = int(bar['timestamp'])
+        used_ts, used = self._volume_used.get(symbol, (None, 0.0))
+        if used_ts != ts:
+            used = 0.0
+        return max(self.max_volume_participation * float(bar['volume']) - used, 0.0)
+
+    def _consume_volume(self, symbol: str, bar, qty: float):
+        if self.max_volume_participation is None or qty <= 0:
+            return
+        ts = int(bar['timestamp'])
+        used_ts, used = self._volume_used.get(symbol, (None, 0.0))
+        self._volume_used[symbol] = (ts, (used if used_ts == ts else 0.0) + qty)
+
+    @staticmethod
+    def _allocate_volume(budget: float, remaining: np.ndarray) -> np.ndarray:
+        """
+        按下单先后把一根K线的可成交数量分配给多个订单 (先到先得)。
+        :param remaining: 各订单的剩余数量，按成交优先级排列。
+        :return: 各订单本次成交数量。
+        """
+        if math.isinf(budget):
+            return remaining.copy()
+        filled_before = np.cumsum(remaining) - remaining
+        return np.clip(budget - filled_before, 0.0, remaining)
+
+    def _execute_fill(self, order: Dict, qty: float, price: float, bar) -> Dict:
+        """
+        把一次 (部分) 成交记入订单和账户，生成一条成交记录。剩余数量为0时订单状态变为 'closed'。
+        """
+        timestamp = int(bar['timestamp'])
+        order['filled'] += qty
+        order['remaining'] = order['amount'] - order['filled']
+        if order['remaining'] <= order['amount'] * 1e-9: # 消除多次部分成交累加的浮点误差
+            order['filled'], order['remaining'] = order['amount'], 0.0
+        order['cost'] += qty * price
+        order['average'] = order['cost'] / order['filled']
+        order['fee'] = {'cost': order['cost'] * self.fee_rate, 'currency': self.account.quote_currency}
+        order['status'] = 'closed' if order['remaining'] == 0 else 'open'
+        order['timestamp'] = timestamp
+        order['datetime'] = pd.to_datetime(timestamp, unit='ms').isoformat()
+
+        trade_cost = qty * price
+        trade_entry = { # ccxt-like trade, one per (partial) fill
+            'id': self._generate_order_id(), # Trade ID can be different
+            'order': order['id'],
+            'timestamp': timestamp,
+            'datetime': order['datetime'],
+            'symbol': order['symbol'],
+            'side': order['side'],
+            'type': order['type'],
+            'price': price,
+            'amount': qty,
+            'cost': trade_cost,
+            'fee': {'cost': trade_cost * self.fee_rate, 'currency': self.account.quote_currency},
+            'info': {}
+        }
+        order['trades'].append(trade_entry)
+        self._consume_volume(order['symbol'], bar, qty)
+
+        # Fee is calculated and deducted by update_on_fill based on its own fee_rate
+        self.account.update_on_fill(
+            timestamp=timestamp, symbol=order['symbol'], side=order['side'],
+            filled_qty=qty, avg_fill_price=price,
+            order_id=order['id'], client_order_id=order.get('clientOrderId')
+        )
+        return trade_entry
+
     def _apply_slippage(self, symbol: str, side: str, order_type: str,
                         requested_price: Optional[float], amount: float) -> float:
         """
         根据滑点模型（如果提供）或K线数据计算实际成交价格。
         """
+        bar = self._bar_for(symbol)
         if self.slippage_model:
-            return self.slippage_model(symbol, side, order_type, requested_price, amount, self.current_bar)
+            return self.slippage_model(symbol, side, order_type, requested_price, amount, bar)
 
         # 默认/简单的滑点模拟 (基于当前K线)
         if order_type.lower() == 'market':
             # 市价单：假设以当前K线的收盘价成交 (或者开盘价，或OHLC/4等)
             # 为简单起见，先用收盘价。更复杂的可以模拟在K线内某个随机点成交。
-            return self.current_bar['close']
+            return bar['close']
 
         if order_type.lower() == 'limit':
             if requested_price is None: # Should not happen for limit order
@@ -63,7 +190,7 @@ class SimulatedExchange:
             return requested_price
 
         # Should not reach here for known order types
-        return requested_price if requested_price is not None else self.current_bar['close']
+        return requested_price if requested_price is not None else bar['close']
 
 
     def create_order(self,
@@ -80,7 +207,8 @@ class SimulatedExchange:
         :return: 如果订单被接受或部分/完全成交，返回一个模拟的订单数据字典。
                  如果订单因故无法创建（例如，参数不足），返回None。
         """
-        if self.current_bar is None:
+        bar = self._bar_for(symbol)
+        if bar is None:
             print(f"SimulatedExchange ({strategy_name}): Market data (current_bar) not set. Cannot process order for {symbol}.")
             return None
 
@@ -92,7 +220,7 @@ class SimulatedExchange:
             return None
 
         order_id = self._generate_order_id()
-        timestamp = int(self.current_bar['timestamp']) # Use current bar's timestamp for the order event
+        timestamp = int(bar['timestamp']) # Use current bar's timestamp for the order event
 
         # Prepare a basic order structure (ccxt-like)
         order_info = {
@@ -121,162 +249,132 @@ class SimulatedExchange:
         # For backtesting, we often assume orders fill within the current bar if conditions are met.
         # More complex backtesters might queue orders and match them against subsequent bars or ticks.
 
-        filled_this_bar = 0.0
-        avg_fill_price_this_bar = 0.0
-
+        crossed = False
         # For limit orders, check if the market price crossed the limit price in the current bar
         if order_info['type'] == 'limit':
             if order_info['side'] == 'buy':
                 # Buy limit order fills if market low <= limit price
-                if self.current_bar['low'] <= order_info['price']:
-                    # Assume fills at the limit price (can add slippage later)
-                    avg_fill_price_this_bar = self._apply_slippage(symbol, side, order_type, order_info['price'], amount)
-                    filled_this_bar = amount
+                crossed = bar['low'] <= order_info['price']
             elif order_info['side'] == 'sell':
                 # Sell limit order fills if market high >= limit price
-                if self.current_bar['high'] >= order_info['price']:
-                    avg_fill_price_this_bar = self._apply_slippage(symbol, side, order_type, order_info['price'], amount)
-                    filled_this_bar = amount
-
+                crossed = bar['high'] >= order_info['price']
         # For market orders, assume they fill at some price within the bar
         elif order_info['type'] == 'market':
-            # Simple model: fills at the bar's closing price (or open, or avg)
-            avg_fill_price_this_bar = self._apply_slippage(symbol, side, order_type, None, amount) # No requested price for market
-            filled_this_bar = amount
+            crossed = True
 
+        filled_this_bar = min(amount, self._available_volume(symbol, bar)) if crossed else 0.0
         if filled_this_bar > 0:
-            order_info['status'] = 'closed' # Assume full fill for simplicity in this basic version
-            order_info['filled'] = filled_this_bar
-            order_info['remaining'] = order_info['amount'] - filled_this_bar
-            order_info['average'] = avg_fill_price_this_bar
-            order_info['cost'] = filled_this_bar * avg_fill_price_this_bar
-
-            fee_amount = order_info['cost'] * self.fee_rate
-            order_info['fee'] = {'cost': fee_amount, 'currency': self.account.quote_currency}
-
-            # Create a trade entry (ccxt-like)
-            trade_entry = {
-                'id': self._generate_order_id(), # Trade ID can be different
-                'order': order_id,
-                'timestamp': timestamp,
-                'datetime': order_info['datetime'],
-                'symbol': symbol,
-                'side': side,
-                'type': order_type,
-                'price': avg_fill_price_this_bar,
-                'amount': filled_this_bar,
-                'cost': order_info['cost'],
-                'fee': order_info['fee'],
-                'info': {}
-            }
-            order_info['trades'].append(trade_entry)
-
-            # Update account based on this fill
-            self.account.update_on_fill(
-                timestamp=timestamp,
-                symbol=symbol,
-                side=side,
-                filled_qty=filled_this_bar,
-                avg_fill_price=avg_fill_price_this_bar,
-                order_id=order_id,
-                client_order_id=order_info['clientOrderId']
-                # Fee is calculated and deducted by update_on_fill based on its own fee_rate
-            )
-            print(f"SimulatedExchange ({strategy_name}): Order {order_id} FILLED - {side} {filled_this_bar} {symbol} @ {avg_fill_price_this_bar:.2f}")
-            return order_info # Return the filled order info
-        else:
-            # If not filled in this bar, it remains an open limit order
-            if order_info['type'] == 'limit':
-                self.open_orders[order_id] = order_info
-                print(f"SimulatedExchange ({strategy_name}): Limit order {order_id} for {symbol} placed, currently OPEN.")
-                return order_info # Return the open order info
-            else: # Market order that didn't fill (should not happen with simple model)
-                print(f"SimulatedExchange ({strategy_name}): Market order for {symbol} did not fill (unexpected).")
-                order_info['status'] = 'rejected' # Or some other failure status
-                return order_info
+            # Limit orders fill at the limit price, market orders at the bar's close (unless a slippage model is set)
+            requested_price = order_info['price'] if order_info['type'] == 'limit' else None # No requested price for market
+            avg_fill_price_this_bar = self._apply_slippage(symbol, side, order_type, requested_price, filled_this_bar)
+            self._execute_fill(order_info, filled_this_bar, avg_fill_price_this_bar, bar)
+            if order_info['status'] == 'closed':
+                print(f"SimulatedExchange ({strategy_name}): Order {order_id} FILLED - {side} {filled_this_bar} {symbol} @ {avg_fill_price_this_bar:.2f}")
+                return order_info # Return the filled order info
+            print(f"SimulatedExchange ({strategy_name}): Order {order_id} PARTIALLY FILLED - {side} {filled_this_bar}/{amount} {symbol} "
+                  f"@ {avg_fill_price_this_bar:.2f}, remaining {order_info['remaining']} carried to next bars")
+
+        # If not (fully) filled in this bar, the remainder stays open and is matched on later bars
+        self.open_orders[order_id] = order_info
+        self._add_to_ladder(order_info)
+        if filled_this_bar == 0:
+            print(f"SimulatedExchange ({strategy_name}): {order_info['type'].capitalize()} order {order_id} for {symbol} placed, currently OPEN.")
+        return order_info # Return the open order info
 
 
     def cancel_order(self, order_id: str, symbol: Optional[str] = None) -> Optional[Dict]:
         if order_id in self.open_orders:
             order_to_cancel = self.open_orders.pop(order_id)
+            self._remove_from_ladder(order_id)
             order_to_cancel['status'] = 'canceled'
-            order_to_cancel['timestamp'] = int(self.current_bar['timestamp']) if self.current_bar else pd.Timestamp.now().value // 10**6
+            bar = self._bar_for(order_to_cancel['symbol'])
+            order_to_cancel['timestamp'] = int(bar['timestamp']) if bar is not None else pd.Timestamp.now().value // 10**6
             order_to_cancel['datetime'] = pd.to_datetime(order_to_cancel['timestamp'], unit='ms').isoformat()
             print(f"SimulatedExchange: Order {order_id} for {order_to_cancel['symbol']} CANCELED.")
             return order_to_cancel
         else:
             # print(f"SimulatedExchange: Order ID {order_id} not found in open orders for cancellation.")
             # Try to find it in account's trade history if it was filled (ccxt behavior)
-            for trade in reversed(self.account.trade_history):
-                if trade.get('order_id') == order_id:
-                    # print(f"SimulatedExchange: Order {order_id} was already filled/closed.")
-                    # Return a structure indicating it's not open, ccxt might return the order from history
-                    # For simplicity, just indicate it's not cancellable.
-                    return {'id': order_id, 'status': 'closed', 'info': 'Order already processed or not found in open list.'}
+            if (self.account.trade_history.column('order_id') == order_id).any():
+                # print(f"SimulatedExchange: Order {order_id} was already filled/closed.")
+                # Return a structure indicating it's not open, ccxt might return the order from history
+                # For simplicity, just indicate it's not cancellable.
+                return {'id': order_id, 'status': 'closed', 'info': 'Order already processed or not found in open list.'}
             return None
 
 
-    def check_pending_limit_orders(self) -> List[Dict]:
+    def _pop_crossed_orders(self, symbol: str, bar) -> List[Tuple[float, int, str]]:
+        """
+        从交易对的价格阶梯中取出被这根K线触及的挂单: 买单 price >= low，卖单 price <= high，以及未成交完的市价单。
+        :return: 阶梯条目 [(key, seq, order_id), ...]，按下单先后排列。
+        """
+        ladders = self._ladders.get(symbol)
+        if not ladders or bar is None:
+            return []
+        crossed = []
+        for side, threshold in (('buy', bar['low']), ('sell', -bar['high'])):
+            ladder = ladders.get(side)
+            if not ladder:
+                continue
+            i = bisect_left(ladder, (threshold,))
+            if i < len(ladder):
+                crossed.extend(ladder[i:])
+                del ladder[i:]
+        crossed.sort(key=lambda entry: entry[1])
+        return crossed
+
+    def check_pending_limit_orders(self, symbol: Optional[str] = None) -> List[Dict]:
         """
         Called by the backtester at each new bar (after current_bar is set)
-        to attempt to fill pending limit orders.
+        to attempt to fill pending limit orders (and the unfilled remainder of market orders).
+
+        :param symbol: 可选，只撮合该交易对的挂单 (与它最新的K线比较)。
+                       为None时检查所有交易对，每个交易对使用其最新的K线 (没有K线的交易对不撮合)。
+        :return: 本根K线上有成交的订单 (拷贝)。status 为 'closed' 表示全部成交，'open' 表示部分成交、剩余部分继续挂单。
         """
         filled_or_updated_orders = []
-        if not self.current_bar:
-            return filled_or_updated_orders
-
-        # Iterate over a copy of keys as a_dict might be modified
-        for order_id in list(self.open_orders.keys()):
-            order = self.open_orders.get(order_id)
-            if not order: continue # Should not happen if iterating keys
-
-            # Re-evaluate fill condition for this limit order against the new current_bar
-            filled_this_bar = 0.0
-            avg_fill_price_this_bar = 0.0
-
-            if order['side'] == 'buy' and self.current_bar['low'] <= order['price']:
-                avg_fill_price_this_bar = self._apply_slippage(order['symbol'], order['side'], order['type'], order['price'], order['amount'])
-                filled_this_bar = order['amount']
-            elif order['side'] == 'sell' and self.current_bar['high'] >= order['price']:
-                avg_fill_price_this_bar = self._apply_slippage(order['symbol'], order['side'], order['type'], order['price'], order['amount'])
-                filled_this_bar = order['amount']
-
-            if filled_this_bar > 0:
-                # Order filled
-                order['status'] = 'closed'
-                order['filled'] = filled_this_bar
-                order['remaining'] = order['amount'] - filled_this_bar
-                order['average'] = avg_fill_price_this_bar
-                order['cost'] = filled_this_bar * avg_fill_price_this_bar
-                order['timestamp'] = int(self.current_bar['timestamp'])
-                order['datetime'] = pd.to_datetime(order['timestamp'], unit='ms').isoformat()
-
-                fee_amount = order['cost'] * self.fee_rate
-                order['fee'] = {'cost': fee_amount, 'currency': self.account.quote_currency}
-
-                trade_entry = { # Simplified trade entry
-                    'id': self._generate_order_id(), 'order': order_id, 'timestamp': order['timestamp'],
-                    'symbol': order['symbol'], 'side': order['side'], 'type': order['type'],
-                    'price': avg_fill_price_this_bar, 'amount': filled_this_bar,
-                    'cost': order['cost'], 'fee': order['fee']
-                }
-                order['trades'] = [trade_entry] # Replace or append if partial fills were supported
-
-                self.account.update_on_fill(
-                    timestamp=order['timestamp'], symbol=order['symbol'], side=order['side'],
-                    filled_qty=filled_this_bar, avg_fill_price=avg_fill_price_this_bar,
-                    order_id=order_id, client_order_id=order.get('clientOrderId')
-                )
-                strategy_name = order['info'].get('strategy_name', 'UnknownStrategy')
-                print(f"SimulatedExchange ({strategy_name}): Pending Limit Order {order_id} FILLED - {order['side']} {filled_this_bar} {order['symbol']} @ {avg_fill_price_this_bar:.2f}")
-
-                filled_or_updated_orders.append(order.copy())
+        symbols = [symbol] if symbol is not None else list(self._ladders)
+        fills = [] # (seq, entry, qty)
+        for sym in symbols:
+            bar = self._bar_for(sym)
+            crossed = self._pop_crossed_orders(sym, bar)
+            if not crossed:
+                continue
+            # 一次性按先后顺序分配这根K线的可成交数量
+            remaining = np.array([self.open_orders[order_id]['remaining'] for _, _, order_id in crossed])
+            qtys = self._allocate_volume(self._available_volume(sym, bar), remaining)
+            fills.extend((entry[1], entry, qty) for entry, qty in zip(crossed, qtys.tolist()))
+        fills.sort(key=lambda f: f[0]) # 按下单先后成交，与逐个遍历 open_orders 的顺序一致
+
+        for _, entry, filled_this_bar in fills:
+            order_id = entry[2]
+            order = self.open_orders[order_id]
+            if filled_this_bar <= 0: # 本根K线的成交量已用完，保持原有优先级继续挂单
+                insort(self._ladders[order['symbol']][order['side']], entry)
+                continue
+            bar = self._bar_for(order['symbol'])
+
+            # 价格阶梯已保证触及限价，按限价 (或滑点模型) 成交
+            requested_price = order['price'] if order['type'] == 'limit' else None
+            avg_fill_price_this_bar = self._apply_slippage(order['symbol'], order['side'], order['type'], requested_price, filled_this_bar)
+            self._execute_fill(order, filled_this_bar, avg_fill_price_this_bar, bar)
+            strategy_name = order['info'].get('strategy_name', 'UnknownStrategy')
+
+            if order['status'] == 'closed':
+                print(f"SimulatedExchange ({strategy_name}): Pending {order['type'].capitalize()} Order {order_id} FILLED - {order['side']} {filled_this_bar} {order['symbol']} @ {avg_fill_price_this_bar:.2f}")
                 del self.open_orders[order_id] # Remove from open orders
+                del self._ladder_entries[order_id]
+            else:
+                print(f"SimulatedExchange ({strategy_name}): Pending {order['type'].capitalize()} Order {order_id} PARTIALLY FILLED - {order['side']} {filled_this_bar} {order['symbol']} "
+                      f"@ {avg_fill_price_this_bar:.2f}, remaining {order['remaining']}")
+                insort(self._ladders[order['symbol']][order['side']], entry)
+            filled_or_updated_orders.append(order.copy())
 
         return filled_or_updated_orders
 
 
 if __name__ == '__main__':
+    import asyncio
     import pandas as pd # Required for pd.Series in demo
     print("--- SimulatedExchange Demo ---")
 
@@ -291,11 +389,12 @@ if __name__ == '__main__':
         {'timestamp': 4000, 'open': 106, 'high': 107, 'low': 100, 'close': 101, 'volume': 1500},
     ]
     bars_df = pd.DataFrame(bars_data)
+    xrp_bar = {'timestamp': 1000, 'open': 1.0, 'high': 1.2, 'low': 0.9, 'close': 1.1, 'volume': 50_000}
 
     async def run_exchange_demo():
         # --- Test Market Order ---
         print("\n--- Test Market Order ---")
-        sim_exchange.set_current_bar(bars_df.iloc[0]) # Set first bar as current market
+        sim_exchange.set_current_bar(bars_df.iloc[0], "BTC/USDT") # Set first bar as current market
         market_buy_order = sim_exchange.create_order("Strat1", "BTC/USDT", "buy", "market", 1.0)
         if market_buy_order:
             print(f"Market Buy Order Result: {market_buy_order['status']}, Filled: {market_buy_order['filled']} @ {market_buy_order['average']:.2f}")
@@ -304,7 +403,7 @@ if __name__ == '__main__':
 
         # --- Test Limit Order (should fill) ---
         print("\n--- Test Limit Order (should fill) ---")
-        sim_exchange.set_current_bar(bars_df.iloc[1]) # Next bar, high is 108, low is 101
+        sim_exchange.set_current_bar(bars_df.iloc[1], "ETH/USDT") # Next bar, high is 108, low is 101
         # Buy limit at 105, current bar low is 101 (101 <= 105, so fills)
         limit_buy_order_fill = sim_exchange.create_order("Strat1", "ETH/USDT", "buy", "limit", 0.5, price=105.0)
         if limit_buy_order_fill:
@@ -314,7 +413,7 @@ if __name__ == '__main__':
 
         # --- Test Limit Order (should remain open) ---
         print("\n--- Test Limit Order (should remain open) ---")
-        sim_exchange.set_current_bar(bars_df.iloc[1]) # Same bar, high 108, low 101
+        sim_exchange.set_current_bar(bars_df.iloc[1], "LTC/USDT") # Same bar, high 108, low 101
         # Buy limit at 100, current bar low is 101 (101 > 100, so does not fill)
         limit_buy_order_open = sim_exchange.create_order("Strat2", "LTC/USDT", "buy", "limit", 2.0, price=100.0)
         open_order_id = None
@@ -326,7 +425,7 @@ if __name__ == '__main__':
         # --- Test Pending Order Check (should fill the open order) ---
         if open_order_id:
             print("\n--- Test Pending Order Check (should fill previous open order) ---")
-            sim_exchange.set_current_bar(bars_df.iloc[3]) # Next bar, high 107, low 100
+            sim_exchange.set_current_bar(bars_df.iloc[3], "LTC/USDT") # Next bar, high 107, low 100
             # Previous order was buy limit at 100. Current bar low is 100. So it should fill.
             filled_pending_orders = sim_exchange.check_pending_limit_orders()
             if filled_pending_orders:
@@ -339,7 +438,7 @@ if __name__ == '__main__':
 
         # --- Test Cancel Order ---
         print("\n--- Test Cancel Order ---")
-        sim_exchange.set_current_bar(bars_df.iloc[0])
+        sim_exchange.set_current_bar(xrp_bar, "XRP/USDT")
         temp_limit_order = sim_exchange.create_order("StratCancel", "XRP/USDT", "sell", "limit", 100, price=1.5)
         if temp_limit_order and temp_limit_order['status'] == 'open':
             print(f"Created temp order to cancel: ID {temp_limit_order['id']}")
@@ -401,7 +500,7 @@ if __name__ == '__main__':
     async def run_sync_methods_in_async_context_demo():
         # ... (pasting the demo logic here, it will run fine as methods are sync)
         print("\n--- Test Market Order ---")
-        sim_exchange.set_current_bar(bars_df.iloc[0])
+        sim_exchange.set_current_bar(bars_df.iloc[0], "BTC/USDT")
         market_buy_order = sim_exchange.create_order("Strat1", "BTC/USDT", "buy", "market", 1.0)
         if market_buy_order:
             print(f"Market Buy Order Result: {market_buy_order['status']}, Filled: {market_buy_order['filled']} @ {market_buy_order['average']:.2f}")
@@ -409,7 +508,7 @@ if __name__ == '__main__':
             print(f"Position BTC/USDT: {sim_account.get_position_quantity('BTC/USDT')}")
 
         print("\n--- Test Limit Order (should fill) ---")
-        sim_exchange.set_current_bar(bars_df.iloc[1])
+        sim_exchange.set_current_bar(bars_df.iloc[1], "ETH/USDT")
         limit_buy_order_fill = sim_exchange.create_order("Strat1", "ETH/USDT", "buy", "limit", 0.5, price=105.0)
         if limit_buy_order_fill:
             print(f"Limit Buy Order (fill) Result: {limit_buy_order_fill['status']}, Filled: {limit_buy_order_fill['filled']} @ {limit_buy_order_fill['average']:.2f}")
@@ -417,7 +516,7 @@ if __name__ == '__main__':
             print(f"Position ETH/USDT: {sim_account.get_position_quantity('ETH/USDT')}")
 
         print("\n--- Test Limit Order (should remain open) ---")
-        sim_exchange.set_current_bar(bars_df.iloc[1])
+        sim_exchange.set_current_bar(bars_df.iloc[1], "LTC/USDT")
         limit_buy_order_open = sim_exchange.create_order("Strat2", "LTC/USDT", "buy", "limit", 2.0, price=100.0)
         open_order_id = None
         if limit_buy_order_open and limit_buy_order_open['status'] == 'open': # Check if it's indeed open
@@ -430,7 +529,7 @@ if __name__ == '__main__':
 
         if open_order_id:
             print("\n--- Test Pending Order Check (should fill previous open order) ---")
-            sim_exchange.set_current_bar(bars_df.iloc[3])
+            sim_exchange.set_current_bar(bars_df.iloc[3], "LTC/USDT")
             filled_pending_orders = sim_exchange.check_pending_limit_orders()
             if filled_pending_orders:
                 for order_res in filled_pending_orders:
@@ -440,11 +539,20 @@ if __name__ == '__main__':
             print(f"Position LTC/USDT: {sim_account.get_position_quantity('LTC/USDT')}")
             print(f"Open orders count after check: {len(sim_exchange.open_orders)}")
 
+        print("\n--- Test Order Without Market Data For Its Symbol ---")
+        # 只有 BTC/ETH/LTC 的K线时，XRP 的订单不能与其他交易对的K线撮合
+        no_data_order = sim_exchange.create_order("StratCancel", "XRP/USDT", "sell", "limit", 100, price=1.5)
+        print(f"XRP order without an XRP bar rejected: {no_data_order is None}")
+        sim_exchange.set_current_bar(bars_df.iloc[2]) # 没有交易对的K线不参与撮合
+        print(f"Symbol-less bar matched nothing: {sim_exchange.check_pending_limit_orders() == []}")
+
         print("\n--- Test Cancel Order ---")
-        sim_exchange.set_current_bar(bars_df.iloc[0])
+        sim_exchange.set_current_bar(xrp_bar, "XRP/USDT")
         temp_limit_order = sim_exchange.create_order("StratCancel", "XRP/USDT", "sell", "limit", 100, price=1.5)
         if temp_limit_order and temp_limit_order['status'] == 'open':
             print(f"Created temp order to cancel: ID {temp_limit_order['id']}")
+            sim_exchange.set_current_bar(bars_df.iloc[1], "BTC/USDT") # BTC 的高价K线不会触发 XRP 挂单
+            print(f"XRP order untouched by a BTC bar: {sim_exchange.check_pending_limit_orders() == []}")
             cancel_res = sim_exchange.cancel_order(temp_limit_order['id'])
             if cancel_res and cancel_res['status'] == 'canceled':
                 print(f"Order {temp_limit_order['id']} successfully cancelled.")
@@ -460,3 +568,58 @@ if __name__ == '__main__':
 
     asyncio.run(run_sync_methods_in_async_context_demo())
     print("--- SimulatedExchange Demo End ---")
+
+    # --- 部分成交: 每根K线最多成交其 volume 的 10%，剩余部分在后续K线继续成交 ---
+    import contextlib, io, time
+
+    print("\n--- Partial fills (max_volume_participation=0.1) ---")
+    with contextlib.redirect_stdout(io.StringIO()):
+        pf_account = SimulatedAccount(initial_balance=100000, fee_rate=0.001)
+        pf_exchange = SimulatedExchange(account=pf_account, max_volume_participation=0.1)
+        pf_bars = [{'timestamp': 60_000 * i, 'open': 100.0, 'high': 101.0, 'low': 99.0, 'close': 100.0, 'volume': 100.0}
+                   for i in range(4)]
+        pf_exchange.set_current_bar(pf_bars[0], "ABC/USDT")
+        big = pf_exchange.create_order("PF", "ABC/USDT", "buy", "limit", 25.0, price=99.5)     # 10 now, rest later
+        small = pf_exchange.create_order("PF", "ABC/USDT", "buy", "market", 4.0)             # budget exhausted -> next bars
+        small_at_bar0 = (small['status'], small['filled'])
+        pf_updates = []
+        for pf_bar in pf_bars[1:]:
+            pf_exchange.set_current_bar(pf_bar, "ABC/USDT")
+            pf_updates.append([(o['id'] == big['id'] and 'big' or 'small', o['status'], o['filled'])
+                               for o in pf_exchange.check_pending_limit_orders("ABC/USDT")])
+    print(f"  bar 0: big filled {big['trades'][0]['amount']}, small market order (status, filled)={small_at_bar0}")
+    for i, updates in enumerate(pf_updates, start=1):
+        print(f"  bar {i}: {updates}")
+    print(f"  big: {len(big['trades'])} trades {[t['amount'] for t in big['trades']]}, average {big['average']:.2f}, "
+          f"position {pf_account.get_position_quantity('ABC/USDT')}, open orders {len(pf_exchange.open_orders)}")
+
+    # --- 网格挂单基准: 大量挂单时，每根bar的耗时取决于成交数量而非挂单总数 ---
+
+    def run_grid(n_levels: int, n_bars: int = 2000, participation: Optional[float] = None) -> Tuple[float, int]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            account = SimulatedAccount(initial_balance=1e12, fee_rate=0.001)
+            exchange = SimulatedExchange(account=account, max_volume_participation=participation)
+            first_bar = {'timestamp': 0, 'open': 100.0, 'high': 100.0, 'low': 100.0, 'close': 100.0, 'volume': 1.0}
+            exchange.set_current_bar(first_bar, "GRID/USDT")
+            for i in range(1, n_levels + 1): # 100 两侧各 n_levels 档，间距 0.01
+                exchange.create_order("Grid", "GRID/USDT", "buy", "limit", 1.0, price=100.0 - i * 0.01)
+                exchange.create_order("Grid", "GRID/USDT", "sell", "limit", 1.0, price=100.0 + i * 0.01)
+            for order_id in list(exchange.open_orders)[::10]: # 撤掉一部分挂单，它们不应再成交
+                exchange.cancel_order(order_id)
+            rng = np.random.default_rng(0)
+            closes = 100.0 + np.cumsum(rng.normal(0, 0.002, n_bars))
+            fills = 0
+            t0 = time.perf_counter()
+            for ts, c in enumerate(closes, start=1):
+                exchange.set_current_bar({'timestamp': ts, 'open': c, 'high': c + 0.004, 'low': c - 0.004, 'close': c, 'volume': 1.0}, "GRID/USDT")
+                fills += len(exchange.check_pending_limit_orders("GRID/USDT"))
+            elapsed = time.perf_counter() - t0
+        ladder_size = sum(len(ladder) for ladder in exchange._ladders["GRID/USDT"].values())
+        assert ladder_size == len(exchange.open_orders), "price ladder out of sync with open_orders"
+        return elapsed, fills
+
+    print("\n--- Grid benchmark (per-bar cost vs resting orders) ---")
+    for participation in (None, 0.5):
+        for n_levels in (100, 1_000, 10_000):
+            elapsed, fills = run_grid(n_levels, participation=participation)
+            print(f"  participation={participation}, {2 * n_levels:>6} orders placed: {fills:>4} order updates, {elapsed / 2000 * 1e6:.1f} us/bar")
@@ -1,26 +1,107 @@
+import os
+import numpy as np
 import pandas as pd
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, Union, Tuple
+
+# K线字段顺序，与 ccxt OHLCV 列表一致
+BAR_FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+class BarView:
+    """
+    指向列式数据中某一行的只读K线视图。
+
+    不复制数据，只保存对列数组的引用和行号，支持 bar['close'] 这样的下标访问，
+    因此现有 Strategy.on_bar 中按键读取 pd.Series 的代码无需修改。
+    """
+    __slots__ = ('_columns', '_index')
+
+    def __init__(self, columns: Dict[str, np.ndarray], index: int):
+        """
+        :param columns: 列名到 NumPy 数组的映射 (由 HistoricalDataFeeder 持有)。
+        :param index: 行号。
+        """
+        self._columns = columns
+        self._index = index
+
+    def __getitem__(self, key: str):
+        return self._columns[key][self._index]
+
+    def __setitem__(self, key, value):
+        raise TypeError("BarView 是只读的。如需修改请先调用 to_dict() 或 to_series()。")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        column = self._columns.get(key)
+        return default if column is None else column[self._index]
+
+    def keys(self):
+        return BAR_FIELDS
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(BAR_FIELDS)
+
+    def __len__(self):
+        return len(BAR_FIELDS)
+
+    def __contains__(self, key) -> bool:
+        return key in self._columns
+
+    def copy(self) -> 'BarView':
+        """视图不可变，直接返回自身，避免引擎分发时的拷贝开销。"""
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: self._columns[field][self._index].item() for field in BAR_FIELDS}
+
+    def to_series(self) -> pd.Series:
+        return pd.Series(self.to_dict())
+
+    def __repr__(self):
+        return f"BarView({', '.join(f'{k}={v}' for k, v in self.to_dict().items())})"
+
 
 class HistoricalDataFeeder:
     """
-    从CSV文件加载并按顺序提供历史K线数据。
+    从CSV文件或二进制K线库 (OHLCVStore) 加载并按顺序提供历史K线数据。
+    数据加载后以连续的 NumPy 列数组保存 (二进制库为只读 memmap)；columnar 模式下 next_bar() 返回 BarView，
+    否则返回与旧版本一致的 pd.Series。
     """
-    def __init__(self, csv_filepath: str, symbol: str, timeframe: str):
+    def __init__(self, csv_filepath: Optional[str], symbol: str, timeframe: str, columnar: bool = False,
+                 store_root: Optional[str] = None):
         """
         初始化 HistoricalDataFeeder。
 
-        :param csv_filepath: CSV文件的路径。
+        :param csv_filepath: CSV文件的路径。使用 store_root 时可为None。
         :param symbol: 该数据对应的交易对符号。
         :param timeframe: 该数据对应的K线周期。
+        :param columnar: 为True时 next_bar() 返回只读的 BarView (不为每根K线分配 pd.Series)。
+        :param store_root: 二进制K线库的根目录 (见 backtest/binary_store.py)。
+                           指定时从库中映射数据，不再解析CSV。
         """
+        if csv_filepath is None and store_root is None:
+            raise ValueError("HistoricalDataFeeder: 必须提供 csv_filepath 或 store_root。")
         self.csv_filepath = csv_filepath
+        self.store_root = store_root
         self.symbol = symbol
         self.timeframe = timeframe
+        self.columnar = columnar
         self._df: Optional[pd.DataFrame] = None
-        self._iterator: Optional[pd.DataFrameGroupBy.DataFrameIterator] = None # Will iterate over rows
+        self._columns: Dict[str, np.ndarray] = {}
+        self._timestamps: Optional[np.ndarray] = None # int64 毫秒时间戳，已排序
+        self._length: int = 0
         self._current_index: int = 0
+        # 当前回放窗口 [start_index, end_index)，由 set_time_range() 通过二分查找确定
+        self._start_index: int = 0
+        self._end_index: int = 0
 
-        self._load_data()
+        if store_root is not None:
+            self._load_store()
+        else:
+            self._load_data()
+
+    @classmethod
+    def from_store(cls, store_root: str, symbol: str, timeframe: str, columnar: bool = True) -> 'HistoricalDataFeeder':
+        """从二进制K线库创建 feeder。映射文件几乎不耗时，适合多进程回测共享同一份数据。"""
+        return cls(None, symbol, timeframe, columnar=columnar, store_root=store_root)
 
     def _load_data(self):
         """
@@ -31,7 +112,7 @@ class HistoricalDataFeeder:
             df = pd.read_csv(self.csv_filepath)
 
             # 基本的列名检查
-            expected_columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+            expected_columns = list(BAR_FIELDS)
             if not all(col in df.columns for col in expected_columns):
                 raise ValueError(f"CSV文件缺少必要的列。需要: {expected_columns}, 实际: {df.columns.tolist()}")
 
@@ -45,8 +126,11 @@ class HistoricalDataFeeder:
             df.reset_index(drop=True, inplace=True) # 重置索引以便按行号迭代
 
             self._df = df
-            self._current_index = 0 # Initialize pointer
-            print(f"HistoricalDataFeeder ({self.symbol}@{self.timeframe}): Loaded {len(self._df)} bars.")
+            self._set_columns({
+                'timestamp': df['timestamp'].to_numpy(dtype=np.int64),
+                **{col: df[col].to_numpy(dtype=np.float64) for col in BAR_FIELDS[1:]}
+            })
+            print(f"HistoricalDataFeeder ({self.symbol}@{self.timeframe}): Loaded {self._length} bars.")
 
         except FileNotFoundError:
             print(f"HistoricalDataFeeder错误: CSV文件 '{self.csv_filepath}' 未找到。")
@@ -58,27 +142,74 @@ class HistoricalDataFeeder:
             print(f"HistoricalDataFeeder错误: 加载CSV文件 '{self.csv_filepath}' 时发生未知错误: {e}")
             raise
 
-    def next_bar(self) -> Optional[pd.Series]:
+    def _load_store(self):
+        """
+        以只读 memmap 方式打开二进制K线库中的数据。数据在转换时已排序，这里不再做任何解析。
+        """
+        from .binary_store import OHLCVStore
+        store = OHLCVStore(self.store_root)
+        try:
+            self._set_columns(store.open(self.symbol, self.timeframe))
+            print(f"HistoricalDataFeeder ({self.symbol}@{self.timeframe}): Mapped {self._length} bars "
+                  f"from store '{store.path_for(self.symbol, self.timeframe)}'.")
+        except FileNotFoundError as e:
+            print(f"HistoricalDataFeeder错误: {e}")
+            raise
+
+    def _set_columns(self, columns: Dict[str, np.ndarray]):
+        """保存列数组 (保证每列在内存中连续，已连续的 memmap 不会被复制) 并重置指针。"""
+        self._columns = {name: np.ascontiguousarray(arr) for name, arr in columns.items()}
+        self._timestamps = self._columns['timestamp']
+        self._length = len(self._timestamps)
+        self._current_index = 0
+        self._start_index = 0
+        self._end_index = self._length
+
+    def index_range(self, start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> Tuple[int, int]:
+        """
+        在已排序的时间戳列上二分查找，返回时间范围对应的行号区间 [lo, hi)。
+        只访问 O(log n) 个元素，对 memmap 后端不会读入窗口之外的数据页。
+
+        :param start_ts: 起始时间戳 (毫秒，包含)，None 表示从头开始。
+        :param end_ts: 结束时间戳 (毫秒，包含)，None 表示到数据末尾。
+        """
+        lo = int(np.searchsorted(self._timestamps, start_ts, side='left')) if start_ts is not None else 0
+        hi = int(np.searchsorted(self._timestamps, end_ts, side='right')) if end_ts is not None else self._length
+        return lo, max(lo, hi)
+
+    def set_time_range(self, start_ts: Optional[int] = None, end_ts: Optional[int] = None):
+        """
+        把回放窗口限制在 [start_ts, end_ts] 内，并把指针移到窗口开头。
+        reset()、next_bar() 和 peek_next_timestamp() 都只在窗口内工作；两个参数都为None时恢复完整数据。
+        """
+        self._start_index, self._end_index = self.index_range(start_ts, end_ts)
+        self._current_index = self._start_index
+        print(f"HistoricalDataFeeder ({self.symbol}@{self.timeframe}): Window set to rows "
+              f"[{self._start_index}, {self._end_index}) of {self._length}.")
+
+    def next_bar(self) -> Optional[Union[pd.Series, BarView]]:
         """
         返回数据中的下一根K线。
         如果数据结束，则返回None。
         """
-        if self._df is None or self._current_index >= len(self.df):
+        i = self._current_index
+        if i >= self._end_index:
             return None
+        self._current_index = i + 1
 
-        bar_data_row = self._df.iloc[self._current_index]
-        self._current_index += 1
+        if self.columnar:
+            return BarView(self._columns, i)
 
         # 将行转换为与策略 on_bar 期望一致的 pd.Series
         # ccxtpro 的 watch_ohlcv 和 fetch_ohlcv 返回的是列表，然后引擎将其转换为Series
-        # 此处直接从DataFrame行创建Series，确保列名一致
+        cols = self._columns
         bar_series = pd.Series({
-            'timestamp': bar_data_row['timestamp'], # Keep as int (milliseconds)
-            'open': bar_data_row['open'],
-            'high': bar_data_row['high'],
-            'low': bar_data_row['low'],
-            'close': bar_data_row['close'],
-            'volume': bar_data_row['volume']
+            'timestamp': cols['timestamp'][i], # Keep as int (milliseconds)
+            'open': cols['open'][i],
+            'high': cols['high'][i],
+            'low': cols['low'][i],
+            'close': cols['close'][i],
+            'volume': cols['volume'][i]
         })
         return bar_series
 
@@ -87,23 +218,31 @@ class HistoricalDataFeeder:
         返回下一条K线的时间戳（毫秒），但不移动内部指针。
         如果数据结束，则返回None。
         """
-        if self._df is None or self._current_index >= len(self._df):
+        if self._current_index >= self._end_index:
             return None
-        return int(self._df.iloc[self._current_index]['timestamp'])
+        return int(self._timestamps[self._current_index])
 
     def reset(self):
         """
-        重置数据供给器，将指针移回数据开头。
+        重置数据供给器，将指针移回数据开头 (若设置了时间窗口，则移回窗口开头)。
         """
-        self._current_index = 0
+        self._current_index = self._start_index
         print(f"HistoricalDataFeeder ({self.symbol}@{self.timeframe}): Resat to beginning.")
 
+    @property
+    def columns(self) -> Dict[str, np.ndarray]:
+        """列名到 NumPy 数组的映射 (只读使用)。"""
+        return self._columns
+
     @property
     def df(self) -> Optional[pd.DataFrame]:
+        """完整数据的 DataFrame。二进制库后端只在首次访问时才构建 (会把数据读入内存)。"""
+        if self._df is None and self._columns:
+            self._df = pd.DataFrame({name: np.asarray(arr) for name, arr in self._columns.items()})
         return self._df
 
     def __len__(self):
-        return len(self._df) if self._df is not None else 0
+        return self._length
 
 if __name__ == '__main__':
     # 假设项目根目录下有 data/historical/BTCUSDT-1m.csv
@@ -168,6 +307,62 @@ if __name__ == '__main__':
                 print(f"  Bar {i+1} after reset: 数据结束。")
                 break
 
+        print("\n列式模式 (columnar=True):")
+        columnar_feeder = HistoricalDataFeeder(csv_filepath=csv_path, symbol="BTC/USDT", timeframe="1m", columnar=True)
+        bar = columnar_feeder.next_bar()
+        print(f"  Got {bar!r}, close={bar['close']}")
+
+        # 简单的吞吐量对比：逐根遍历全部K线若干轮
+        import time
+        rounds = max(1, 20_000 // max(len(feeder), 1))
+        for label, f in (("pd.Series", feeder), ("BarView", columnar_feeder)):
+            t0 = time.perf_counter()
+            n = 0
+            for _ in range(rounds):
+                f._current_index = 0 # 直接复位指针，避免 reset() 的日志输出干扰计时
+                while (b := f.next_bar()) is not None:
+                    _ = b['close']
+                    n += 1
+            elapsed = time.perf_counter() - t0
+            print(f"  {label:>9}: {n} bars in {elapsed:.3f}s ({n / elapsed:,.0f} bars/s)")
+
+        print("\n时间窗口 (set_time_range):")
+        ts = columnar_feeder.columns['timestamp']
+        columnar_feeder.set_time_range(int(ts[min(2, len(ts) - 1)]), int(ts[min(4, len(ts) - 1)]))
+        window = []
+        while (b := columnar_feeder.next_bar()) is not None:
+            window.append(int(b['timestamp']))
+        print(f"  Window bars: {window}")
+
+        # 5年的1分钟K线中选取1周：逐根跳过 vs 二分查找定位 (使用 memmap 二进制库)
+        import tempfile
+        from .binary_store import OHLCVStore
+        n_big = 5 * 365 * 1440
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            big_ts = 1_514_764_800_000 + np.arange(n_big, dtype=np.int64) * 60_000
+            big_close = np.full(n_big, 10_000.0)
+            OHLCVStore(tmp_dir).write("SYNTH/USDT", "1m", {
+                'timestamp': big_ts, 'open': big_close, 'high': big_close, 'low': big_close,
+                'close': big_close, 'volume': np.ones(n_big)})
+            big = HistoricalDataFeeder.from_store(tmp_dir, "SYNTH/USDT", "1m")
+            week_start, week_end = int(big_ts[n_big // 2]), int(big_ts[n_big // 2 + 7 * 1440 - 1])
+
+            t0 = time.perf_counter()
+            big._current_index = 0
+            while big.peek_next_timestamp() < week_start:
+                big.next_bar()
+            scan_s = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            big.set_time_range(week_start, week_end)
+            n_week = 0
+            while big.next_bar() is not None:
+                n_week += 1
+            window_s = time.perf_counter() - t0
+            print(f"  Seek to mid-history by scanning: {scan_s:.3f}s; "
+                  f"searchsorted + replay {n_week} bars of the week: {window_s:.4f}s")
+            del big
+
     except Exception as e:
         print(f"演示中发生错误: {e}")
     finally:
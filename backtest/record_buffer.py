@@ -0,0 +1,167 @@
+import numpy as np
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+# 权益曲线: (timestamp, equity)
+EQUITY_DTYPE = np.dtype([('timestamp', '<i8'), ('equity', '<f8')])
+
+# 成交记录。字符串字段用 object 保存引用 (交易对/方向等字符串在各记录间共享)，数值字段连续存放。
+TRADE_DTYPE = np.dtype([
+    ('timestamp', '<i8'), ('symbol', 'O'), ('side', 'O'),
+    ('amount', '<f8'), ('price', '<f8'), ('fee', '<f8'), ('realized_pnl', '<f8'),
+    ('order_id', 'O'), ('client_order_id', 'O'), ('balance_after_trade', '<f8'),
+])
+
+class RecordBuffer:
+    """
+    可增长的 NumPy 结构化数组，容量不足时翻倍 (摊销 O(1) 追加)。
+
+    提供与 list 相同的常用接口 (append / extend / len / 下标 / 迭代 / 对最后一条赋值)，
+    因此可以直接替换原来的 list of tuple；同时可以用 column() 零拷贝地取出某一列做向量化计算。
+    """
+    def __init__(self, dtype: np.dtype, initial_capacity: int = 1024):
+        """
+        :param dtype: 结构化数组的 dtype。
+        :param initial_capacity: 初始容量。
+        """
+        self.dtype = np.dtype(dtype)
+        self._data = np.empty(max(1, initial_capacity), dtype=self.dtype)
+        self._size = 0
+
+    def _reserve(self, n: int):
+        needed = self._size + n
+        if needed > len(self._data):
+            grown = np.empty(max(needed, 2 * len(self._data)), dtype=self.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+
+    def _to_row(self, record) -> tuple:
+        return tuple(record)
+
+    def _from_row(self, row: np.void):
+        return row.item()
+
+    def append(self, record):
+        self._reserve(1)
+        self._data[self._size] = self._to_row(record)
+        self._size += 1
+
+    def extend(self, records: Iterable):
+        rows = [self._to_row(r) for r in records]
+        if not rows:
+            return
+        self._reserve(len(rows))
+        self._data[self._size:self._size + len(rows)] = rows
+        self._size += len(rows)
+
+    def extend_columns(self, **columns: Union[np.ndarray, List[Any]]):
+        """按列批量追加 (向量化引擎使用)，未提供的列填充默认值 (数值为0，对象为None)。"""
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) != 1:
+            raise ValueError(f"extend_columns 的各列长度必须相同，实际: {lengths}")
+        n = lengths.pop()
+        if n == 0:
+            return
+        self._reserve(n)
+        block = self._data[self._size:self._size + n]
+        for name in self.dtype.names:
+            block[name] = columns[name] if name in columns else (None if self.dtype[name].kind == 'O' else 0)
+        self._size += n
+
+    def column(self, name: str) -> np.ndarray:
+        """返回某一列的只读视图 (不复制)。"""
+        view = self._data[name][:self._size]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def array(self) -> np.ndarray:
+        """已写入部分的结构化数组视图。"""
+        return self._data[:self._size]
+
+    def clear(self):
+        self._size = 0
+
+    def _normalize_index(self, i: int) -> int:
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError(f"{type(self).__name__} 下标越界")
+        return i
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return [self._from_row(row) for row in self._data[:self._size][i]]
+        return self._from_row(self._data[self._normalize_index(i)])
+
+    def __setitem__(self, i: int, record):
+        self._data[self._normalize_index(i)] = self._to_row(record)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self) -> Iterator:
+        for row in self._data[:self._size]:
+            yield self._from_row(row)
+
+    def __reversed__(self) -> Iterator:
+        for row in self._data[:self._size][::-1]:
+            yield self._from_row(row)
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+
+class EquityCurveBuffer(RecordBuffer):
+    """权益曲线，元素为 (timestamp, equity) 元组。"""
+    def __init__(self, initial_capacity: int = 1024):
+        super().__init__(EQUITY_DTYPE, initial_capacity)
+
+
+class TradeHistoryBuffer(RecordBuffer):
+    """成交记录，元素为与原 trade_history 相同键的字典。"""
+    def __init__(self, initial_capacity: int = 1024):
+        super().__init__(TRADE_DTYPE, initial_capacity)
+
+    def _to_row(self, record: Dict[str, Any]) -> tuple:
+        return tuple(record[name] for name in self.dtype.names)
+
+    def _from_row(self, row: np.void) -> Dict[str, Any]:
+        return dict(zip(self.dtype.names, row.item()))
+
+    def to_columns(self) -> Dict[str, list]:
+        """按列返回 Python 对象列表，用于构造与 list of dict 完全一致的 DataFrame。"""
+        return {name: self._data[name][:self._size].tolist() for name in self.dtype.names}
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    n = 1_000_000
+    timestamps = list(range(n))
+    equities = [10_000.0 + i * 0.01 for i in range(n)]
+
+    t0 = time.perf_counter()
+    as_list: List[Tuple[int, float]] = []
+    for ts, eq in zip(timestamps, equities):
+        as_list.append((ts, eq))
+    list_s = time.perf_counter() - t0
+    # list 本身 + 每个元组 + 元组中的 int/float 对象
+    list_bytes = sys.getsizeof(as_list) + sum(sys.getsizeof(t) + sys.getsizeof(t[0]) + sys.getsizeof(t[1]) for t in as_list[:1000]) * (n // 1000)
+
+    t0 = time.perf_counter()
+    buffer = EquityCurveBuffer()
+    for ts, eq in zip(timestamps, equities):
+        buffer.append((ts, eq))
+    buffer_s = time.perf_counter() - t0
+
+    print(f"Equity curve, {n:,} rows:")
+    print(f"  list of tuples: {list_s:.2f}s, ~{list_bytes / 1e6:.0f} MB")
+    print(f"  EquityCurveBuffer: {buffer_s:.2f}s, {buffer.nbytes / 1e6:.0f} MB (capacity {len(buffer._data):,})")
+    print(f"  same contents: {buffer[:] == as_list}, last: {buffer[-1]}, column view: {buffer.column('equity')[:3]}")
+
+    trades = TradeHistoryBuffer()
+    trades.append({'timestamp': 1, 'symbol': 'BTC/USDT', 'side': 'buy', 'amount': 0.1, 'price': 50_000.0, 'fee': 5.0,
+                   'realized_pnl': 0.0, 'order_id': 'o1', 'client_order_id': None, 'balance_after_trade': 94_995.0})
+    print(f"Trade record round trip: {trades[0]}")
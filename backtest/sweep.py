@@ -0,0 +1,238 @@
+import asyncio
+import contextlib
+import io
+import itertools
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Optional, Any, Type, Iterable, Callable, Union, Sequence
+
+import numpy as np
+import pandas as pd
+from pydantic import ValidationError
+
+from .historical_data import HistoricalDataFeeder
+from .account import SimulatedAccount
+from .exchange import SimulatedExchange
+from .engine import Backtester
+from .vectorized import VectorizedBacktester
+from .analytics import analyze_account
+from strategy import Strategy # From project root
+
+# 每个工作进程只加载一次历史数据，之后的每次回测复用这些 feeder (Backtester 会在开始时 reset)
+_WORKER_FEEDERS: Dict[str, HistoricalDataFeeder] = {}
+
+def _load_feeders(feeder_specs: Dict[str, Optional[str]], store_root: Optional[str] = None) -> Dict[str, HistoricalDataFeeder]:
+    feeders = {}
+    for key, csv_path in feeder_specs.items():
+        symbol, timeframe = key.split('@')
+        feeders[key] = HistoricalDataFeeder(csv_path, symbol, timeframe, columnar=True, store_root=store_root)
+    return feeders
+
+def _init_worker(feeder_specs: Dict[str, Optional[str]], store_root: Optional[str] = None):
+    """ProcessPoolExecutor 的 initializer：在工作进程中加载 (或映射) 历史数据。"""
+    global _WORKER_FEEDERS
+    with contextlib.redirect_stdout(io.StringIO()):
+        _WORKER_FEEDERS = _load_feeders(feeder_specs, store_root)
+
+def _run_single(run_id: int, strategy_cls: Type[Strategy], params: Dict[str, Any], symbols: List[str],
+                timeframe: str, initial_balance: float, fee_rate: float, vectorized: bool,
+                start_datetime_str: Optional[str], end_datetime_str: Optional[str], quiet: bool) -> Dict[str, Any]:
+    """在工作进程中执行一次回测。任何异常都被捕获并作为结果返回，不会中断整个参数扫描。"""
+    t0 = time.perf_counter()
+    row: Dict[str, Any] = {'run_id': run_id, **params}
+    try:
+        output = io.StringIO() if quiet else None
+        with (contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext()):
+            account = SimulatedAccount(initial_balance=initial_balance, fee_rate=fee_rate)
+            strategy = strategy_cls(name=f"{strategy_cls.__name__}#{run_id}", symbols=list(symbols),
+                                    timeframe=timeframe, params=dict(params))
+            if vectorized:
+                VectorizedBacktester([strategy], _WORKER_FEEDERS, account).run(
+                    start_datetime_str, end_datetime_str, show_results=False)
+            else:
+                backtester = Backtester([strategy], _WORKER_FEEDERS, SimulatedExchange(account, fee_rate=fee_rate), account)
+                backtester.display_results = lambda: None # 结果由扫描器汇总
+                asyncio.run(backtester.run(start_datetime_str, end_datetime_str))
+        row.update(analyze_account(account, by_symbol=False))
+        row['error'] = None
+    except Exception as e:
+        row['error'] = f"{type(e).__name__}: {e}"
+        row['traceback'] = traceback.format_exc()
+    row['elapsed_s'] = time.perf_counter() - t0
+    return row
+
+
+class ParameterSweep:
+    """
+    在进程池上并行运行多组参数的独立回测，并把指标汇总到一个 DataFrame。
+
+    - 参数组合先经过 strategy_cls.get_params_model() 验证，验证失败的组合直接记为失败，不会提交。
+    - 历史数据在每个工作进程中只加载一次 (通过进程池 initializer)；
+      指定 store_root 时各进程映射同一份二进制K线库，共享操作系统页缓存。
+    - 单次回测失败只记录在结果的 'error' 列中，不会中断其余回测。
+    """
+    def __init__(self,
+                 strategy_cls: Type[Strategy],
+                 feeder_specs: Dict[str, str],
+                 symbols: Optional[List[str]] = None,
+                 timeframe: Optional[str] = None,
+                 base_params: Optional[Dict[str, Any]] = None,
+                 initial_balance: float = 10000.0,
+                 fee_rate: float = 0.001,
+                 vectorized: bool = False,
+                 max_workers: Optional[int] = None,
+                 quiet: bool = True,
+                 store_root: Optional[str] = None):
+        """
+        :param strategy_cls: 策略类 (必须可在模块级导入，以便传给工作进程)。
+        :param feeder_specs: 字典，键为 "SYMBOL@TIMEFRAME"，值为CSV文件路径 (使用 store_root 时可为None)。
+        :param symbols: 策略交易的交易对，默认取 feeder_specs 中的全部交易对。
+        :param timeframe: 策略K线周期，默认取 feeder_specs 中的周期 (要求唯一)。
+        :param base_params: 所有组合共用的固定参数，会被扫描参数覆盖。
+        :param initial_balance: 每次回测的初始资金。
+        :param fee_rate: 手续费率。
+        :param vectorized: 为True时使用 VectorizedBacktester (策略需实现 generate_signals)。
+        :param max_workers: 进程数，默认为CPU核数。为0时在当前进程中顺序执行 (便于调试)。
+        :param quiet: 是否屏蔽回测过程中的打印输出。
+        :param store_root: 二进制K线库根目录 (见 backtest/binary_store.py)，指定时从库中映射数据而不解析CSV。
+        """
+        self.strategy_cls = strategy_cls
+        self.feeder_specs = dict(feeder_specs)
+        feed_symbols = [key.split('@')[0] for key in self.feeder_specs]
+        feed_timeframes = {key.split('@')[1] for key in self.feeder_specs}
+        if timeframe is None:
+            if len(feed_timeframes) != 1:
+                raise ValueError(f"feeder_specs 包含多个周期 {sorted(feed_timeframes)}，请显式指定 timeframe。")
+            timeframe = next(iter(feed_timeframes))
+        self.symbols = symbols or feed_symbols
+        self.timeframe = timeframe
+        self.base_params = base_params or {}
+        self.initial_balance = initial_balance
+        self.fee_rate = fee_rate
+        self.vectorized = vectorized
+        self.max_workers = os.cpu_count() if max_workers is None else max_workers
+        self.quiet = quiet
+        self.store_root = store_root
+
+    def _validate(self, params: Dict[str, Any]) -> Optional[str]:
+        params_model = self.strategy_cls.get_params_model()
+        if params_model is None:
+            return None
+        try:
+            params_model(**params)
+        except ValidationError as e:
+            return "ValidationError: " + "; ".join(
+                f"{'.'.join(map(str, err['loc'])) or 'params'}: {err['msg']}" for err in e.errors())
+        return None
+
+    def run(self, param_sets: Iterable[Dict[str, Any]],
+            start_datetime_str: Optional[str] = None,
+            end_datetime_str: Optional[str] = None) -> pd.DataFrame:
+        """
+        对给定的参数组合逐一回测。
+
+        :param param_sets: 参数字典的可迭代对象。
+        :return: 每个组合一行的 DataFrame，包含参数、指标、'error' 和 'elapsed_s' 列。
+                 param_sets 为空时返回只有 'run_id'、'error'、'elapsed_s' 列的空 DataFrame。
+        """
+        rows: List[Dict[str, Any]] = []
+        tasks = []
+        for run_id, sweep_params in enumerate(param_sets):
+            params = {**self.base_params, **sweep_params}
+            error = self._validate(params)
+            if error:
+                rows.append({'run_id': run_id, **params, 'error': error, 'elapsed_s': 0.0})
+                continue
+            tasks.append((run_id, self.strategy_cls, params, self.symbols, self.timeframe, self.initial_balance,
+                          self.fee_rate, self.vectorized, start_datetime_str, end_datetime_str, self.quiet))
+
+        print(f"ParameterSweep ({self.strategy_cls.__name__}): {len(tasks)} runs to execute, "
+              f"{len(rows)} rejected by parameter validation, workers={self.max_workers or 'inline'}.")
+        t0 = time.perf_counter()
+
+        if tasks and self.max_workers == 0:
+            _init_worker(self.feeder_specs, self.store_root)
+            rows.extend(_run_single(*task) for task in tasks)
+        elif tasks:
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                     initargs=(self.feeder_specs, self.store_root)) as pool:
+                futures = {pool.submit(_run_single, *task): task for task in tasks}
+                for future in as_completed(futures):
+                    task = futures[future]
+                    try:
+                        rows.append(future.result())
+                    except Exception as e: # 例如工作进程崩溃或参数无法序列化
+                        rows.append({'run_id': task[0], **task[2], 'error': f"{type(e).__name__}: {e}", 'elapsed_s': 0.0})
+
+        if not rows: # 没有任何参数组合时返回带基本列的空结果
+            results = pd.DataFrame(columns=['run_id', 'error', 'elapsed_s'])
+        else:
+            results = pd.DataFrame(rows).sort_values('run_id').reset_index(drop=True)
+        n_failed = int(results['error'].notna().sum()) if 'error' in results else 0
+        print(f"ParameterSweep ({self.strategy_cls.__name__}): finished {len(results)} combinations in "
+              f"{time.perf_counter() - t0:.2f}s, {n_failed} failed.")
+        return results
+
+    def grid_search(self, param_grid: Dict[str, Iterable[Any]], **run_kwargs) -> pd.DataFrame:
+        """
+        网格搜索：对 param_grid 中各参数取值的笛卡尔积逐一回测。
+        例如: {'short_sma_period': [5, 10], 'long_sma_period': [20, 50]}
+        """
+        names = list(param_grid.keys())
+        combos = (dict(zip(names, values)) for values in itertools.product(*(list(param_grid[n]) for n in names)))
+        return self.run(combos, **run_kwargs)
+
+    def random_search(self, param_distributions: Dict[str, Union[Sequence[Any], Callable[[np.random.Generator], Any]]],
+                      n_iter: int, seed: Optional[int] = None, **run_kwargs) -> pd.DataFrame:
+        """
+        随机搜索：每次从各参数的取值序列中均匀抽取，或调用 callable(rng) 生成取值。
+        例如: {'short_sma_period': range(3, 30), 'order_amount': lambda rng: round(rng.uniform(0.01, 0.1), 3)}
+        """
+        rng = np.random.default_rng(seed)
+
+        def sample(dist):
+            if callable(dist):
+                return dist(rng)
+            values = list(dist)
+            return values[int(rng.integers(len(values)))]
+
+        combos = [{name: sample(dist) for name, dist in param_distributions.items()} for _ in range(n_iter)]
+        return self.run(combos, **run_kwargs)
+
+
+if __name__ == '__main__':
+    import tempfile
+    from strategies.simple_sma_strategy import SimpleSMAStrategy
+
+    rng = np.random.default_rng(11)
+    n_bars = 3_000
+    close = 20_000 * np.exp(np.cumsum(rng.normal(0, 0.002, n_bars)))
+    demo_df = pd.DataFrame({
+        'timestamp': 1_672_531_200_000 + np.arange(n_bars) * 60_000,
+        'open': close, 'high': close * 1.001, 'low': close * 0.999, 'close': close,
+        'volume': rng.uniform(1, 20, n_bars),
+    })
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, 'BTCUSDT-1m.csv')
+        demo_df.to_csv(csv_path, index=False)
+
+        sweep = ParameterSweep(SimpleSMAStrategy, {"BTC/USDT@1m": csv_path},
+                               base_params={'order_amount': 0.1}, initial_balance=100_000)
+
+        print("--- Grid search (event-driven Backtester, process pool) ---")
+        # 包含 short >= long 的非法组合，用于展示验证失败的记录方式
+        grid = sweep.grid_search({'short_sma_period': [5, 10, 20], 'long_sma_period': [10, 30, 60]})
+        with pd.option_context('display.width', 200, 'display.max_columns', 20):
+            print(grid[['run_id', 'short_sma_period', 'long_sma_period', 'final_equity', 'sharpe',
+                        'num_trades', 'max_drawdown_pct', 'error']])
+
+        print("\n--- Random search (vectorized engine) ---")
+        sweep.vectorized = True
+        rand = sweep.random_search({'short_sma_period': range(3, 20), 'long_sma_period': range(20, 120)},
+                                   n_iter=20, seed=1)
+        with pd.option_context('display.width', 200, 'display.max_columns', 20):
+            print(rand.sort_values('final_equity', ascending=False).head(5)[
+                ['short_sma_period', 'long_sma_period', 'final_equity', 'sharpe', 'turnover', 'num_trades', 'elapsed_s']])
@@ -0,0 +1,423 @@
+import asyncio
+import heapq
+import math
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Optional, Any, Iterator, Tuple
+
+from .account import SimulatedAccount
+from .exchange import SimulatedExchange
+from .engine import Backtester
+from strategy import Strategy # From project root
+from risk_manager import RiskManagerBase # From project root
+from timeframes import timeframe_to_ms # From project root
+
+# 逐笔成交CSV的列。side 可选 ('buy'/'sell'，主动方)，缺失时为None。
+TRADE_FIELDS = ('timestamp', 'price', 'amount', 'side')
+
+class TradeBatch:
+    """
+    一个时间片内 (batch_ms) 同一交易对的连续成交，以 NumPy 列数组切片保存 (不复制)。
+    """
+    __slots__ = ('symbol', 'timestamp', 'price', 'amount', 'side')
+
+    def __init__(self, symbol: str, timestamp: np.ndarray, price: np.ndarray, amount: np.ndarray,
+                 side: Optional[np.ndarray] = None):
+        self.symbol = symbol
+        self.timestamp = timestamp
+        self.price = price
+        self.amount = amount
+        self.side = side
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def to_trades(self) -> List[Dict[str, Any]]:
+        """转换为 ccxt 风格的成交字典列表 (与实时 watch_trades 推送给 on_trade 的结构一致)。"""
+        sides = self.side.tolist() if self.side is not None else [None] * len(self.timestamp)
+        symbol = self.symbol
+        return [{'timestamp': ts, 'symbol': symbol, 'side': side, 'price': price, 'amount': amount, 'cost': price * amount}
+                for ts, price, amount, side in zip(self.timestamp.tolist(), self.price.tolist(), self.amount.tolist(), sides)]
+
+
+class TradeTapeFeeder:
+    """
+    分块读取逐笔成交CSV (timestamp, price, amount[, side])，按时间片产出 TradeBatch。
+    文件不会一次性载入内存，适合数GB的成交记录。文件需按 timestamp 升序排列。
+    """
+    def __init__(self, csv_filepath: str, symbol: str, chunksize: int = 1_000_000,
+                 start_ts: Optional[int] = None, end_ts: Optional[int] = None):
+        """
+        :param csv_filepath: 成交CSV文件路径。
+        :param symbol: 交易对符号。
+        :param chunksize: 每次从文件读取的行数。
+        :param start_ts: 可选，起始时间戳 (毫秒，含)。
+        :param end_ts: 可选，结束时间戳 (毫秒，含)。
+        """
+        self.csv_filepath = csv_filepath
+        self.symbol = symbol
+        self.chunksize = chunksize
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+
+    def iter_chunks(self) -> Iterator[Dict[str, np.ndarray]]:
+        """逐块读取文件，产出列数组字典 (已按时间范围裁剪)。"""
+        header = pd.read_csv(self.csv_filepath, nrows=0).columns
+        missing = [c for c in TRADE_FIELDS[:3] if c not in header]
+        if missing:
+            raise ValueError(f"成交CSV文件 '{self.csv_filepath}' 缺少必要的列: {missing}, 实际: {header.tolist()}")
+        usecols = [c for c in TRADE_FIELDS if c in header]
+        reader = pd.read_csv(self.csv_filepath, usecols=usecols, chunksize=self.chunksize,
+                             dtype={'timestamp': np.int64, 'price': np.float64, 'amount': np.float64})
+        for df in reader:
+            columns = {
+                'timestamp': df['timestamp'].to_numpy(),
+                'price': df['price'].to_numpy(),
+                'amount': df['amount'].to_numpy(),
+                'side': df['side'].to_numpy(dtype=object) if 'side' in df else None,
+            }
+            ts = columns['timestamp']
+            lo = 0 if self.start_ts is None else int(np.searchsorted(ts, self.start_ts, side='left'))
+            hi = len(ts) if self.end_ts is None else int(np.searchsorted(ts, self.end_ts, side='right'))
+            if lo > 0 or hi < len(ts):
+                columns = {k: (v[lo:hi] if v is not None else None) for k, v in columns.items()}
+            if len(columns['timestamp']):
+                yield columns
+            if hi < len(ts): # 已超过 end_ts，后面的块无需再读
+                break
+
+    def iter_batches(self, batch_ms: int) -> Iterator[TradeBatch]:
+        """
+        按 timestamp // batch_ms 把成交切分为时间片。跨越文件块边界的时间片会被拼接完整后再产出。
+        """
+        carry: Optional[Dict[str, np.ndarray]] = None
+        for columns in self.iter_chunks():
+            if carry is not None:
+                columns = {k: (np.concatenate((carry[k], v)) if v is not None else None) for k, v in columns.items()}
+            ts = columns['timestamp']
+            buckets = ts // batch_ms
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1)).tolist()
+            # 最后一个时间片可能在下一块中继续，留到下一轮
+            for lo, hi in zip(starts[:-1], starts[1:]):
+                yield self._batch(columns, lo, hi)
+            last = starts[-1]
+            carry = {k: (v[last:] if v is not None else None) for k, v in columns.items()}
+        if carry is not None and len(carry['timestamp']):
+            yield self._batch(carry, 0, len(carry['timestamp']))
+
+    def _batch(self, columns: Dict[str, np.ndarray], lo: int, hi: int) -> TradeBatch:
+        side = columns['side']
+        return TradeBatch(self.symbol, columns['timestamp'][lo:hi], columns['price'][lo:hi],
+                          columns['amount'][lo:hi], side[lo:hi] if side is not None else None)
+
+
+class _BarBuilder:
+    """由成交时间片增量合成某个周期的K线。时间片不跨越K线边界，每个时间片只需一次 NumPy 归约。"""
+    __slots__ = ('timeframe_ms', 'bar', 'last_ts')
+
+    def __init__(self, timeframe_ms: int):
+        self.timeframe_ms = timeframe_ms
+        self.bar: Optional[List[float]] = None # 正在形成的K线 [timestamp, open, high, low, close, volume]
+        self.last_ts: Optional[int] = None # 最近一笔成交的时间戳；roll() 之后仍是刚收盘K线的收盘时间
+
+    def roll(self, timestamp: int) -> Optional[List[float]]:
+        """时间片开始于新的K线周期时，返回刚收盘的K线。"""
+        if self.bar is not None and timestamp - timestamp % self.timeframe_ms != self.bar[0]:
+            closed, self.bar = self.bar, None
+            return closed
+        return None
+
+    def add(self, batch: TradeBatch):
+        high, low = float(batch.price.max()), float(batch.price.min())
+        close, volume = float(batch.price[-1]), float(batch.amount.sum())
+        self.last_ts = int(batch.timestamp[-1])
+        if self.bar is None:
+            ts = int(batch.timestamp[0])
+            self.bar = [ts - ts % self.timeframe_ms, float(batch.price[0]), high, low, close, volume]
+        else:
+            bar = self.bar
+            bar[2] = max(bar[2], high)
+            bar[3] = min(bar[3], low)
+            bar[4] = close
+            bar[5] += volume
+
+
+class TradeReplayBacktester(Backtester):
+    """
+    逐笔成交回放回测引擎。
+
+    - 订阅了成交 (params.subscribe_trades) 的策略按时间片收到 on_trade(symbol, trades_list)，
+      订阅了 Ticker 的策略收到由最新成交价构造的 on_ticker；
+    - 按各策略的 timeframe 由成交实时合成K线，收盘后调用 on_bar (与 K线回测相同的指标注册表和权益记录)；
+    - SimulatedExchange 中的挂单与每一笔成交逐笔撮合: 成交价触及挂单价时，以这笔成交 (数量作为 volume) 撮合。
+      先用挂单的最优价格对整个时间片做一次向量化比较，只有可能触发撮合的成交才逐笔处理。
+    多个交易对的成交按时间片的时间戳归并。
+    """
+    def __init__(self,
+                 strategies: List[Strategy],
+                 trade_feeders: Dict[str, TradeTapeFeeder], # {symbol: feeder}
+                 exchange_sim: SimulatedExchange,
+                 account_sim: SimulatedAccount,
+                 risk_manager: Optional[RiskManagerBase] = None,
+                 batch_ms: int = 1000):
+        """
+        :param trade_feeders: 字典，键为交易对，值为对应的 TradeTapeFeeder。
+        :param batch_ms: 时间片长度 (毫秒)，即每次 on_trade 推送覆盖的时间范围，必须能整除所有策略的K线周期。
+        """
+        super().__init__(strategies, trade_feeders, exchange_sim, account_sim, risk_manager)
+        self.batch_ms = batch_ms
+
+        # (symbol, timeframe) -> 合成K线
+        self._bar_builders: Dict[Tuple[str, str], _BarBuilder] = {}
+        for strat in self.strategies:
+            timeframe_ms = timeframe_to_ms(strat.timeframe)
+            if timeframe_ms % batch_ms:
+                raise ValueError(f"batch_ms ({batch_ms}) 必须能整除策略 [{strat.name}] 的K线周期 {strat.timeframe} ({timeframe_ms}ms)。")
+            for symbol in strat.symbols:
+                if symbol in trade_feeders:
+                    self._bar_builders.setdefault((symbol, strat.timeframe), _BarBuilder(timeframe_ms))
+
+    @staticmethod
+    def _wants(strategy: Strategy, flag: str) -> bool:
+        params = strategy.params
+        if isinstance(params, dict):
+            return bool(params.get(flag, False))
+        return bool(getattr(params, flag, False))
+
+    @staticmethod
+    def _print_bar(timestamp: int, price: float, amount: float) -> Dict[str, float]:
+        """把单笔成交表示为一根K线，供 SimulatedExchange 撮合。"""
+        return {'timestamp': timestamp, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': amount}
+
+    def _set_market(self, symbol: str, print_bar: Dict[str, float]):
+        self.current_timestamp = print_bar['timestamp']
+        self.current_bar_for_symbol[symbol] = print_bar
+        self.exchange_sim.set_current_bar(print_bar, symbol)
+
+    async def _match_prints(self, batch: TradeBatch):
+        """让挂单与时间片内的成交逐笔撮合。只处理价格触及当前最优挂单价的成交。"""
+        symbol = batch.symbol
+        best_bid, best_ask = self.exchange_sim.resting_price_bounds(symbol)
+        if best_bid == -math.inf and best_ask == math.inf:
+            return
+        prices, pos, n = batch.price, 0, len(batch)
+        while pos < n:
+            rest = prices[pos:]
+            crossing = np.flatnonzero((rest <= best_bid) | (rest >= best_ask))
+            if not crossing.size:
+                break
+            i = pos + int(crossing[0])
+            self._set_market(symbol, self._print_bar(int(batch.timestamp[i]), float(prices[i]), float(batch.amount[i])))
+            await self._notify_pending_fills(self.exchange_sim.check_pending_limit_orders(symbol))
+            best_bid, best_ask = self.exchange_sim.resting_price_bounds(symbol)
+            pos = i + 1
+
+    async def _close_bar(self, symbol: str, timeframe: str, ohlcv: List[float], close_ts: int):
+        """
+        :param close_ts: K线的收盘时间，即K线内最后一笔成交的时间戳。
+        """
+        ts, _, high, low, close, _ = ohlcv
+        self.indicators.update(symbol, timeframe, ts, high, low, close)
+        # 收盘权益记录在收盘时间而不是开盘时间 ts: K线内的成交已经以更晚的时间戳记录了权益，
+        # 记录在 ts 会被权益曲线丢弃。在 on_bar 之前记录，策略在 on_bar 中下单产生的成交在其后追加
+        self.account_sim.record_equity(close_ts, {symbol: close})
+        bar = pd.Series(dict(zip(('timestamp', 'open', 'high', 'low', 'close', 'volume'), ohlcv)))
+        for strategy in self._bar_routes.get((symbol, timeframe), ()):
+            if strategy.active:
+                await strategy.on_bar(symbol, bar.copy())
+
+    async def _process_batch(self, batch: TradeBatch):
+        symbol = batch.symbol
+        first_ts = int(batch.timestamp[0])
+
+        # 1. 新时间片开始于新的K线周期: 先让上一根K线收盘
+        for timeframe in self._timeframes_by_symbol.get(symbol, ()):
+            builder = self._bar_builders[(symbol, timeframe)]
+            closed = builder.roll(first_ts)
+            if closed is not None:
+                await self._close_bar(symbol, timeframe, closed, builder.last_ts)
+
+        # 2. 挂单与逐笔成交撮合
+        await self._match_prints(batch)
+
+        # 3. 更新正在形成的K线
+        for timeframe in self._timeframes_by_symbol.get(symbol, ()):
+            self._bar_builders[(symbol, timeframe)].add(batch)
+
+        # 4. 推送成交和 Ticker，市场价格为时间片内最后一笔成交
+        last_price = float(batch.price[-1])
+        self._set_market(symbol, self._print_bar(int(batch.timestamp[-1]), last_price, float(batch.amount[-1])))
+        trade_subscribers = [s for s in self._trade_routes.get(symbol, ()) if s.active]
+        if trade_subscribers:
+            trades_list = batch.to_trades()
+            for strategy in trade_subscribers:
+                await strategy.on_trade(symbol, trades_list)
+        ticker_subscribers = [s for s in self._ticker_routes.get(symbol, ()) if s.active]
+        if ticker_subscribers:
+            ticker = {'symbol': symbol, 'timestamp': int(batch.timestamp[-1]), 'last': last_price, 'close': last_price,
+                      'bid': None, 'ask': None}
+            for strategy in ticker_subscribers:
+                await strategy.on_ticker(symbol, dict(ticker))
+
+    def _build_routes(self):
+        self._bar_routes: Dict[Tuple[str, str], List[Strategy]] = {}
+        self._trade_routes: Dict[str, List[Strategy]] = {}
+        self._ticker_routes: Dict[str, List[Strategy]] = {}
+        self._timeframes_by_symbol: Dict[str, List[str]] = {}
+        for (symbol, timeframe) in self._bar_builders:
+            self._timeframes_by_symbol.setdefault(symbol, []).append(timeframe)
+        for strat in self.strategies:
+            for symbol in strat.symbols:
+                if symbol not in self.data_feeders:
+                    continue
+                self._bar_routes.setdefault((symbol, strat.timeframe), []).append(strat)
+                if self._wants(strat, 'subscribe_trades') and hasattr(strat, 'on_trade'):
+                    self._trade_routes.setdefault(symbol, []).append(strat)
+                if self._wants(strat, 'subscribe_ticker') and hasattr(strat, 'on_ticker'):
+                    self._ticker_routes.setdefault(symbol, []).append(strat)
+
+    async def run(self,
+                  start_datetime_str: Optional[str] = None,
+                  end_datetime_str: Optional[str] = None):
+        """
+        运行逐笔回放。
+        :param start_datetime_str: 可选，回测开始时间字符串 (YYYY-MM-DD HH:MM:SS)
+        :param end_datetime_str: 可选，回测结束时间字符串 (YYYY-MM-DD HH:MM:SS)
+        """
+        print("\n--- Trade Replay Backtest Starting ---")
+        self._running = True
+        start_ts = pd.to_datetime(start_datetime_str).value // 10**6 if start_datetime_str else None
+        end_ts = pd.to_datetime(end_datetime_str).value // 10**6 if end_datetime_str else None
+
+        for strat in self.strategies:
+            result = strat.on_start()
+            if asyncio.iscoroutine(result): await result
+
+        self.current_bar_for_symbol: Dict[str, Dict[str, float]] = {}
+        self._build_routes()
+
+        # 按时间片的起始时间归并各交易对 (时间相同时按交易对名称)
+        iterators = {}
+        heap: List[Tuple[int, str, TradeBatch]] = []
+        for symbol, feeder in self.data_feeders.items():
+            if start_ts is not None or end_ts is not None:
+                feeder.start_ts, feeder.end_ts = start_ts, end_ts
+            iterators[symbol] = feeder.iter_batches(self.batch_ms)
+            batch = next(iterators[symbol], None)
+            if batch is not None:
+                heapq.heappush(heap, (int(batch.timestamp[0]), symbol, batch))
+
+        n_trades = n_batches = 0
+        while heap and self._running:
+            _, symbol, batch = heapq.heappop(heap)
+            await self._process_batch(batch)
+            n_trades += len(batch)
+            n_batches += 1
+            if n_batches % 100_000 == 0: print(f"TradeReplayBacktester: {n_trades:,} trades replayed...")
+            nxt = next(iterators[symbol], None)
+            if nxt is not None:
+                heapq.heappush(heap, (int(nxt.timestamp[0]), symbol, nxt))
+
+        # 数据结束: 最后一根正在形成的K线也交给策略
+        for (symbol, timeframe), builder in self._bar_builders.items():
+            if builder.bar is not None:
+                closed, builder.bar = builder.bar, None
+                await self._close_bar(symbol, timeframe, closed, builder.last_ts)
+
+        print(f"--- Trade Replay Finished: {n_trades:,} trades in {n_batches:,} batches ---")
+        self.trades_replayed = n_trades
+        self._running = False
+        for strat in self.strategies:
+            result = strat.on_stop()
+            if asyncio.iscoroutine(result): await result
+            strat.release_indicators()
+
+        self.display_results()
+
+
+if __name__ == '__main__':
+    import contextlib
+    import io
+    import os
+    import tempfile
+    import time
+    from strategies.simple_sma_strategy import SimpleSMAStrategy
+
+    class TradeGridStrategy(Strategy):
+        """在最新成交价两侧挂一圈限价单，成交后在对侧补单 (用于检验逐笔撮合)。"""
+        def on_init(self):
+            super().on_init()
+            self.trades_seen = 0
+            self.fills = 0
+            self.placed = False
+
+        async def on_bar(self, symbol, bar):
+            pass
+
+        async def on_trade(self, symbol, trades_list):
+            self.trades_seen += len(trades_list)
+            if not self.placed:
+                self.placed = True
+                last = trades_list[-1]['price']
+                for i in range(1, 51):
+                    await self.buy(symbol, 0.01, round(last * (1 - 0.001 * i), 2), order_type='limit')
+                    await self.sell(symbol, 0.01, round(last * (1 + 0.001 * i), 2), order_type='limit')
+
+        async def on_fill(self, fill_data):
+            await super().on_fill(fill_data)
+            self.fills += 1
+            price = fill_data['price']
+            if fill_data['side'] == 'buy':
+                await self.sell(fill_data['symbol'], 0.01, round(price * 1.001, 2), order_type='limit')
+            else:
+                await self.buy(fill_data['symbol'], 0.01, round(price * 0.999, 2), order_type='limit')
+
+    # 合成约 6 小时、300万笔的成交记录
+    rng = np.random.default_rng(11)
+    n = 3_000_000
+    start = 1_672_531_200_000
+    ts = start + np.sort(rng.integers(0, 6 * 3600 * 1000, n))
+    price = np.round(20_000 * np.exp(np.cumsum(rng.normal(0, 0.00005, n))), 2)
+    amount = np.round(rng.exponential(0.05, n), 4) + 0.0001
+    side = np.where(rng.random(n) < 0.5, 'buy', 'sell')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'BTCUSDT-trades.csv')
+        pd.DataFrame({'timestamp': ts, 'price': price, 'amount': amount, 'side': side}).to_csv(path, index=False)
+
+        # 用成交合成的1分钟K线应与 pandas resample 的结果一致
+        feeder = TradeTapeFeeder(path, "BTC/USDT", chunksize=250_000)
+        builder, bars = _BarBuilder(60_000), []
+        for batch in feeder.iter_batches(1000):
+            closed = builder.roll(int(batch.timestamp[0]))
+            if closed is not None:
+                bars.append(closed)
+            builder.add(batch)
+        bars.append(builder.bar)
+        ref = pd.DataFrame({'price': price, 'amount': amount}, index=pd.to_datetime(ts, unit='ms')).resample('1min')
+        ref = pd.concat([ref['price'].ohlc(), ref['amount'].sum()], axis=1).dropna()
+        print(f"Bars built from trades: {len(bars)}, match pandas resample: "
+              f"{np.allclose(np.array(bars)[:, 1:], ref.to_numpy())}")
+
+        account = SimulatedAccount(initial_balance=1_000_000)
+        exchange = SimulatedExchange(account)
+        sma = SimpleSMAStrategy(name="SMA1m", symbols=["BTC/USDT"], timeframe="1m",
+                                params={'short_sma_period': 10, 'long_sma_period': 30, 'order_amount': 0.1})
+        grid = TradeGridStrategy(name="Grid", symbols=["BTC/USDT"], timeframe="1m", params={'subscribe_trades': True})
+        replay = TradeReplayBacktester([sma, grid], {"BTC/USDT": TradeTapeFeeder(path, "BTC/USDT", chunksize=250_000)},
+                                       exchange, account)
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(replay.run())
+        elapsed = time.perf_counter() - t0
+        print(f"Replayed {replay.trades_replayed:,} trades in {elapsed:.2f}s "
+              f"({replay.trades_replayed / elapsed * 60 / 1e6:.1f}M trades/min on one core)")
+        print(f"  on_trade saw {grid.trades_seen:,} trades, grid fills: {grid.fills}, "
+              f"account trades: {len(account.trade_history)}, open orders: {len(exchange.open_orders)}")
+        print(f"  SMA strategy position: {sma.get_position('BTC/USDT')}, final equity: {account.equity_curve[-1][1]:.2f}")
+
+        # 每根K线的收盘权益都应记录在K线内最后一笔成交的时间上 (包括K线内有成交、已按更晚时间记录过权益的K线)
+        bar_close_ts = pd.Series(ts).groupby(ts - ts % 60_000).max().to_numpy()
+        recorded_ts = account.equity_curve.column('timestamp')
+        print(f"  Bar-close equity recorded for every bar: {bool(np.isin(bar_close_ts, recorded_ts).all())} "
+              f"({len(bar_close_ts)} bars, {len(recorded_ts)} equity points)")
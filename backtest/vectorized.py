@@ -0,0 +1,266 @@
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Optional, Any, Tuple
+
+from .historical_data import HistoricalDataFeeder
+from .account import SimulatedAccount
+from .engine import Backtester
+from strategy import Strategy # From project root
+
+def _replay_average_cost(symbol_codes: np.ndarray, deltas: np.ndarray, prices: np.ndarray,
+                         fees: np.ndarray, n_symbols: int) -> Tuple[np.ndarray, List[Dict[str, float]]]:
+    """
+    按 SimulatedAccount.update_on_fill 的平均成本规则计算每笔成交的已实现PnL。
+    只遍历成交记录 (而非K线)，成交数通常远小于K线数。
+
+    :return: (每笔成交的已实现PnL数组, 每个交易对的最终持仓详情列表)
+    """
+    realized = np.zeros(len(deltas))
+    state = [{'quantity': 0.0, 'avg_entry_price': 0.0, 'total_cost_basis': 0.0} for _ in range(n_symbols)]
+
+    for k in range(len(deltas)):
+        pos = state[symbol_codes[k]]
+        qty, avg, cost = pos['quantity'], pos['avg_entry_price'], pos['total_cost_basis']
+        delta, price, fee = float(deltas[k]), float(prices[k]), float(fees[k])
+        filled = abs(delta)
+
+        if delta > 0 and qty >= 0 or delta < 0 and qty <= 0: # 开仓或加仓
+            cost += filled * price
+            qty += delta
+            avg = cost / abs(qty) if qty != 0 else 0.0
+        else: # 减仓、平仓或反手
+            to_close = min(filled, abs(qty))
+            if qty > 0:
+                realized[k] = price * to_close - avg * to_close - fee
+            else:
+                realized[k] = avg * to_close - price * to_close - fee
+            cost -= avg * to_close
+            if filled > abs(qty): # 反手
+                opened = filled - abs(qty)
+                qty = opened if delta > 0 else -opened
+                cost = opened * price
+                avg = price
+            else:
+                qty = qty + delta
+                if qty == 0:
+                    avg, cost = 0.0, 0.0
+
+        pos['quantity'], pos['avg_entry_price'], pos['total_cost_basis'] = qty, avg, cost
+
+    return realized, state
+
+
+class VectorizedBacktester:
+    """
+    向量化回测引擎，用于参数研究等需要大量快速回测的场景。
+
+    策略通过 Strategy.generate_signals(df) 一次性给出每根K线的目标持仓，
+    引擎用 NumPy 在整段数组上计算调仓、手续费、现金流和权益曲线，
+    并按 SimulatedAccount 的平均成本规则计算已实现PnL。
+    结果写回 SimulatedAccount，因此 equity_curve / trade_history 的格式与事件驱动的
+    Backtester 完全一致，可直接对比。
+
+    与 Backtester 的差异：
+    - 所有调仓都视为在该K线收盘价成交的市价单 (与 SimulatedExchange 的市价单规则一致)。
+    - 不调用 on_bar / on_fill 等回调，也不经过风险管理器。
+    """
+    def __init__(self,
+                 strategies: List[Strategy],
+                 data_feeders: Dict[str, HistoricalDataFeeder], # {symbol_timeframe_key: feeder}
+                 account_sim: SimulatedAccount):
+        """
+        :param strategies: 实现了 generate_signals 的策略实例列表。
+        :param data_feeders: 字典，键为 "SYMBOL@TIMEFRAME"，值为 HistoricalDataFeeder 实例。
+        :param account_sim: SimulatedAccount 实例，回测结果写入其中 (手续费率取自该账户)。
+        """
+        self.strategies = strategies
+        self.data_feeders = data_feeders
+        self.account_sim = account_sim
+
+        print(f"VectorizedBacktester initialized with {len(self.strategies)} strategies.")
+        print(f"  Data feeders for: {list(self.data_feeders.keys())}")
+
+    # 结果展示与事件驱动引擎共用 (只依赖 self.account_sim)
+    display_results = Backtester.display_results
+
+    def _load_frame(self, feeder_key: str, start_ts: Optional[int], end_ts: Optional[int]) -> pd.DataFrame:
+        feeder = self.data_feeders[feeder_key]
+        columns = feeder.columns
+        lo, hi = feeder.index_range(start_ts, end_ts)
+        df = pd.DataFrame({name: arr[lo:hi] for name, arr in columns.items()})
+        return df
+
+    def run(self,
+            start_datetime_str: Optional[str] = None,
+            end_datetime_str: Optional[str] = None,
+            show_results: bool = True):
+        """
+        运行向量化回测。
+        :param start_datetime_str: 可选，回测开始时间字符串 (YYYY-MM-DD HH:MM:SS)
+        :param end_datetime_str: 可选，回测结束时间字符串 (YYYY-MM-DD HH:MM:SS)
+        :param show_results: 是否在结束后打印结果。
+        """
+        print("\n--- Vectorized Backtest Starting ---")
+        start_ts = pd.to_datetime(start_datetime_str).value // 10**6 if start_datetime_str else None
+        end_ts = pd.to_datetime(end_datetime_str).value // 10**6 if end_datetime_str else None
+        account = self.account_sim
+        fee_rate = account.fee_rate
+
+        symbols: List[str] = []                  # 交易对编码 -> 交易对
+        symbol_frames: Dict[str, pd.DataFrame] = {}
+        net_positions: Dict[str, np.ndarray] = {} # 各交易对 (所有策略合计) 的逐K线持仓
+        trade_parts: List[Tuple[np.ndarray, ...]] = []
+
+        for strategy in self.strategies:
+            for symbol in strategy.symbols:
+                feeder_key = f"{symbol}@{strategy.timeframe}"
+                if feeder_key not in self.data_feeders:
+                    print(f"VectorizedBacktester: No data feeder for {feeder_key}, skipping {strategy.name} on {symbol}.")
+                    continue
+                if symbol not in symbol_frames:
+                    df = self._load_frame(feeder_key, start_ts, end_ts)
+                    df.attrs['symbol'] = symbol
+                    symbol_frames[symbol] = df
+                    net_positions[symbol] = np.zeros(len(df))
+                    symbols.append(symbol)
+                df = symbol_frames[symbol]
+                if df.empty:
+                    continue
+
+                target = np.asarray(strategy.generate_signals(df), dtype=np.float64)
+                if target.shape != (len(df),):
+                    raise ValueError(f"{strategy.name}.generate_signals 返回长度 {target.shape}，应为 ({len(df)},)")
+                net_positions[symbol] += target
+
+                delta = np.diff(target, prepend=0.0)
+                idx = np.flatnonzero(delta)
+                trade_parts.append((
+                    df['timestamp'].to_numpy()[idx],
+                    np.full(len(idx), symbols.index(symbol)),
+                    delta[idx],
+                    df['close'].to_numpy()[idx],
+                ))
+
+        # --- 成交: 按时间排序 (同一时间保持策略/交易对的处理顺序) ---
+        if trade_parts:
+            trade_ts, trade_sym, trade_delta, trade_price = (np.concatenate(cols) for cols in zip(*trade_parts))
+            order = np.argsort(trade_ts, kind='stable')
+            trade_ts, trade_sym, trade_delta, trade_price = trade_ts[order], trade_sym[order], trade_delta[order], trade_price[order]
+        else:
+            trade_ts = np.zeros(0, dtype=np.int64)
+            trade_sym = np.zeros(0, dtype=np.int64)
+            trade_delta = trade_price = np.zeros(0)
+
+        trade_fee = np.abs(trade_delta) * trade_price * fee_rate
+        trade_cash = -trade_delta * trade_price - trade_fee
+        balance_after = account.initial_balance + np.cumsum(trade_cash)
+        realized, final_positions = _replay_average_cost(trade_sym, trade_delta, trade_price, trade_fee, len(symbols))
+
+        # --- 权益曲线: 所有交易对时间轴的并集 ---
+        if symbols:
+            all_ts = np.unique(np.concatenate([symbol_frames[s]['timestamp'].to_numpy() for s in symbols]))
+        else:
+            all_ts = np.zeros(0, dtype=np.int64)
+        cash_on_timeline = account.initial_balance + np.cumsum(
+            np.bincount(np.searchsorted(all_ts, trade_ts), weights=trade_cash, minlength=len(all_ts))[:len(all_ts)])
+        equity = cash_on_timeline.copy()
+        for symbol in symbols:
+            df = symbol_frames[symbol]
+            if df.empty:
+                continue
+            # 每个交易对的持仓市值在其自身K线上更新，其余时间沿用上一次的值
+            value = np.full(len(all_ts), np.nan)
+            value[np.searchsorted(all_ts, df['timestamp'].to_numpy())] = net_positions[symbol] * df['close'].to_numpy()
+            valid = np.where(~np.isnan(value), np.arange(len(value)), 0)
+            np.maximum.accumulate(valid, out=valid)
+            value = value[valid]
+            equity += np.where(np.isnan(value), 0.0, value)
+
+        # --- 写回 SimulatedAccount (与事件驱动引擎相同的格式) ---
+        account.current_balance = float(balance_after[-1]) if len(balance_after) else account.initial_balance
+        for code, symbol in enumerate(symbols):
+            account.positions[symbol] = final_positions[code]
+            if not symbol_frames[symbol].empty: # 最新价格用于之后的增量估值
+                account.mark_price(symbol, float(symbol_frames[symbol]['close'].iloc[-1]))
+            symbol_pnl = float(realized[trade_sym == code].sum())
+            if symbol_pnl != 0.0:
+                account.realized_pnl_per_symbol[symbol] += symbol_pnl
+        account.total_realized_pnl += float(realized.sum())
+
+        account.trade_history.extend_columns(
+            timestamp=trade_ts, symbol=[symbols[code] for code in trade_sym.tolist()],
+            side=np.where(trade_delta > 0, 'buy', 'sell').astype(object),
+            amount=np.abs(trade_delta), price=trade_price, fee=trade_fee, realized_pnl=realized,
+            order_id=[f"vec-{k}" for k in range(len(trade_ts))], balance_after_trade=balance_after,
+        )
+        account.equity_curve.extend_columns(timestamp=all_ts, equity=equity)
+
+        print(f"--- Vectorized Backtest Finished: {len(all_ts)} timestamps, {len(trade_ts)} trades ---")
+        if show_results:
+            self.display_results()
+
+
+if __name__ == '__main__':
+    # 一致性检查：同一份数据上分别运行事件驱动 Backtester 和 VectorizedBacktester，
+    # 对比 SimpleSMAStrategy 的权益曲线和成交记录。
+    import asyncio
+    import contextlib
+    import io
+    import os
+    import tempfile
+    import time
+
+    from .exchange import SimulatedExchange
+    from strategies.simple_sma_strategy import SimpleSMAStrategy
+
+    rng = np.random.default_rng(7)
+    n_bars = 5_000
+    close = 20_000 * np.exp(np.cumsum(rng.normal(0, 0.002, n_bars)))
+    demo_df = pd.DataFrame({
+        'timestamp': 1_672_531_200_000 + np.arange(n_bars) * 60_000,
+        'open': close * (1 + rng.normal(0, 0.0005, n_bars)),
+        'high': close * 1.001, 'low': close * 0.999, 'close': close,
+        'volume': rng.uniform(1, 20, n_bars),
+    })
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, 'BTCUSDT-1m.csv')
+        demo_df.to_csv(csv_path, index=False)
+        params = {'short_sma_period': 10, 'long_sma_period': 30, 'order_amount': 0.1}
+
+        def make_strategy():
+            return SimpleSMAStrategy(name="SMA_Parity", symbols=["BTC/USDT"], timeframe="1m", params=dict(params))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            event_account = SimulatedAccount(initial_balance=100_000, fee_rate=0.001)
+            event_bt = Backtester(
+                strategies=[make_strategy()],
+                data_feeders={"BTC/USDT@1m": HistoricalDataFeeder(csv_path, "BTC/USDT", "1m", columnar=True)},
+                exchange_sim=SimulatedExchange(account=event_account, fee_rate=0.001),
+                account_sim=event_account)
+            t0 = time.perf_counter()
+            asyncio.run(event_bt.run())
+            event_s = time.perf_counter() - t0
+
+            vec_account = SimulatedAccount(initial_balance=100_000, fee_rate=0.001)
+            vec_bt = VectorizedBacktester(
+                strategies=[make_strategy()],
+                data_feeders={"BTC/USDT@1m": HistoricalDataFeeder(csv_path, "BTC/USDT", "1m")},
+                account_sim=vec_account)
+            t0 = time.perf_counter()
+            vec_bt.run(show_results=False)
+            vec_s = time.perf_counter() - t0
+
+    print("--- VectorizedBacktester 一致性检查 ---")
+    event_eq, vec_eq = event_account.get_equity_curve(), vec_account.get_equity_curve()
+    print(f"Event-driven: {event_s:.3f}s, {len(event_account.trade_history)} trades, final equity {event_eq['equity'].iloc[-1]:.4f}")
+    print(f"Vectorized:   {vec_s:.3f}s, {len(vec_account.trade_history)} trades, final equity {vec_eq['equity'].iloc[-1]:.4f}")
+
+    compare_cols = ['timestamp', 'symbol', 'side', 'amount', 'price', 'fee', 'realized_pnl', 'balance_after_trade']
+    event_trades, vec_trades = event_account.get_trade_history(), vec_account.get_trade_history()
+    same_equity = event_eq.index.equals(vec_eq.index) and np.allclose(event_eq['equity'], vec_eq['equity'])
+    same_trades = len(event_trades) == len(vec_trades) and all(
+        np.allclose(event_trades[c], vec_trades[c]) if event_trades[c].dtype.kind == 'f' else event_trades[c].equals(vec_trades[c])
+        for c in compare_cols)
+    print(f"Equity curves match: {same_equity}")
+    print(f"Trade lists match:   {same_trades}")
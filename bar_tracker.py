@@ -0,0 +1,100 @@
+from typing import List, Optional, Tuple
+
+class OHLCVBarTracker:
+    """
+    跟踪单个 (交易对, 周期) 的K线状态，用于对 watch_ohlcv 的推送去重并识别收盘。
+
+    ccxt 的 watch_ohlcv 每次返回其内部缓存的K线数组，最后一根通常仍在形成中并被原地更新。
+    一根K线在出现时间更晚的K线时视为已收盘，每根收盘K线只输出一次；
+    正在形成的K线只在其数值发生变化时输出。
+    """
+    def __init__(self, symbol: str, timeframe: str):
+        """
+        :param symbol: 交易对符号。
+        :param timeframe: K线周期。
+        """
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.last_closed_ts: Optional[int] = None # 最后一根已输出的收盘K线时间戳
+        self.forming: Optional[list] = None       # 最近一次看到的未收盘K线 [ts, o, h, l, c, v]
+
+    def update(self, ohlcv_list: List[list]) -> Tuple[List[list], Optional[list]]:
+        """
+        处理一次 watch_ohlcv 推送 (按时间升序排列的K线列表)。
+
+        :return: (new_closed_bars, forming_bar)。
+                 new_closed_bars 为本次新收盘的K线 (按时间升序)，每根只会出现一次；
+                 forming_bar 为正在形成的K线，若与上次相比没有变化则为None。
+        """
+        if not ohlcv_list:
+            return [], None
+        newest = ohlcv_list[-1]
+        newest_ts = newest[0]
+        if self.forming is not None and newest_ts < self.forming[0]:
+            return [], None # 过期的推送
+
+        # 从数组末尾向前扫描，只处理上次收盘之后的K线，不遍历整个缓存
+        i = len(ohlcv_list) - 1
+        while i > 0 and (self.last_closed_ts is None or ohlcv_list[i - 1][0] > self.last_closed_ts):
+            i -= 1
+        closed = [list(candle[:6]) for candle in ohlcv_list[i:-1]]
+
+        # 上次正在形成的K线如果已经不在本次数组中，以最后一次看到的数值作为收盘K线
+        if (self.forming is not None and self.forming[0] < newest_ts
+                and (self.last_closed_ts is None or self.forming[0] > self.last_closed_ts)
+                and (not closed or closed[0][0] > self.forming[0])):
+            closed.insert(0, self.forming)
+
+        if closed:
+            self.last_closed_ts = closed[-1][0]
+
+        forming = list(newest[:6])
+        if forming == self.forming:
+            return closed, None
+        self.forming = forming
+        return closed, forming
+
+    def reset(self):
+        """清空状态 (例如数据流重连后)。"""
+        self.last_closed_ts = None
+        self.forming = None
+
+
+if __name__ == '__main__':
+    import random
+    import time
+
+    # 模拟 watch_ohlcv：每次推送都返回整个缓存，最后一根K线在每笔成交后原地更新
+    random.seed(3)
+    tf_ms = 60_000
+    cache: List[list] = []
+    pushes: List[List[list]] = []
+    ts = 1_672_531_200_000
+    price = 20_000.0
+    for minute in range(200):
+        for _ in range(random.randint(5, 40)): # 每分钟若干次更新
+            price += random.uniform(-5, 5)
+            if not cache or cache[-1][0] != ts:
+                cache.append([ts, price, price, price, price, 0.0])
+                cache[:] = cache[-1000:]
+            bar = cache[-1]
+            bar[2], bar[3], bar[4], bar[5] = max(bar[2], price), min(bar[3], price), price, bar[5] + 0.1
+            pushes.append([list(c) for c in cache]) # ccxt 返回同一个数组，这里拷贝以保存当时的快照
+        ts += tf_ms
+
+    tracker = OHLCVBarTracker("BTC/USDT", "1m")
+    naive_on_bar_calls = sum(len(p) for p in pushes)
+    closed_bars: List[list] = []
+    updates = 0
+    t0 = time.perf_counter()
+    for push in pushes:
+        closed, forming = tracker.update(push)
+        closed_bars.extend(closed)
+        updates += forming is not None
+    elapsed = time.perf_counter() - t0
+
+    final_cache = pushes[-1]
+    print(f"Pushes: {len(pushes)}, naive on_bar calls (forward every element): {naive_on_bar_calls:,}")
+    print(f"Tracker: {len(closed_bars)} on_bar calls (closed candles), {updates} on_bar_update calls, "
+          f"{elapsed / len(pushes) * 1e6:.1f} us per push")
+    print(f"Each closed candle emitted once with final values: {closed_bars == final_cache[:-1]}")
@@ -244,6 +244,3 @@ if __name__ == '__main__':
         assert item.risk_params.model_dump().get("my_custom_risk_param") is True
     except ValidationError as e:
         print(f"Validation failed for extra risk_params (UNEXPECTED): {e.json(indent=2)}")
-
-</tbody>
-</table>
@@ -3,12 +3,29 @@ import asyncio
 from typing import Callable, List, Dict, Any, Tuple, Optional
 
 class DataFetcher:
-    def __init__(self, exchange_id='binance', config: Optional[Dict] = None):
+    def __init__(self, exchange_id='binance', config: Optional[Dict] = None, exchange: Optional[Any] = None,
+                 exchange_pool: Optional[Any] = None, sandbox_mode: bool = False):
         """
         初始化 DataFetcher。
         :param exchange_id: 交易所 ID
         :param config: 可选的交易所配置字典，将传递给ccxt交易所实例。
+        :param exchange: 可选，直接使用已创建的交易所对象 (例如测试用的本地假交易所)，
+                         此时忽略 exchange_id 和 config。
+        :param exchange_pool: 可选的 ExchangePool。提供时从池中获取与其他组件共享的实例 (凭证相同即共享)，
+                              close() 时只释放引用。
+        :param sandbox_mode: 是否使用沙箱/测试网 (与 OrderExecutor 相同，共享实例时需与其保持一致)。
         """
+        # _active_streams: key is a tuple (symbol, timeframe_or_None, stream_type), value is asyncio.Task
+        self._active_streams: Dict[Tuple[str, Optional[str], str], asyncio.Task] = {}
+        self._exchange_pool = exchange_pool
+
+        if exchange is not None:
+            self.exchange = exchange
+            return
+        if exchange_pool is not None:
+            self.exchange = exchange_pool.acquire(exchange_id, config, sandbox=sandbox_mode)
+            return
+
         if exchange_id not in ccxtpro.exchanges:
             raise ValueError(f"不支持的交易所: {exchange_id}. 可用交易所: {', '.join(ccxtpro.exchanges)}")
 
@@ -18,21 +35,36 @@ class DataFetcher:
 
         exchange_class = getattr(ccxtpro, exchange_id)
         self.exchange = exchange_class(exchange_config)
-
-        # _active_streams: key is a tuple (symbol, timeframe_or_None, stream_type), value is asyncio.Task
-        self._active_streams: Dict[Tuple[str, Optional[str], str], asyncio.Task] = {}
-
-    async def get_ohlcv(self, symbol: str, timeframe: str = '1m', since: Optional[int] = None, limit: int = 100) -> Optional[List[list]]:
+        if sandbox_mode:
+            from exchange_pool import ExchangePool
+            ExchangePool._apply_sandbox(self.exchange)
+
+    async def _ensure_markets_loaded(self, reload: bool = False):
+        if self._exchange_pool is not None:
+            await self._exchange_pool.ensure_markets_loaded(self.exchange, reload)
+        elif reload or not self.exchange.markets:
+            await self.exchange.load_markets(reload)
+
+    async def get_ohlcv(self, symbol: str, timeframe: str = '1m', since: Optional[int] = None, limit: int = 100,
+                        raise_errors: bool = False) -> Optional[List[list]]:
+        """
+        :param raise_errors: 为True时不吞掉异常，而是原样抛出 (交易所不支持时抛出 NotSupported)，
+                             便于调用方区分可重试与不可重试的错误。默认打印错误并返回None。
+        """
         if not self.exchange.has['fetchOHLCV']:
+            if raise_errors:
+                raise ccxtpro.NotSupported(f"{self.exchange.id} 不支持 fetchOHLCV 方法。")
             print(f"DataFetcher ({self.exchange.id}): 不支持 fetchOHLCV 方法。")
             return None # 或者 raise NotSupported
         try:
-            if not self.exchange.markets: await self.exchange.load_markets()
+            await self._ensure_markets_loaded()
             if symbol not in self.exchange.markets:
                 raise ValueError(f"交易对 {symbol} 在 {self.exchange.id} 上不存在。")
             ohlcv = await self.exchange.fetch_ohlcv(symbol, timeframe, since, limit)
             return ohlcv
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"DataFetcher ({self.exchange.id}): 获取 {symbol} {timeframe} K线数据时发生错误: {e}")
             return None
 
@@ -56,7 +88,7 @@ class DataFetcher:
         print(f"{log_prefix} 开始监听数据流...")
 
         try:
-            if not self.exchange.markets: await self.exchange.load_markets(True) # Force reload if needed
+            await self._ensure_markets_loaded()
         except Exception as e:
             print(f"{log_prefix} 为 {watch_method_name} 加载市场时出错: {e}. 流可能无法启动。")
             # 根据错误类型决定是否立即返回
@@ -226,7 +258,9 @@ class DataFetcher:
     async def close(self):
         print(f"DataFetcher ({self.exchange.id}): Closing...")
         await self.stop_all_streams()
-        if hasattr(self.exchange, 'close'):
+        if self._exchange_pool is not None:
+            await self._exchange_pool.release(self.exchange) # 最后一个使用者释放时才真正关闭
+        elif hasattr(self.exchange, 'close'):
             await self.exchange.close()
             print(f"DataFetcher: Exchange {self.exchange.id} connection closed.")
 
@@ -0,0 +1,208 @@
+import ccxt.pro as ccxtpro
+import asyncio
+from typing import Dict, Optional, Any, Tuple, Callable
+
+# 参与实例去重的凭证字段。其他配置项 (如 options) 以第一次创建实例时传入的为准。
+CREDENTIAL_FIELDS = ('apiKey', 'secret', 'password', 'uid')
+
+PoolKey = Tuple[str, Tuple[Optional[str], ...], bool]
+
+class _PoolEntry:
+    __slots__ = ('exchange', 'refcount', 'markets_lock', 'sandbox', 'needs_refresh', 'refresh_task')
+
+    def __init__(self, exchange, sandbox: bool):
+        self.exchange = exchange
+        self.refcount = 0
+        self.markets_lock = asyncio.Lock()
+        self.sandbox = sandbox
+        self.needs_refresh = False # 市场数据来自过期的磁盘缓存，需要在后台刷新
+        self.refresh_task: Optional[asyncio.Task] = None
+
+
+class ExchangePool:
+    """
+    进程内的交易所客户端注册表，按 (exchange_id, 凭证, sandbox) 共享 ccxt.pro 实例。
+
+    DataFetcher、AccountManager 和 OrderExecutor 通过同一个池获取实例时，
+    它们共用一套连接和一个 enableRateLimit 限速器，市场数据也只加载一次。
+    每次 acquire() 都要对应一次 release()，引用计数归零时才真正关闭连接。
+    配置了 markets_cache 时，新实例在创建时就装入磁盘缓存中的市场数据 (无网络请求)，
+    缓存过期则在第一次 ensure_markets_loaded() 时启动后台刷新。
+    """
+    def __init__(self, exchange_factory: Optional[Callable[[str, Dict[str, Any]], Any]] = None,
+                 markets_cache: Optional[Any] = None):
+        """
+        :param exchange_factory: 可选，创建交易所实例的函数 (exchange_id, config) -> exchange，
+                                 默认使用 ccxt.pro 中对应的交易所类。主要用于测试时注入假交易所。
+        :param markets_cache: 可选的 MarketsCache (见 markets_cache.py)。
+        """
+        self._exchange_factory = exchange_factory or self._create_ccxtpro_exchange
+        self.markets_cache = markets_cache
+        self._entries: Dict[PoolKey, _PoolEntry] = {}
+        self._keys_by_instance: Dict[int, PoolKey] = {}
+
+    @staticmethod
+    def _create_ccxtpro_exchange(exchange_id: str, config: Dict[str, Any]):
+        if exchange_id not in ccxtpro.exchanges:
+            raise ValueError(f"不支持的交易所: {exchange_id}. 可用交易所: {', '.join(ccxtpro.exchanges)}")
+        return getattr(ccxtpro, exchange_id)(config)
+
+    @staticmethod
+    def make_key(exchange_id: str, config: Optional[Dict[str, Any]] = None, sandbox: bool = False) -> PoolKey:
+        config = config or {}
+        return exchange_id, tuple(config.get(field) or None for field in CREDENTIAL_FIELDS), bool(sandbox)
+
+    @staticmethod
+    def _apply_sandbox(exchange):
+        if hasattr(exchange, 'set_sandbox_mode'):
+            exchange.set_sandbox_mode(True)
+            print(f"ExchangePool: 已为 {exchange.id} 启用沙箱模式。")
+        elif 'test' in getattr(exchange, 'urls', {}):
+            exchange.urls['api'] = exchange.urls['test']
+            print(f"ExchangePool: 已为 {exchange.id} 切换到测试网 API URL。")
+        else:
+            print(f"ExchangePool警告: {exchange.id} 可能不支持自动切换沙箱。")
+
+    def acquire(self, exchange_id: str, config: Optional[Dict[str, Any]] = None, sandbox: bool = False):
+        """
+        获取 (必要时创建) 一个共享的交易所实例，并增加其引用计数。
+
+        :param exchange_id: 交易所 ID。
+        :param config: 交易所配置 (包含凭证)。默认启用 enableRateLimit。
+        :param sandbox: 是否使用沙箱/测试网。
+        """
+        key = self.make_key(exchange_id, config, sandbox)
+        entry = self._entries.get(key)
+        if entry is None:
+            exchange_config = {'enableRateLimit': True}
+            if config:
+                exchange_config.update(config)
+            exchange = self._exchange_factory(exchange_id, exchange_config)
+            if sandbox:
+                self._apply_sandbox(exchange)
+            entry = self._entries[key] = _PoolEntry(exchange, sandbox)
+            self._keys_by_instance[id(exchange)] = key
+            if self.markets_cache is not None:
+                age = self.markets_cache.load_into(exchange, sandbox)
+                entry.needs_refresh = age is not None and not self.markets_cache.is_fresh(age)
+            print(f"ExchangePool: 创建 {exchange_id} 实例 (sandbox={sandbox})。")
+        entry.refcount += 1
+        return entry.exchange
+
+    def refcount(self, exchange) -> int:
+        key = self._keys_by_instance.get(id(exchange))
+        return self._entries[key].refcount if key is not None else 0
+
+    async def ensure_markets_loaded(self, exchange, reload: bool = False):
+        """
+        确保共享实例的市场数据已加载。并发调用只会触发一次 load_markets，其余调用等待其完成。
+        不属于本池的实例直接调用 load_markets。
+        """
+        key = self._keys_by_instance.get(id(exchange))
+        if key is None:
+            if reload or not exchange.markets:
+                await exchange.load_markets(reload)
+            return
+        entry = self._entries[key]
+        if entry.needs_refresh and not reload:
+            entry.needs_refresh = False
+            entry.refresh_task = asyncio.create_task(self.markets_cache.refresh(exchange, entry.sandbox))
+        async with entry.markets_lock:
+            if reload or not exchange.markets:
+                print(f"ExchangePool ({exchange.id}): 正在加载市场数据...")
+                await exchange.load_markets(reload)
+                if self.markets_cache is not None:
+                    self.markets_cache.save(exchange, entry.sandbox)
+
+    @staticmethod
+    async def _cancel_refresh(entry: _PoolEntry):
+        task, entry.refresh_task = entry.refresh_task, None
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def release(self, exchange):
+        """减少引用计数，归零时关闭连接并从池中移除。不属于本池的实例会被直接关闭。"""
+        key = self._keys_by_instance.get(id(exchange))
+        if key is None:
+            if hasattr(exchange, 'close'):
+                await exchange.close()
+            return
+        entry = self._entries[key]
+        entry.refcount -= 1
+        if entry.refcount > 0:
+            return
+        del self._entries[key]
+        del self._keys_by_instance[id(exchange)]
+        await self._cancel_refresh(entry)
+        if hasattr(exchange, 'close'):
+            await exchange.close()
+        print(f"ExchangePool: {exchange.id} 实例的最后一个使用者已释放，连接已关闭。")
+
+    async def close_all(self):
+        """关闭池中所有实例 (忽略引用计数)，用于进程退出时的清理。"""
+        entries, self._entries = list(self._entries.values()), {}
+        self._keys_by_instance = {}
+        for entry in entries:
+            await self._cancel_refresh(entry)
+            if hasattr(entry.exchange, 'close'):
+                await entry.exchange.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 进程级默认池
+default_exchange_pool = ExchangePool()
+
+
+if __name__ == '__main__':
+    from data_fetcher import DataFetcher
+    from account_manager import AccountManager
+    from order_executor import OrderExecutor
+
+    class FakeExchange:
+        """最小的假交易所：记录 load_markets 调用次数，模拟一次较慢的市场数据加载。"""
+        def __init__(self, exchange_id, config):
+            self.id = exchange_id
+            self.apiKey = config.get('apiKey')
+            self.secret = config.get('secret')
+            self.has = {}
+            self.urls = {}
+            self.markets = {}
+            self.load_calls = 0
+            self.closed = False
+
+        async def load_markets(self, reload=False):
+            self.load_calls += 1
+            await asyncio.sleep(0.1)
+            self.markets = {'BTC/USDT': {}}
+            return self.markets
+
+        async def close(self):
+            self.closed = True
+
+    async def demo():
+        pool = ExchangePool(exchange_factory=FakeExchange)
+        creds = {'apiKey': 'k', 'secret': 's'}
+        fetcher = DataFetcher('fake', config=creds, exchange_pool=pool)
+        account = AccountManager('fake', config=creds, exchange_pool=pool)
+        executor = OrderExecutor('fake', config=creds, exchange_pool=pool)
+        exchange = fetcher.exchange
+        print(f"Shared instance: {exchange is account.exchange is executor.exchange}, "
+              f"pool entries: {len(pool)}, refcount: {pool.refcount(exchange)}")
+
+        await asyncio.gather(fetcher._ensure_markets_loaded(), executor._ensure_markets_loaded(),
+                             pool.ensure_markets_loaded(account.exchange))
+        print(f"load_markets calls after three concurrent loads: {exchange.load_calls}")
+
+        await fetcher.close()
+        await account.close()
+        print(f"After two releases: closed={exchange.closed}, refcount={pool.refcount(exchange)}")
+        await executor.close()
+        print(f"After last release: closed={exchange.closed}, pool entries: {len(pool)}")
+
+    asyncio.run(demo())
@@ -0,0 +1,319 @@
+import asyncio
+import csv
+import os
+import time
+from typing import List, Dict, Any, Optional, Union, Iterable, Tuple
+
+import ccxt.pro as ccxtpro
+import numpy as np
+import pandas as pd
+
+from data_fetcher import DataFetcher
+from timeframes import timeframe_to_ms
+
+CSV_HEADER = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+# 重试也不会成功的错误 (交易对不存在、参数错误、认证/权限问题、交易所不支持)，遇到时立即放弃
+NON_RETRYABLE_ERRORS = (ValueError, ccxtpro.BadRequest, ccxtpro.AuthenticationError,
+                        ccxtpro.PermissionDenied, ccxtpro.NotSupported)
+
+class HistoricalDownloader:
+    """
+    基于 DataFetcher 的批量历史K线下载器。
+
+    - 对每个 (交易对, 周期) 用 since 向前翻页调用 fetch_ohlcv，直到 until。
+      历史中间的空页 (交易所数据缺口) 按一页的时间跨度跳过，不会提前结束下载。页的大小取交易所实际返回过的
+      最大页 (不超过 page_limit)，因为很多交易所每页的上限低于 page_limit，按 page_limit 跳过会漏掉缺口之后的K线。
+    - 同一交易所上同时进行的请求数由 asyncio.Semaphore 限制 (交易所实例自身的 enableRateLimit 仍然生效)。
+    - 结果追加写入 data_dir 下的 CSV (文件名如 BTCUSDT-1m.csv，即 HistoricalDataFeeder 读取的格式)；
+      再次运行时从文件中最后一根K线之后继续下载。
+    """
+    def __init__(self, data_fetcher: DataFetcher, data_dir: str = 'data/historical',
+                 max_concurrency: int = 3, page_limit: int = 1000, max_retries: int = 3,
+                 retry_delay: float = 1.0):
+        """
+        :param data_fetcher: DataFetcher 实例 (可通过 exchange 参数注入假交易所用于测试)。
+        :param data_dir: CSV 文件所在目录。
+        :param max_concurrency: 同时进行的 fetch_ohlcv 请求上限。
+        :param page_limit: 每页请求的K线数量。
+        :param max_retries: 单页请求失败时的最大重试次数。
+        :param retry_delay: 首次重试前的等待秒数，之后每次翻倍。
+        """
+        self.data_fetcher = data_fetcher
+        self.data_dir = data_dir
+        self.max_concurrency = max_concurrency
+        self.page_limit = page_limit
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._max_page_rows = 0 # 交易所实际返回过的最大页行数，用于跳过数据缺口
+
+    def csv_path(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.data_dir, f"{symbol.replace('/', '')}-{timeframe}.csv")
+
+    @staticmethod
+    def _last_complete_row(csv_filepath: str) -> Tuple[Optional[int], int]:
+        """
+        只读取文件末尾，找到最后一个完整的行: 以换行结尾、有全部6个字段的K线行 (或表头)。
+        进程崩溃时留下的半行不算完整行。
+
+        :return: (该行的时间戳，表头则为None; 该行结束处的文件偏移，其后的内容都是不完整的)。
+        """
+        with open(csv_filepath, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            start = max(0, size - 4096)
+            f.seek(start)
+            tail = f.read()
+        end = len(tail)
+        while True:
+            newline = tail.rfind(b'\n', 0, end)
+            if newline < 0:
+                break
+            line_start = tail.rfind(b'\n', 0, newline) + 1
+            if line_start == 0 and start > 0: # 行首不在读取的范围内，无法判断
+                break
+            fields = tail[line_start:newline].rstrip(b'\r').split(b',')
+            if len(fields) == len(CSV_HEADER):
+                first_field = fields[0].strip()
+                if first_field.isdigit():
+                    return int(first_field), start + newline + 1
+                if first_field == CSV_HEADER[0].encode():
+                    return None, start + newline + 1
+            end = line_start
+        return None, (0 if start == 0 else size)
+
+    @staticmethod
+    def last_cached_timestamp(csv_filepath: str) -> Optional[int]:
+        """返回最后一根完整K线的时间戳；文件不存在或没有完整的数据行时返回None。"""
+        if not os.path.exists(csv_filepath):
+            return None
+        return HistoricalDownloader._last_complete_row(csv_filepath)[0]
+
+    @staticmethod
+    def _truncate_partial_tail(csv_filepath: str):
+        """把文件截断到最后一个完整的行，丢弃崩溃时写了一半的行，避免下次追加粘在半行之后。"""
+        if not os.path.exists(csv_filepath):
+            return
+        _, valid_end = HistoricalDownloader._last_complete_row(csv_filepath)
+        size = os.path.getsize(csv_filepath)
+        if valid_end < size:
+            print(f"HistoricalDownloader: dropping {size - valid_end} bytes of incomplete data at the end of {csv_filepath}.")
+            with open(csv_filepath, 'r+b') as f:
+                f.truncate(valid_end)
+
+    async def _fetch_page(self, symbol: str, timeframe: str, since: int) -> Optional[List[list]]:
+        """
+        在并发限制内获取一页K线，可重试的错误按指数退避重试，全部失败返回None。
+        NON_RETRYABLE_ERRORS (例如交易对不存在) 直接抛出，不再重试。
+        """
+        delay = self.retry_delay
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    return await self.data_fetcher.get_ohlcv(symbol, timeframe, since=since, limit=self.page_limit,
+                                                             raise_errors=True)
+            except NON_RETRYABLE_ERRORS:
+                raise
+            except Exception as e:
+                error = e
+            if attempt < self.max_retries:
+                print(f"HistoricalDownloader [{symbol}@{timeframe}]: page since={since} failed with "
+                      f"{type(error).__name__}: {error} (attempt {attempt}/{self.max_retries}), retrying in {delay}s...")
+                await asyncio.sleep(delay)
+                delay *= 2
+        return None
+
+    @staticmethod
+    def _to_ms(value: Union[int, np.integer, str, None]) -> Optional[int]:
+        if value is None:
+            return None
+        if isinstance(value, (int, np.integer)): # 整数 (包括NumPy整数) 都视为毫秒时间戳
+            return int(value)
+        return pd.to_datetime(value).value // 10**6
+
+    async def download(self, symbol: str, timeframe: str,
+                       since: Union[int, str, None] = None,
+                       until: Union[int, str, None] = None) -> Dict[str, Any]:
+        """
+        下载一个交易对的K线并追加到CSV。
+
+        :param since: 起始时间 (毫秒或日期字符串)。已有缓存时从缓存之后继续，忽略更早的 since。
+        :param until: 结束时间 (包含)。默认为最后一根已收盘K线。
+        :return: 汇总信息 {'symbol', 'timeframe', 'path', 'rows_written', 'first_ts', 'last_ts', 'error'}。
+        """
+        tf_ms = timeframe_to_ms(timeframe)
+        path = self.csv_path(symbol, timeframe)
+        since_ms = self._to_ms(since)
+        until_ms = self._to_ms(until)
+        if until_ms is None:
+            until_ms = (int(time.time() * 1000) // tf_ms - 1) * tf_ms # 正在形成的K线不落盘
+
+        self._truncate_partial_tail(path)
+        last_ts = self.last_cached_timestamp(path)
+        if last_ts is not None:
+            since_ms = max(since_ms or 0, last_ts + tf_ms)
+        if since_ms is None:
+            raise ValueError(f"HistoricalDownloader: {symbol}@{timeframe} 没有本地缓存，必须提供 since。")
+
+        summary = {'symbol': symbol, 'timeframe': timeframe, 'path': path,
+                   'rows_written': 0, 'first_ts': None, 'last_ts': last_ts, 'error': None}
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        cursor = since_ms
+        while cursor <= until_ms:
+            try:
+                page = await self._fetch_page(symbol, timeframe, cursor)
+            except NON_RETRYABLE_ERRORS as e:
+                summary['error'] = f"{type(e).__name__}: {e}"
+                print(f"HistoricalDownloader [{symbol}@{timeframe}]: non-retryable error at since={cursor}: {summary['error']}")
+                break
+            if page is None:
+                summary['error'] = f"fetch_ohlcv failed at since={cursor}"
+                print(f"HistoricalDownloader [{symbol}@{timeframe}]: giving up at since={cursor}; "
+                      f"rerun to resume from the cached data.")
+                break
+
+            self._max_page_rows = max(self._max_page_rows, min(len(page), self.page_limit))
+            rows = [row[:6] for row in page if cursor <= row[0] <= until_ms
+                    and (summary['last_ts'] is None or row[0] > summary['last_ts'])]
+            if not rows: # 数据缺口：跳过交易所一页实际覆盖的时间跨度继续，直到 until
+                cursor += (self._max_page_rows or self.page_limit) * tf_ms
+                continue
+
+            write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+            with open(path, 'a', newline='') as f:
+                writer = csv.writer(f)
+                if write_header:
+                    writer.writerow(CSV_HEADER)
+                writer.writerows(rows)
+
+            if summary['first_ts'] is None:
+                summary['first_ts'] = rows[0][0]
+            summary['last_ts'] = rows[-1][0]
+            summary['rows_written'] += len(rows)
+            cursor = rows[-1][0] + tf_ms
+
+        print(f"HistoricalDownloader [{symbol}@{timeframe}]: wrote {summary['rows_written']} bars to {path}.")
+        return summary
+
+    async def download_many(self, symbols: Iterable[str], timeframes: Iterable[str],
+                            since: Union[int, str, None] = None,
+                            until: Union[int, str, None] = None) -> List[Dict[str, Any]]:
+        """
+        并发下载多个交易对和周期的组合。每个组合内按页顺序下载，组合之间共享并发上限。
+        单个组合失败不会影响其他组合，错误记录在返回结果的 'error' 字段中。
+        """
+        jobs = [(symbol, timeframe) for symbol in symbols for timeframe in timeframes]
+        results = await asyncio.gather(*(self.download(s, tf, since, until) for s, tf in jobs),
+                                       return_exceptions=True)
+        summaries = []
+        for (symbol, timeframe), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                result = {'symbol': symbol, 'timeframe': timeframe, 'path': self.csv_path(symbol, timeframe),
+                          'rows_written': 0, 'first_ts': None, 'last_ts': None,
+                          'error': f"{type(result).__name__}: {result}"}
+            summaries.append(result)
+        return summaries
+
+
+if __name__ == '__main__':
+    import tempfile
+    import numpy as np
+    from backtest.historical_data import HistoricalDataFeeder
+
+    class FakeExchange:
+        """模拟 ccxt 交易所的最小接口：分页返回确定性的K线，记录并发请求数，偶尔失败一次。"""
+        id = 'fake'
+        has = {'fetchOHLCV': True}
+
+        def __init__(self, first_ts: int, n_bars: int, max_page: int = 500, fail_every: int = 7, gap=None):
+            self.markets = {}
+            self.gap = gap # 可选 (起始序号, 结束序号)：这段K线缺失，模拟交易所停机
+            self.first_ts = first_ts
+            self.n_bars = n_bars
+            self.max_page = max_page
+            self.fail_every = fail_every
+            self.calls = 0
+            self.in_flight = 0
+            self.max_in_flight = 0
+
+        async def load_markets(self, reload=False):
+            self.markets = {'BTC/USDT': {}, 'ETH/USDT': {}, 'SOL/USDT': {}}
+            return self.markets
+
+        async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None):
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(0.005)
+                if self.fail_every and self.calls % self.fail_every == 0:
+                    raise RuntimeError("simulated 429")
+                tf_ms = timeframe_to_ms(timeframe)
+                start = max(0, -(-(since - self.first_ts) // tf_ms))
+                end = min(self.n_bars, start + min(limit or self.max_page, self.max_page))
+                base = 100.0 * (1 + len(symbol))
+                return [[self.first_ts + i * tf_ms, base + i, base + i + 1, base + i - 1, base + i + 0.5, 1.0]
+                        for i in range(start, end) if not (self.gap and self.gap[0] <= i < self.gap[1])]
+            finally:
+                self.in_flight -= 1
+
+        async def close(self):
+            pass
+
+    async def demo():
+        first_ts = 1_672_531_200_000
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fake = FakeExchange(first_ts, n_bars=3_000)
+            downloader = HistoricalDownloader(DataFetcher(exchange=fake), data_dir=tmp_dir,
+                                              max_concurrency=2, retry_delay=0.01)
+            symbols = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']
+            half = first_ts + 1_499 * 60_000
+
+            print("--- First run (up to the middle of the history) ---")
+            for s in await downloader.download_many(symbols, ['1m'], since=first_ts, until=half):
+                print(f"  {s['symbol']}: +{s['rows_written']} rows, last_ts={s['last_ts']}, error={s['error']}")
+
+            print("--- Second run (resumes from cache) ---")
+            for s in await downloader.download_many(symbols, ['1m'], since=first_ts,
+                                                    until=first_ts + 2_999 * 60_000):
+                print(f"  {s['symbol']}: +{s['rows_written']} rows, last_ts={s['last_ts']}, error={s['error']}")
+            print(f"fetch_ohlcv calls: {fake.calls}, max concurrent requests: {fake.max_in_flight} (limit 2)")
+
+            feeder = HistoricalDataFeeder(downloader.csv_path('BTC/USDT', '1m'), 'BTC/USDT', '1m', columnar=True)
+            ts = feeder.columns['timestamp']
+            print(f"Feeder sees {len(feeder)} bars, strictly increasing by 1m: {bool(np.all(np.diff(ts) == 60_000))}")
+
+            print("--- History with a 2,000-bar outage in the middle (NumPy timestamps) ---")
+            gap_fake = FakeExchange(first_ts, n_bars=6_000, fail_every=0, gap=(2_000, 4_000))
+            gap_downloader = HistoricalDownloader(DataFetcher(exchange=gap_fake), data_dir=tmp_dir, retry_delay=0.01)
+            s = await gap_downloader.download('ETH/USDT', '5m', since=np.int64(first_ts),
+                                              until=np.int64(first_ts + 5_999 * 300_000))
+            print(f"  +{s['rows_written']} rows (expect 4000), last_ts is the final bar: "
+                  f"{s['last_ts'] == first_ts + 5_999 * 300_000}, error={s['error']}")
+
+            print("--- 500-bar outage on an exchange capped at 300 bars per page (page_limit 1000) ---")
+            capped_fake = FakeExchange(first_ts, n_bars=3_000, max_page=300, fail_every=0, gap=(1_000, 1_500))
+            capped_downloader = HistoricalDownloader(DataFetcher(exchange=capped_fake), data_dir=tmp_dir, retry_delay=0.01)
+            s = await capped_downloader.download('SOL/USDT', '15m', since=first_ts, until=first_ts + 2_999 * 900_000)
+            print(f"  +{s['rows_written']} rows (expect 2500), error={s['error']}")
+
+            print("--- Resume after a crash left a half-written last line ---")
+            path = capped_downloader.csv_path('SOL/USDT', '15m')
+            with open(path, 'rb+') as f:
+                f.truncate(os.path.getsize(path) - 20) # 最后一行只剩前半截
+            last_complete = first_ts + 2_998 * 900_000
+            print(f"  last_cached_timestamp skips the partial line: "
+                  f"{HistoricalDownloader.last_cached_timestamp(path) == last_complete}")
+            s = await capped_downloader.download('SOL/USDT', '15m', until=first_ts + 2_999 * 900_000)
+            repaired = pd.read_csv(path)
+            print(f"  +{s['rows_written']} rows (expect 1), file has {len(repaired)} rows with "
+                  f"{int(repaired.isna().sum().sum())} empty fields, strictly increasing: "
+                  f"{bool((repaired['timestamp'].diff().dropna() > 0).all())}")
+
+            print("--- Unknown symbol fails fast ---")
+            calls_before = gap_fake.calls
+            s = await gap_downloader.download('DOGE/USDT', '1m', since=first_ts, until=first_ts + 10 * 60_000)
+            print(f"  error={s['error']!r}, fetch_ohlcv calls: {gap_fake.calls - calls_before} (no retries)")
+
+    asyncio.run(demo())
@@ -0,0 +1,463 @@
+import math
+import numpy as np
+from typing import Optional, Dict, Tuple, Any, List
+
+class RingBuffer:
+    """
+    定长 NumPy 环形缓冲区。写满后新值覆盖最旧的值，内存占用固定。
+    """
+    __slots__ = ('_data', '_capacity', '_pos', '_count')
+
+    def __init__(self, capacity: int, dtype=np.float64):
+        """
+        :param capacity: 缓冲区容量 (必须大于0)。
+        :param dtype: 元素类型。
+        """
+        if capacity <= 0:
+            raise ValueError(f"RingBuffer 容量必须大于0，实际: {capacity}")
+        self._data = np.zeros(capacity, dtype=dtype)
+        self._capacity = capacity
+        self._pos = 0   # 下一个写入位置
+        self._count = 0
+
+    def append(self, value) -> Optional[float]:
+        """
+        写入一个值。
+
+        :return: 被覆盖的最旧值；缓冲区未满时返回None。
+        """
+        evicted = self._data[self._pos].item() if self._count == self._capacity else None
+        self._data[self._pos] = value
+        self._pos = (self._pos + 1) % self._capacity
+        if self._count < self._capacity:
+            self._count += 1
+        return evicted
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def full(self) -> bool:
+        return self._count == self._capacity
+
+    @property
+    def at_wrap(self) -> bool:
+        """写指针刚回到起点 (即每写满一轮)。供增量指标定期重新求和以消除浮点累计误差。"""
+        return self._pos == 0
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i: int):
+        """按时间顺序访问，支持负下标 (-1 为最新值)。"""
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("RingBuffer 下标越界")
+        return self._data[(self._pos - self._count + i) % self._capacity].item()
+
+    def to_array(self) -> np.ndarray:
+        """按时间顺序 (旧 -> 新) 返回数据的拷贝。"""
+        if self._count < self._capacity:
+            return self._data[:self._count].copy()
+        return np.concatenate((self._data[self._pos:], self._data[:self._pos]))
+
+    def clear(self):
+        self._pos = 0
+        self._count = 0
+
+
+class SMA:
+    """
+    简单移动平均，O(1) 增量更新。与 pd.Series.rolling(period).mean() 一致。
+    """
+    __slots__ = ('period', '_buffer', '_sum', 'value')
+
+    def __init__(self, period: int):
+        self.period = period
+        self._buffer = RingBuffer(period)
+        self._sum = 0.0
+        self.value: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.value is not None
+
+    def update(self, x: float) -> Optional[float]:
+        """加入一个新值，返回最新的均值；数据不足 period 个时返回None。"""
+        evicted = self._buffer.append(x)
+        if self._buffer.at_wrap:
+            self._sum = float(self._buffer._data.sum()) # 每轮重新求和一次，摊销 O(1)，避免误差累积
+        else:
+            self._sum += x - (evicted or 0.0)
+        self.value = self._sum / self.period if self._buffer.full else None
+        return self.value
+
+    def reset(self):
+        self._buffer.clear()
+        self._sum = 0.0
+        self.value = None
+
+
+class EMA:
+    """
+    指数移动平均，O(1) 增量更新。与 pd.Series.ewm(span=period, adjust=False, min_periods=period).mean() 一致：
+    从第一个值开始递推，前 period-1 个值不输出。
+    """
+    __slots__ = ('period', 'alpha', '_ema', '_count', 'value')
+
+    def __init__(self, period: int, alpha: Optional[float] = None):
+        """
+        :param period: 周期 (span)。
+        :param alpha: 可选，直接指定平滑系数 (例如 Wilder 平滑用 1/period)，默认 2/(period+1)。
+        """
+        self.period = period
+        self.alpha = alpha if alpha is not None else 2.0 / (period + 1.0)
+        self._ema: Optional[float] = None
+        self._count = 0
+        self.value: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.value is not None
+
+    def update(self, x: float) -> Optional[float]:
+        if self._ema is None:
+            self._ema = float(x)
+        else:
+            self._ema += self.alpha * (x - self._ema)
+        self._count += 1
+        self.value = self._ema if self._count >= self.period else None
+        return self.value
+
+    def reset(self):
+        self._ema = None
+        self._count = 0
+        self.value = None
+
+
+class RollingStd:
+    """
+    滚动标准差，O(1) 增量更新 (滑动窗口 Welford 算法，数值稳定)。
+    与 pd.Series.rolling(period).std(ddof=ddof) 一致。
+    """
+    __slots__ = ('period', 'ddof', '_buffer', '_mean', '_m2', 'value')
+
+    def __init__(self, period: int, ddof: int = 1):
+        if period <= ddof:
+            raise ValueError(f"RollingStd 的周期 ({period}) 必须大于 ddof ({ddof})")
+        self.period = period
+        self.ddof = ddof
+        self._buffer = RingBuffer(period)
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.value: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.value is not None
+
+    def update(self, x: float) -> Optional[float]:
+        n_before = len(self._buffer)
+        evicted = self._buffer.append(x)
+        if evicted is None: # 窗口未满：标准 Welford 累加
+            delta = x - self._mean
+            self._mean += delta / (n_before + 1)
+            self._m2 += delta * (x - self._mean)
+        else:               # 窗口已满：用新值替换最旧的值
+            old_mean = self._mean
+            self._mean += (x - evicted) / self.period
+            self._m2 += (x - evicted) * (x - self._mean + evicted - old_mean)
+        if self._buffer.at_wrap: # 每轮按定义重新计算一次，摊销 O(1)
+            window = self._buffer._data
+            self._mean = float(window.mean())
+            self._m2 = float(((window - self._mean) ** 2).sum())
+
+        if self._buffer.full:
+            self.value = math.sqrt(max(self._m2, 0.0) / (self.period - self.ddof))
+        else:
+            self.value = None
+        return self.value
+
+    def reset(self):
+        self._buffer.clear()
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.value = None
+
+
+class ATR:
+    """
+    平均真实波幅 (Wilder 平滑)。
+    TR = max(high - low, |high - prev_close|, |low - prev_close|)，第一根K线的 TR 为 high - low；
+    ATR = TR.ewm(alpha=1/period, adjust=False, min_periods=period).mean()。
+    """
+    __slots__ = ('period', '_prev_close', '_ema', 'value')
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self._prev_close: Optional[float] = None
+        self._ema = EMA(period, alpha=1.0 / period)
+        self.value: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.value is not None
+
+    def update(self, high: float, low: float, close: float) -> Optional[float]:
+        if self._prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+        self._prev_close = close
+        self.value = self._ema.update(tr)
+        return self.value
+
+    def reset(self):
+        self._prev_close = None
+        self._ema.reset()
+        self.value = None
+
+
+class RSI:
+    """
+    相对强弱指数 (Wilder 平滑)。
+    以收盘价的逐根变化计算，平均涨幅/跌幅为 ewm(alpha=1/period, adjust=False, min_periods=period)；
+    平均跌幅为0时 RSI 为100。
+    """
+    __slots__ = ('period', '_prev_close', '_avg_gain', '_avg_loss', 'value')
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self._prev_close: Optional[float] = None
+        self._avg_gain = EMA(period, alpha=1.0 / period)
+        self._avg_loss = EMA(period, alpha=1.0 / period)
+        self.value: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.value is not None
+
+    def update(self, close: float) -> Optional[float]:
+        prev, self._prev_close = self._prev_close, close
+        if prev is None:
+            return None
+        change = close - prev
+        avg_gain = self._avg_gain.update(change if change > 0 else 0.0)
+        avg_loss = self._avg_loss.update(-change if change < 0 else 0.0)
+        if avg_gain is None or avg_loss is None:
+            self.value = None
+        elif avg_loss == 0:
+            self.value = 100.0
+        else:
+            self.value = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+        return self.value
+
+    def reset(self):
+        self._prev_close = None
+        self._avg_gain.reset()
+        self._avg_loss.reset()
+        self.value = None
+
+
+# IndicatorRegistry 可创建的指标。name -> (类, 输入)。输入为 'close' 的指标用收盘价更新，'hlc' 用 (high, low, close)。
+INDICATOR_TYPES: Dict[str, Tuple[type, str]] = {
+    'sma': (SMA, 'close'),
+    'ema': (EMA, 'close'),
+    'std': (RollingStd, 'close'),
+    'atr': (ATR, 'hlc'),
+    'rsi': (RSI, 'close'),
+}
+
+IndicatorKey = Tuple[str, str, str, Tuple[Tuple[str, Any], ...]]
+
+
+class IndicatorHandle:
+    """
+    共享指标的只读视图。策略通过它读取最新值，不能推进指标的状态。
+    """
+    __slots__ = ('key', '_indicator')
+
+    def __init__(self, key: IndicatorKey, indicator):
+        self.key = key
+        self._indicator = indicator
+
+    @property
+    def value(self) -> Optional[float]:
+        return self._indicator.value
+
+    @property
+    def ready(self) -> bool:
+        return self._indicator.value is not None
+
+    def __repr__(self):
+        symbol, timeframe, name, params = self.key
+        args = ', '.join(f"{k}={v}" for k, v in params)
+        return f"IndicatorHandle({symbol}@{timeframe} {name}({args}) = {self.value})"
+
+
+class _RegistryEntry:
+    __slots__ = ('indicator', 'source', 'refcount')
+
+    def __init__(self, indicator, source: str):
+        self.indicator = indicator
+        self.source = source
+        self.refcount = 0
+
+
+class IndicatorRegistry:
+    """
+    按 (symbol, timeframe, 指标名, 参数) 共享的指标注册表，由策略引擎/回测引擎持有。
+
+    多个策略订阅同一交易对和周期上的同一指标时，只创建一个实例，每根K线只计算一次，
+    各策略通过 IndicatorHandle 只读共享结果。引擎在把K线交给 on_bar 之前调用 update()；
+    每次 acquire() 都要对应一次 release()，引用计数归零时指标被移除。
+    """
+    def __init__(self):
+        self._entries: Dict[IndicatorKey, _RegistryEntry] = {}
+        # (symbol, timeframe) -> 该数据流上的指标，update() 时直接遍历
+        self._by_stream: Dict[Tuple[str, str], Dict[IndicatorKey, _RegistryEntry]] = {}
+        self._last_timestamp: Dict[Tuple[str, str], int] = {}
+
+    @staticmethod
+    def make_key(symbol: str, timeframe: str, name: str, **params) -> IndicatorKey:
+        return symbol, timeframe, name.lower(), tuple(sorted(params.items()))
+
+    def acquire(self, symbol: str, timeframe: str, name: str, **params) -> IndicatorHandle:
+        """
+        获取 (必要时创建) 一个共享指标，并增加其引用计数。
+
+        :param symbol: 交易对。
+        :param timeframe: K线周期。
+        :param name: 指标名称，见 INDICATOR_TYPES (例如 'sma')。
+        :param params: 指标构造参数 (例如 period=20)。
+        """
+        key = self.make_key(symbol, timeframe, name, **params)
+        entry = self._entries.get(key)
+        if entry is None:
+            if key[2] not in INDICATOR_TYPES:
+                raise ValueError(f"未知的指标: {name}. 可用指标: {', '.join(INDICATOR_TYPES)}")
+            indicator_cls, source = INDICATOR_TYPES[key[2]]
+            entry = self._entries[key] = _RegistryEntry(indicator_cls(**params), source)
+            self._by_stream.setdefault((symbol, timeframe), {})[key] = entry
+        entry.refcount += 1
+        return IndicatorHandle(key, entry.indicator)
+
+    def release(self, handle: IndicatorHandle):
+        """减少引用计数，归零时移除该指标。"""
+        entry = self._entries.get(handle.key)
+        if entry is None:
+            return
+        entry.refcount -= 1
+        if entry.refcount > 0:
+            return
+        del self._entries[handle.key]
+        stream_key = handle.key[:2]
+        stream_entries = self._by_stream[stream_key]
+        del stream_entries[handle.key]
+        if not stream_entries:
+            del self._by_stream[stream_key]
+            self._last_timestamp.pop(stream_key, None)
+
+    def refcount(self, handle: IndicatorHandle) -> int:
+        entry = self._entries.get(handle.key)
+        return entry.refcount if entry else 0
+
+    def update(self, symbol: str, timeframe: str, timestamp: int, high: float, low: float, close: float) -> bool:
+        """
+        用一根已收盘的K线更新该数据流上的全部指标。同一时间戳 (或更早) 的K线只处理一次。
+
+        :return: 是否实际进行了计算。
+        """
+        stream_key = (symbol, timeframe)
+        stream_entries = self._by_stream.get(stream_key)
+        if not stream_entries:
+            return False
+        last_ts = self._last_timestamp.get(stream_key)
+        if last_ts is not None and timestamp <= last_ts:
+            return False
+        self._last_timestamp[stream_key] = timestamp
+        for entry in stream_entries.values():
+            if entry.source == 'close':
+                entry.indicator.update(close)
+            else:
+                entry.indicator.update(high, low, close)
+        return True
+
+    def __len__(self):
+        return len(self._entries)
+
+
+if __name__ == '__main__':
+    # 与 pandas 参考实现对比。pandas 的 rolling std 本身是增量算法，误差在 1e-9 (相对) 量级，
+    # 因此 RollingStd 使用 1e-7 的容差，并额外与按定义逐窗口计算的精确值对比。
+    import time
+    import pandas as pd
+
+    rng = np.random.default_rng(42)
+    n = 20_000
+    close = 20_000 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    high = close * (1 + rng.uniform(0, 0.003, n))
+    low = close * (1 - rng.uniform(0, 0.003, n))
+    s_close, s_high, s_low = pd.Series(close), pd.Series(high), pd.Series(low)
+
+    def reference_atr(period):
+        prev_close = s_close.shift(1)
+        tr = pd.concat([s_high - s_low, (s_high - prev_close).abs(), (s_low - prev_close).abs()], axis=1).max(axis=1)
+        return tr.ewm(alpha=1 / period, adjust=False, min_periods=period).mean()
+
+    def reference_rsi(period):
+        delta = s_close.diff()
+        gain = delta.clip(lower=0).ewm(alpha=1 / period, adjust=False, min_periods=period).mean()
+        loss = (-delta.clip(upper=0)).ewm(alpha=1 / period, adjust=False, min_periods=period).mean()
+        return (100 - 100 / (1 + gain / loss)).where(loss != 0, 100.0).where(gain.notna())
+
+    exact_std = np.full(n, np.nan)
+    exact_std[29:] = np.lib.stride_tricks.sliding_window_view(close, 30).std(axis=1, ddof=1)
+
+    cases = [
+        ("SMA(20)", lambda: SMA(20), lambda ind, i: ind.update(close[i]), s_close.rolling(20).mean(), 1e-9),
+        ("EMA(50)", lambda: EMA(50), lambda ind, i: ind.update(close[i]),
+         s_close.ewm(span=50, adjust=False, min_periods=50).mean(), 1e-9),
+        ("RollingStd(30)", lambda: RollingStd(30), lambda ind, i: ind.update(close[i]), s_close.rolling(30).std(ddof=1), 1e-7),
+        ("RollingStd exact", lambda: RollingStd(30), lambda ind, i: ind.update(close[i]), pd.Series(exact_std), 1e-9),
+        ("ATR(14)", lambda: ATR(14), lambda ind, i: ind.update(high[i], low[i], close[i]), reference_atr(14), 1e-9),
+        ("RSI(14)", lambda: RSI(14), lambda ind, i: ind.update(close[i]), reference_rsi(14), 1e-9),
+    ]
+
+    print(f"--- Streaming indicators vs pandas reference ({n} bars) ---")
+    all_ok = True
+    for name, make, step, reference, tol in cases:
+        indicator = make()
+        t0 = time.perf_counter()
+        streamed = np.array([np.nan if (v := step(indicator, i)) is None else v for i in range(n)])
+        elapsed = time.perf_counter() - t0
+        expected = reference.to_numpy()
+        ok = bool(np.array_equal(np.isnan(streamed), np.isnan(expected))
+                  and np.allclose(streamed, expected, rtol=tol, atol=tol, equal_nan=True))
+        all_ok &= ok
+        max_err = np.nanmax(np.abs(streamed - expected))
+        print(f"  {name:<16} match={ok}  max|err|={max_err:.2e}  {elapsed / n * 1e6:.2f} us/update")
+    print(f"All indicators match pandas: {all_ok}")
+
+    buf = RingBuffer(4)
+    for v in range(1, 7):
+        buf.append(v)
+    print(f"RingBuffer(4) after 1..6: {buf.to_array().tolist()}, latest={buf[-1]}, oldest={buf[0]}")
+
+    # 两个策略在同一数据流上共享 SMA(20)：只计算一次，重复推送的K线被忽略，最后一个使用者释放后移除
+    registry = IndicatorRegistry()
+    h1 = registry.acquire("BTC/USDT", "1m", "sma", period=20)
+    h2 = registry.acquire("BTC/USDT", "1m", "sma", period=20)
+    h3 = registry.acquire("BTC/USDT", "1m", "atr", period=14)
+    for i in range(n):
+        registry.update("BTC/USDT", "1m", i, high[i], low[i], close[i])
+        registry.update("BTC/USDT", "1m", i, high[i], low[i], close[i]) # 重复推送
+    print(f"Registry: {len(registry)} indicators for 3 handles, shared={h1._indicator is h2._indicator}, "
+          f"SMA(20) matches pandas: {np.isclose(h2.value, s_close.rolling(20).mean().iloc[-1], rtol=1e-9)}, "
+          f"ATR(14) matches pandas: {np.isclose(h3.value, reference_atr(14).iloc[-1], rtol=1e-9)}")
+    registry.release(h1)
+    print(f"After one release: refcount={registry.refcount(h2)}, entries={len(registry)}")
+    registry.release(h2); registry.release(h3)
+    print(f"After all releases: entries={len(registry)}")
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+import time
+from typing import Optional, Dict, Any
+
+class MarketsCache:
+    """
+    交易所市场元数据的磁盘缓存。
+
+    启动时用缓存文件调用 exchange.set_markets()，之后 ccxt 内部的 load_markets() 直接返回已有数据，
+    不需要任何网络请求；缓存超过 ttl 时仍先使用旧数据，再由调用方在后台调用 refresh() 更新。
+    文件位置: {cache_dir}/{exchange_id}[-sandbox].json
+    """
+    def __init__(self, cache_dir: str = 'data/markets_cache', ttl: float = 24 * 3600):
+        """
+        :param cache_dir: 缓存目录。
+        :param ttl: 缓存有效期 (秒)。过期的缓存仍会被加载，但 load_into() 会报告其需要刷新。
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def path_for(self, exchange_id: str, sandbox: bool = False) -> str:
+        return os.path.join(self.cache_dir, f"{exchange_id}{'-sandbox' if sandbox else ''}.json")
+
+    def load_into(self, exchange, sandbox: bool = False) -> Optional[float]:
+        """
+        把缓存的市场数据装入交易所实例 (不产生网络请求)。
+
+        :return: 缓存的年龄 (秒)；没有可用缓存时返回None。
+        """
+        path = self.path_for(exchange.id, sandbox)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            exchange.set_markets(payload['markets'], payload.get('currencies'))
+        except Exception as e:
+            print(f"MarketsCache ({exchange.id}): 读取缓存 '{path}' 失败，将从交易所加载: {type(e).__name__}: {e}")
+            return None
+        age = max(0.0, time.time() - payload.get('saved_at', 0))
+        print(f"MarketsCache ({exchange.id}): 从缓存加载了 {len(exchange.markets)} 个市场 (缓存年龄 {age:.0f}s)。")
+        return age
+
+    def is_fresh(self, age: Optional[float]) -> bool:
+        return age is not None and age <= self.ttl
+
+    def save(self, exchange, sandbox: bool = False):
+        """把交易所实例当前的市场数据写入缓存 (先写临时文件再原子替换)。"""
+        if not exchange.markets:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path_for(exchange.id, sandbox)
+        payload: Dict[str, Any] = {
+            'saved_at': time.time(),
+            'markets': list(exchange.markets.values()),
+            'currencies': getattr(exchange, 'currencies', None) or None,
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, default=str)
+        os.replace(tmp_path, path)
+
+    async def refresh(self, exchange, sandbox: bool = False):
+        """从交易所重新加载市场数据并更新缓存。失败时保留当前数据。"""
+        try:
+            await exchange.load_markets(True)
+            self.save(exchange, sandbox)
+            print(f"MarketsCache ({exchange.id}): 市场数据已刷新 ({len(exchange.markets)} 个市场)。")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"MarketsCache ({exchange.id}): 后台刷新失败，继续使用缓存数据: {type(e).__name__}: {e}")
+
+
+if __name__ == '__main__':
+    import tempfile
+    import ccxt.pro as ccxtpro
+    from exchange_pool import ExchangePool
+
+    N_MARKETS = 3000
+
+    def make_offline_exchange(exchange_id, config):
+        """真实的 ccxt.pro 实例，但 fetch_markets 被替换为本地的慢速假实现 (不访问网络)。"""
+        exchange = getattr(ccxtpro, exchange_id)(config)
+        exchange.fetch_markets_calls = 0
+
+        async def fetch_markets(params={}):
+            exchange.fetch_markets_calls += 1
+            await asyncio.sleep(0.5) # 模拟大型交易所的市场接口耗时
+            return [{'id': f'C{i}USDT', 'symbol': f'C{i}/USDT', 'base': f'C{i}', 'quote': 'USDT',
+                     'baseId': f'C{i}', 'quoteId': 'USDT', 'active': True, 'type': 'spot', 'spot': True,
+                     'margin': False, 'swap': False, 'future': False, 'option': False, 'contract': False,
+                     'settle': None, 'settleId': None, 'precision': {'amount': 0.001, 'price': 0.01},
+                     'limits': {'amount': {'min': 0.001, 'max': None}}, 'info': {}} for i in range(N_MARKETS)]
+
+        async def fetch_currencies(params={}):
+            return {}
+
+        exchange.fetch_markets = fetch_markets
+        exchange.fetch_currencies = fetch_currencies
+        return exchange
+
+    async def start_once(cache: MarketsCache, label: str):
+        pool = ExchangePool(exchange_factory=make_offline_exchange, markets_cache=cache)
+        t0 = time.perf_counter()
+        exchange = pool.acquire('binance')
+        await pool.ensure_markets_loaded(exchange)
+        ready_s = time.perf_counter() - t0
+        print(f"[{label}] markets ready after {ready_s:.3f}s ({len(exchange.markets)} markets, "
+              f"blocking fetch_markets calls: {exchange.fetch_markets_calls})")
+        await asyncio.sleep(0.7) # 让后台刷新 (如有) 完成
+        print(f"[{label}] fetch_markets calls after background refresh window: {exchange.fetch_markets_calls}")
+        await pool.release(exchange)
+
+    async def demo():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            await start_once(MarketsCache(tmp_dir, ttl=3600), "cold start, no cache")
+            await start_once(MarketsCache(tmp_dir, ttl=3600), "restart, fresh cache")
+            await start_once(MarketsCache(tmp_dir, ttl=0), "restart, expired cache")
+
+    asyncio.run(demo())
@@ -4,11 +4,17 @@ import os
 from typing import Callable, Optional, Dict # For type hinting
 
 class OrderExecutor:
-    def __init__(self, exchange_id='binance', api_key=None, secret_key=None, password=None, config=None, sandbox_mode=False):
-        if exchange_id not in ccxtpro.exchanges:
+    def __init__(self, exchange_id='binance', api_key=None, secret_key=None, password=None, config=None, sandbox_mode=False,
+                 exchange_pool=None):
+        """
+        :param exchange_pool: 可选的 ExchangePool。提供时从池中获取与其他组件共享的实例 (沙箱设置也由池负责)，
+                              close() 时只释放引用。
+        """
+        self._exchange_pool = exchange_pool
+        self._active_order_streams = {}
+        if exchange_pool is None and exchange_id not in ccxtpro.exchanges:
             raise ValueError(f"不支持的交易所: {exchange_id}. 可用交易所: {', '.join(ccxtpro.exchanges)}")
 
-        exchange_class = getattr(ccxtpro, exchange_id)
         exchange_config = {'enableRateLimit': True}
         if config: exchange_config.update(config)
         else:
@@ -21,7 +27,11 @@ class OrderExecutor:
             exchange_config['secret'] = final_secret_key
             if final_password: exchange_config['password'] = final_password
 
-        self.exchange = exchange_class(exchange_config)
+        if exchange_pool is not None:
+            self.exchange = exchange_pool.acquire(exchange_id, exchange_config, sandbox=sandbox_mode)
+            return
+
+        self.exchange = getattr(ccxtpro, exchange_id)(exchange_config)
 
         if sandbox_mode:
             if hasattr(self.exchange, 'set_sandbox_mode'):
@@ -33,9 +43,10 @@ class OrderExecutor:
             else:
                 print(f"OrderExecutor警告: {self.exchange.id} 可能不支持自动切换沙箱。")
 
-        self._active_order_streams = {}
-
     async def _ensure_markets_loaded(self):
+        if self._exchange_pool is not None: # 共享实例：由池保证只加载一次
+            await self._exchange_pool.ensure_markets_loaded(self.exchange)
+            return
         if not self.exchange.markets:
             print(f"OrderExecutor ({self.exchange.id}): 正在加载市场数据...")
             try:
@@ -212,7 +223,9 @@ class OrderExecutor:
     async def close(self):
         print(f"OrderExecutor ({self.exchange.id}): 正在关闭...")
         await self.stop_all_order_streams()
-        if hasattr(self.exchange, 'close'):
+        if self._exchange_pool is not None:
+            await self._exchange_pool.release(self.exchange)
+        elif hasattr(self.exchange, 'close'):
             await self.exchange.close()
             print(f"OrderExecutor: 交易所 {self.exchange.id} 连接已关闭。")
 
@@ -1,12 +1,11 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
+import numpy as np
 import pandas as pd
 
-# Assuming event definitions are in core.event
-# This import path needs to be correct relative to the project structure
-# When running from project root, `from src.cqt.core.event import ...` might be needed
-# but for modules within the package, relative imports or absolute from package root are used.
-from crypto_quant_framework.core.event import Event, RegimeChangeEvent, MarketRegime
+# Absolute import from the package root ('src' must be on sys.path, as main.py arranges).
+from cqt.core.event import Event, RegimeChangeEvent, MarketRegime
 
 class MarketRegimeAnalyzerBase(ABC):
     """
@@ -82,9 +81,35 @@ class MarketRegimeAnalyzerBase(ABC):
         # else:
             # print(f"ANALYZER [{self.name}]: Regime for {symbol} remains {new_regime.value}. No event published.")
 
+class EMAState:
+    """
+    Streaming exponential moving average, updated in O(1) per value.
+    Matches ``pd.Series.ewm(span=period, adjust=False).mean()`` started from the first value seen.
+    """
+    __slots__ = ('period', 'alpha', 'value', 'count')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.alpha = 2.0 / (period + 1.0)
+        self.value: Optional[float] = None
+        self.count = 0
+
+    def update(self, x: float) -> float:
+        if self.value is None:
+            self.value = float(x)
+        else:
+            self.value += self.alpha * (x - self.value)
+        self.count += 1
+        return self.value
+
+
 class SimpleMovingAverageRegimeAnalyzer(MarketRegimeAnalyzerBase):
     """
     A market regime analyzer based on the relationship between multiple moving averages.
+
+    EMAs are kept as streaming state per (symbol, period), so each bar costs O(number of periods)
+    regardless of history length. ``label_regimes`` applies the same rules to a whole
+    historical DataFrame in one vectorized pass.
     """
     def __init__(self,
                  analyzer_name: str,
@@ -95,71 +120,93 @@ class SimpleMovingAverageRegimeAnalyzer(MarketRegimeAnalyzerBase):
         super().__init__(analyzer_name, symbols, timeframe, event_bus, params)
 
         # Default EMA periods, can be overridden by params in config
-        self.ema_periods = self.params.get('ema_periods', [20, 50, 100])
-        self.ema_periods.sort() # Ensure periods are sorted from shortest to longest
+        self.ema_periods = sorted(self.params.get('ema_periods', [20, 50, 100])) # Shortest to longest
 
         if len(self.ema_periods) < 2:
             raise ValueError("SimpleMovingAverageRegimeAnalyzer requires at least 2 EMA periods.")
 
-        # Data buffer to store close prices for calculating EMAs
-        self.data_buffers: Dict[str, pd.Series] = {s: pd.Series(dtype=float) for s in self.symbols}
         self.min_data_points = self.ema_periods[-1] # Need at least enough data for the longest EMA
+        # Streaming EMA state per (symbol, period) and the last processed bar timestamp per symbol
+        self.ema_states: Dict[Tuple[str, int], EMAState] = {
+            (s, p): EMAState(p) for s in self.symbols for p in self.ema_periods}
+        self._last_timestamp: Dict[str, Optional[int]] = {s: None for s in self.symbols}
 
         print(f"SimpleMovingAverageRegimeAnalyzer [{self.name}] initialized with EMA periods: {self.ema_periods}")
 
+    @staticmethod
+    def _classify(ema_values: List[float], close: float) -> MarketRegime:
+        # Simple logic: Check if EMAs are stacked in ascending or descending order
+        is_trending_up = all(ema_values[i] <= ema_values[i+1] for i in range(len(ema_values)-1)) and (close > ema_values[-1])
+        is_trending_down = all(ema_values[i] >= ema_values[i+1] for i in range(len(ema_values)-1)) and (close < ema_values[-1])
+        if is_trending_up:
+            return MarketRegime.TRENDING_UP
+        if is_trending_down:
+            return MarketRegime.TRENDING_DOWN
+        return MarketRegime.RANGING
+
+    def update(self, symbol: str, timestamp: int, close: float) -> Optional[Tuple[MarketRegime, Dict[str, float]]]:
+        """
+        Feed one closed bar into the streaming state.
+
+        :return: (regime, details) once enough bars have been seen, otherwise None.
+                 Bars with a timestamp not newer than the last processed one are ignored.
+        """
+        last_ts = self._last_timestamp.get(symbol)
+        if last_ts is not None and timestamp <= last_ts:
+            return None
+        self._last_timestamp[symbol] = timestamp
+
+        ema_values = [self.ema_states[(symbol, p)].update(close) for p in self.ema_periods]
+        if self.ema_states[(symbol, self.ema_periods[-1])].count < self.min_data_points:
+            return None
+
+        details = {f"ema_{p}": round(v, 4) for p, v in zip(self.ema_periods, ema_values)}
+        details['close'] = close
+        return self._classify(ema_values, close), details
+
     def process_market_data(self, symbol: str, data: pd.Series):
         """
         Process a single new bar of market data.
         :param symbol: The symbol of the market data.
-        :param data: A pandas Series representing a single OHLCV bar.
+        :param data: A pandas Series (or any mapping) representing a single OHLCV bar.
         """
         if symbol not in self.symbols:
             return # Not subscribed to this symbol
 
-        # Append new close price to the buffer
-        new_bar_timestamp = data['timestamp']
-        new_close_price = data['close']
-
-        # This simple implementation just appends. A more robust one would handle timestamps
-        # to ensure no duplicates and keep the buffer size limited.
-        self.data_buffers[symbol] = pd.concat([self.data_buffers[symbol], pd.Series([new_close_price])], ignore_index=True)
-
-        # Keep buffer size manageable (e.g., twice the longest EMA period)
-        max_buffer_size = self.min_data_points * 2
-        if len(self.data_buffers[symbol]) > max_buffer_size:
-            self.data_buffers[symbol] = self.data_buffers[symbol].iloc[-max_buffer_size:]
-
-        # Check if we have enough data to calculate all EMAs
-        if len(self.data_buffers[symbol]) < self.min_data_points:
-            # print(f"Analyzer [{self.name}]: Not enough data for {symbol}. Have {len(self.data_buffers[symbol])}, need {self.min_data_points}.")
+        result = self.update(symbol, int(data['timestamp']), float(data['close']))
+        if result is None:
             return
+        new_regime, details = result
 
-        # Calculate EMAs
-        emas = {}
-        for period in self.ema_periods:
-            emas[period] = self.data_buffers[symbol].ewm(span=period, adjust=False).mean().iloc[-1]
+        # Publish event if regime has changed (checked here to avoid scheduling a task on every bar)
+        if self.event_bus is not None and new_regime != self._last_regime.get(symbol, MarketRegime.UNDEFINED):
+            asyncio.create_task(self._publish_regime_change(int(data['timestamp']), symbol, new_regime, details))
 
-        # Determine regime
-        # Simple logic: Check if EMAs are stacked in ascending or descending order
-        ema_values = [emas[p] for p in self.ema_periods]
-
-        is_trending_up = all(ema_values[i] <= ema_values[i+1] for i in range(len(ema_values)-1)) and (new_close_price > ema_values[-1])
-        is_trending_down = all(ema_values[i] >= ema_values[i+1] for i in range(len(ema_values)-1)) and (new_close_price < ema_values[-1])
+    def label_regimes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Label every bar of a historical OHLCV DataFrame (single symbol, sorted by time) in one vectorized pass.
+        Uses the same EMA definition and rules as the streaming path, so results match bar-by-bar processing
+        from the start of ``df``. Does not touch the streaming state.
 
-        new_regime = MarketRegime.UNDEFINED
-        if is_trending_up:
-            new_regime = MarketRegime.TRENDING_UP
-        elif is_trending_down:
-            new_regime = MarketRegime.TRENDING_DOWN
-        else:
-            new_regime = MarketRegime.RANGING
+        :param df: DataFrame with at least a 'close' column.
+        :return: DataFrame indexed like ``df`` with one 'ema_<period>' column per period and a 'regime'
+                 column of MarketRegime values (UNDEFINED during the warm-up of the longest EMA).
+        """
+        close = df['close'].astype(float)
+        emas = np.column_stack([close.ewm(span=p, adjust=False).mean().to_numpy() for p in self.ema_periods])
+        close_arr = close.to_numpy()
 
-        # Prepare details for the event
-        details = {f"ema_{p}": round(v, 4) for p, v in emas.items()}
-        details['close'] = new_close_price
+        steps = np.diff(emas, axis=1)
+        up = np.all(steps >= 0, axis=1) & (close_arr > emas[:, -1])
+        down = np.all(steps <= 0, axis=1) & (close_arr < emas[:, -1])
+        codes = np.where(up, 0, np.where(down, 1, 2))
+        codes[:self.min_data_points - 1] = 3
 
-        # Publish event if regime has changed
-        asyncio.create_task(self._publish_regime_change(int(new_bar_timestamp), symbol, new_regime, details))
+        labels = np.array([MarketRegime.TRENDING_UP, MarketRegime.TRENDING_DOWN,
+                           MarketRegime.RANGING, MarketRegime.UNDEFINED], dtype=object)
+        result = pd.DataFrame(emas, index=df.index, columns=[f"ema_{p}" for p in self.ema_periods])
+        result['regime'] = labels[codes]
+        return result
 
 
 if __name__ == '__main__':
@@ -223,10 +270,35 @@ if __name__ == '__main__':
             event = await bus.queue.get()
             print(f"  - {event}")
 
+    def test_sma_regime_analyzer():
+        print("\n--- Testing SimpleMovingAverageRegimeAnalyzer (streaming vs batch) ---")
+        import time
+        rng = np.random.default_rng(5)
+        n_bars = 20_000
+        close = 20_000 * np.exp(np.cumsum(rng.normal(0, 0.002, n_bars)))
+        df = pd.DataFrame({'timestamp': np.arange(n_bars) * 60_000, 'close': close})
+
+        analyzer = SimpleMovingAverageRegimeAnalyzer("SMA_BTC", ["BTC/USDT"], "1m")
+        t0 = time.perf_counter()
+        streamed = [analyzer.update("BTC/USDT", int(ts), float(c)) for ts, c in zip(df['timestamp'], df['close'])]
+        stream_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        labelled = analyzer.label_regimes(df)
+        batch_s = time.perf_counter() - t0
+
+        streamed_regimes = [r[0] if r else MarketRegime.UNDEFINED for r in streamed]
+        final_emas = [analyzer.ema_states[("BTC/USDT", p)].value for p in analyzer.ema_periods]
+        print(f"Streaming: {stream_s / n_bars * 1e6:.2f} us/bar; batch label_regimes: {batch_s * 1000:.1f} ms for {n_bars} bars")
+        print(f"Regimes identical: {streamed_regimes == list(labelled['regime'])}; "
+              f"final EMAs match pandas: {np.allclose(final_emas, labelled.iloc[-1, :-1].to_numpy(dtype=float))}")
+        print(labelled['regime'].map(lambda r: r.value).value_counts().to_string())
+
     if __name__ == '__main__':
         try:
             import asyncio
             asyncio.run(test_dummy_analyzer())
+            test_sma_regime_analyzer()
         except ImportError:
             print("Could not run test, asyncio not found.")
         except Exception as e:
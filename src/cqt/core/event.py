@@ -1,22 +1,36 @@
 import asyncio
+import logging
+import sys
+from collections import deque
 from enum import Enum
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Tuple, Type, Union
+
+logger = logging.getLogger(__name__)
 
 # --- Event Base Class ---
 class Event:
     """
     Base class for all events in the system.
-    Each event has a 'type' attribute for easy identification.
+    Each event has a 'type' attribute for easy identification. It is an interned class-level
+    string (the class name) set when the subclass is defined, not computed on access.
+
+    Events declare ``__slots__`` so instances carry no per-instance ``__dict__``.
+    Subclasses should declare ``__slots__`` for their own fields as well.
     """
-    @property
-    def type(self) -> str:
-        return self.__class__.__name__
+    __slots__ = ()
+    type: str = 'Event'
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.type = sys.intern(cls.__name__)
 
 # --- Market Data Events ---
 class MarketEvent(Event):
     """
     Handles the event of receiving new market data (e.g., a new bar/kline).
     """
+    __slots__ = ('symbol', 'timeframe', 'data', 'timestamp')
+
     def __init__(self,
                  symbol: str,
                  timeframe: Optional[str] = None,
@@ -37,6 +51,8 @@ class MarketRegime(Enum):
 
 class RegimeChangeEvent(Event):
     """Generated when a market regime change is detected."""
+    __slots__ = ('timestamp', 'symbol', 'timeframe', 'regime', 'details')
+
     def __init__(self,
                  timestamp: int,
                  symbol: str,
@@ -59,6 +75,8 @@ class SignalEvent(Event):
     Handles the event of a Strategy generating a signal (e.g., LONG, SHORT, EXIT).
     This is an intermediate step before an order is placed.
     """
+    __slots__ = ('strategy_name', 'symbol', 'side', 'strength')
+
     def __init__(self,
                  strategy_name: str,
                  symbol: str,
@@ -74,6 +92,8 @@ class OrderRequestEvent(Event):
     Handles the request to place an order on the exchange.
     Generated by the Portfolio/RiskManager after evaluating a SignalEvent.
     """
+    __slots__ = ('symbol', 'side', 'order_type', 'quantity', 'price', 'strategy_name')
+
     def __init__(self,
                  symbol: str,
                  side: str,
@@ -93,6 +113,8 @@ class OrderUpdateEvent(Event):
     Represents an update to an order's state from the exchange.
     Wraps the raw order data from the exchange.
     """
+    __slots__ = ('order_data',)
+
     def __init__(self, order_data: Dict):
         self.order_data = order_data # The full order dictionary from ccxt
 
@@ -101,6 +123,9 @@ class FillEvent(Event):
     Represents a trade that has been executed (a fill).
     This is generated from an OrderUpdateEvent when an order is filled or partially filled.
     """
+    __slots__ = ('timestamp', 'strategy_name', 'symbol', 'side', 'filled_qty', 'avg_fill_price', 'fee',
+                 'fee_currency', 'order_id', 'client_order_id')
+
     def __init__(self,
                  timestamp: int,
                  strategy_name: str,
@@ -124,33 +149,512 @@ class FillEvent(Event):
         self.client_order_id = client_order_id
 
 
+# --- Event Pooling ---
+class EventPool:
+    """
+    A free list of event instances for the hottest event types (e.g. MarketEvent), so a steady
+    stream reuses objects instead of allocating a new one per event.
+
+    ``acquire(*args, **kwargs)`` re-runs ``__init__`` on a released instance (or creates a new one).
+    ``release(event)`` must only be called once every consumer is done with the event. Because
+    the bus fans out events by reference, that means after all subscribers that received it have
+    processed it (for example after ``join()`` on their queues).
+    Never release an event that a consumer may still hold.
+    """
+    def __init__(self, event_cls: Type[Event], maxsize: int = 1024):
+        """
+        :param event_cls: The event class to pool.
+        :param maxsize: Maximum number of released instances kept for reuse.
+        """
+        self.event_cls = event_cls
+        self.maxsize = maxsize
+        self._free: List[Event] = []
+        self._init = event_cls.__init__
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, *args, **kwargs) -> Event:
+        free = self._free
+        if free:
+            event = free.pop()
+            self.reused += 1
+            self._init(event, *args, **kwargs)
+            return event
+        self.created += 1
+        return self.event_cls(*args, **kwargs)
+
+    def release(self, event: Event):
+        if len(self._free) < self.maxsize:
+            self._free.append(event)
+
+    def __len__(self) -> int:
+        return len(self._free)
+
+
 # --- Event Bus ---
+EventHandler = Callable[[Event], Union[None, Awaitable[None]]]
+
+class OverflowPolicy(Enum):
+    """What a bounded event queue does when an event arrives and the queue is full."""
+    BLOCK = "block"             # the producer waits for space (publish_nowait drops the new event instead)
+    DROP_OLDEST = "drop_oldest" # evict the oldest queued event
+    DROP_NEWEST = "drop_newest" # discard the incoming event
+    CONFLATE = "conflate"       # replace a queued event with the same key in place; if none, evict the oldest
+
+def default_conflate_key(event: Event) -> Tuple:
+    """Latest event per (event class, symbol, timeframe) wins, e.g. the latest ticker per symbol."""
+    return type(event), getattr(event, 'symbol', None), getattr(event, 'timeframe', None)
+
+class EventQueue(asyncio.Queue):
+    """
+    An asyncio.Queue with an overflow policy and counters.
+
+    With ``maxsize=0`` the queue is unbounded and behaves like asyncio.Queue (except under CONFLATE,
+    which still replaces queued events with the same key).
+    """
+    def __init__(self,
+                 maxsize: int = 0,
+                 policy: Union[OverflowPolicy, str] = OverflowPolicy.BLOCK,
+                 conflate_key: Optional[Callable[[Event], Any]] = None):
+        """
+        :param maxsize: Capacity of the queue. 0 means unbounded.
+        :param policy: OverflowPolicy (or its value) applied when the queue is full.
+        :param conflate_key: Key function for CONFLATE. Defaults to ``default_conflate_key``.
+        """
+        self.policy = OverflowPolicy(policy)
+        self.conflate_key = conflate_key or default_conflate_key
+        self._conflating = self.policy is OverflowPolicy.CONFLATE
+        self._blocking = self.policy is OverflowPolicy.BLOCK
+        self._capacity = maxsize if maxsize > 0 else float('inf')
+        super().__init__(maxsize)
+        self.delivered = 0  # events accepted into the queue (including ones that later got conflated/dropped)
+        self.dropped = 0    # events discarded by DROP_OLDEST / DROP_NEWEST / CONFLATE eviction
+        self.conflated = 0  # queued events replaced by a newer event with the same key
+        self.blocked = 0    # times a producer had to wait for space
+        self.high_water = 0 # largest queue size seen
+
+    # asyncio.Queue storage hooks. Under CONFLATE each entry is a mutable [key, event] slot,
+    # so a newer event can replace a queued one without changing its position.
+    def _init(self, maxsize):
+        self._queue = deque()
+        self._slots: Dict[Any, list] = {}
+
+    def _put(self, item):
+        if self._conflating:
+            key = self.conflate_key(item)
+            slot = [key, item]
+            self._slots[key] = slot
+            item = slot
+        self._queue.append(item)
+
+    def _get(self):
+        item = self._queue.popleft()
+        if self._conflating:
+            key, event = item
+            if self._slots.get(key) is item:
+                del self._slots[key]
+            return event
+        return item
+
+    def _accepted(self, size: int):
+        self.delivered += 1
+        if size > self.high_water:
+            self.high_water = size
+
+    def has_room(self) -> bool:
+        return len(self._queue) < self._capacity
+
+    def _evict_oldest(self):
+        self._get()
+        self.dropped += 1
+        self.task_done() # the evicted event will never be processed
+
+    def offer(self, event: Event) -> bool:
+        """
+        Enqueue ``event`` without waiting, applying the overflow policy.
+        A full BLOCK queue cannot wait here, so the incoming event is dropped.
+
+        :return: True if the event was queued (or replaced a queued event), False if it was dropped.
+        """
+        if self._conflating:
+            slot = self._slots.get(self.conflate_key(event))
+            if slot is not None:
+                slot[1] = event
+                self.conflated += 1
+                self.delivered += 1
+                return True
+        size = len(self._queue)
+        if size >= self._capacity:
+            if self.policy is OverflowPolicy.DROP_OLDEST or self._conflating:
+                self._evict_oldest()
+                size -= 1
+            else: # DROP_NEWEST, or BLOCK without the option to wait
+                self.dropped += 1
+                return False
+        self.put_nowait(event)
+        self._accepted(size + 1)
+        return True
+
+    async def put_event(self, event: Event) -> bool:
+        """
+        Enqueue ``event``: BLOCK waits for space, the other policies behave like ``offer``.
+
+        :return: True if the event was queued, False if it was dropped.
+        """
+        if not self._blocking:
+            return self.offer(event)
+        if self.full():
+            self.blocked += 1
+        await self.put(event)
+        self._accepted(len(self._queue))
+        return True
+
+    async def get_batch(self, max_n: int, max_wait: Optional[float] = None) -> List[Event]:
+        """
+        Take up to ``max_n`` events in one call.
+
+        :param max_n: Maximum number of events to return.
+        :param max_wait: None: wait for the first event, then return it together with whatever else
+                         is already queued (no lingering).
+                         A number of seconds: keep collecting until ``max_n`` events are taken or
+                         ``max_wait`` has passed since the call, then return (the list may be empty).
+                         0 drains only what is already queued.
+        :return: The events, oldest first. Call ``task_done(len(batch))`` once they are processed.
+        """
+        if max_n <= 0:
+            raise ValueError(f"max_n must be positive, got {max_n}")
+        loop = asyncio.get_running_loop()
+        deadline = None if max_wait is None else loop.time() + max_wait
+        batch = [] if deadline is not None else [await self.get()]
+        while True:
+            while self._queue and len(batch) < max_n:
+                batch.append(self.get_nowait())
+            if deadline is None or len(batch) >= max_n:
+                return batch
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return batch
+            try:
+                batch.append(await asyncio.wait_for(self.get(), remaining))
+            except asyncio.TimeoutError:
+                return batch
+
+    def task_done(self, n: int = 1):
+        """Mark ``n`` previously taken events as processed."""
+        for _ in range(n):
+            super().task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'policy': self.policy.value, 'maxsize': self.maxsize, 'qsize': self.qsize(),
+                'high_water': self.high_water, 'delivered': self.delivered, 'dropped': self.dropped,
+                'conflated': self.conflated, 'blocked': self.blocked}
+
+class Subscription:
+    """
+    One subscriber's view of an EventBus: a private queue that receives every published event
+    matching (event_cls, symbol).
+
+    Events are fanned out by reference - all subscribers receive the same object - so consumers
+    must treat events as read-only.
+    If a handler was given, the bus drains the queue with a dedicated task and the queue should
+    not be read directly. In batch mode (``batch_size`` set) the handler receives lists of events.
+    """
+    def __init__(self,
+                 bus: 'EventBus',
+                 event_cls: Type[Event],
+                 symbol: Optional[str] = None,
+                 handler: Optional[EventHandler] = None,
+                 name: Optional[str] = None,
+                 maxsize: int = 0,
+                 policy: Union[OverflowPolicy, str] = OverflowPolicy.BLOCK,
+                 conflate_key: Optional[Callable[[Event], Any]] = None,
+                 batch_size: Optional[int] = None,
+                 batch_wait: Optional[float] = None):
+        """
+        :param bus: The EventBus this subscription belongs to.
+        :param event_cls: Event class to receive. Subclasses are delivered too (``Event`` receives everything).
+        :param symbol: Optional. Only deliver events whose ``symbol`` equals this value.
+        :param handler: Optional callable (sync or async) invoked for every delivered event.
+        :param name: Optional name used in logs.
+        :param maxsize: Capacity of this subscriber's queue. 0 means unbounded.
+        :param policy: OverflowPolicy applied when the queue is full.
+        :param conflate_key: Key function for OverflowPolicy.CONFLATE.
+        :param batch_size: If set, the handler is called with lists of up to this many events (see get_batch).
+        :param batch_wait: ``max_wait`` passed to get_batch in batch mode.
+        """
+        self.bus = bus
+        self.event_cls = event_cls
+        self.symbol = symbol
+        self.handler = handler
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.name = name or f"{event_cls.__name__}[{symbol or '*'}]"
+        self.active = True
+        self._queue = EventQueue(maxsize, policy, conflate_key)
+        self._task: Optional[asyncio.Task] = None
+
+    def matches(self, event_cls: Type[Event], symbol: Optional[str]) -> bool:
+        return issubclass(event_cls, self.event_cls) and (self.symbol is None or self.symbol == symbol)
+
+    async def get(self) -> Event:
+        """
+        Get the next event for this subscriber. Blocks until one is available.
+        """
+        return await self._queue.get()
+
+    def get_nowait(self) -> Event:
+        """
+        Get the next event without waiting. Raises asyncio.QueueEmpty if there is none.
+        """
+        return self._queue.get_nowait()
+
+    async def get_batch(self, max_n: int = 1000, max_wait: Optional[float] = None) -> List[Event]:
+        """
+        Take up to ``max_n`` queued events with a single wakeup. See EventQueue.get_batch for ``max_wait``.
+        """
+        return await self._queue.get_batch(max_n, max_wait)
+
+    def task_done(self, n: int = 1):
+        self._queue.task_done(n)
+
+    async def join(self):
+        """
+        Block until every event delivered to this subscriber has been processed.
+        """
+        await self._queue.join()
+
+    def empty(self) -> bool:
+        return self._queue.empty()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Queue size, capacity and the delivered/dropped/conflated/blocked counters of this subscriber.
+        """
+        return self._queue.stats()
+
+    def unsubscribe(self):
+        self.bus.unsubscribe(self)
+
+    async def _run_batch_handler(self):
+        while True:
+            batch = await self._queue.get_batch(self.batch_size, self.batch_wait)
+            if not batch: # nothing arrived within batch_wait (immediately for batch_wait <= 0): block instead of polling
+                batch = await self._queue.get_batch(self.batch_size)
+            try:
+                result = self.handler(batch)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception:
+                logger.exception(f"Subscription '{self.name}': handler failed on a batch of {len(batch)} events")
+            finally:
+                self._queue.task_done(len(batch))
+
+    async def _run_handler(self):
+        while True:
+            event = await self._queue.get()
+            try:
+                result = self.handler(event)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception:
+                logger.exception(f"Subscription '{self.name}': handler failed on {event.type}")
+            finally:
+                self._queue.task_done()
+
+    def __repr__(self) -> str:
+        return f"Subscription({self.name}, queued={self.qsize()}, active={self.active})"
+
+
 class EventBus:
     """
-    A simple asynchronous event bus using asyncio.Queue.
+    An asynchronous event bus with topic-based fan-out.
+
+    - ``subscribe(event_cls, handler=None, symbol=None)`` registers a subscriber with its own queue.
+      ``publish(event)`` places the same event object in the queue of every matching subscriber.
+    - Matching subscribers are resolved once per (event class, symbol) and cached until the next
+      subscribe/unsubscribe, so publishing costs one dict lookup plus one enqueue per subscriber.
+    - Every queue can be bounded with an OverflowPolicy, so a slow consumer during a market-data
+      spike loses (or conflates) events and shows it in its counters instead of growing without limit.
+      BLOCK subscribers apply backpressure: ``publish`` waits until they have room.
+    - The legacy single-queue API (put/get/task_done/join/empty) is kept. ``put`` also
+      fans the event out to topic subscribers, so old producers reach new consumers.
+      The legacy queue only receives events while nobody subscribes to topics, or once a legacy
+      consumer has called ``get``/``get_batch``. A bus used only through topic subscriptions
+      therefore never fills an undrained legacy queue (or blocks forever on a bounded one).
     """
-    def __init__(self, name: str = "EventBus"):
-        self._queue = asyncio.Queue()
+    def __init__(self,
+                 name: str = "EventBus",
+                 maxsize: int = 0,
+                 policy: Union[OverflowPolicy, str] = OverflowPolicy.BLOCK):
+        """
+        :param name: Name of the bus, used in task names.
+        :param maxsize: Capacity of the legacy queue and the default capacity of subscriptions. 0 means unbounded.
+        :param policy: Overflow policy of the legacy queue and the default policy of subscriptions.
+        """
+        self._queue = EventQueue(maxsize, policy)
         self.name = name
+        self.maxsize = maxsize
+        self.policy = OverflowPolicy(policy)
+        self._subscriptions: List[Subscription] = [] # in subscription order
+        self._routes: Dict[Tuple[type, Optional[str]], Tuple[Subscription, ...]] = {}
+        self._legacy_consumer = False # set by the first get/get_batch on the bus itself
+
+    # --- Topic subscriptions ---
+    def subscribe(self,
+                  event_cls: Type[Event] = Event,
+                  handler: Optional[EventHandler] = None,
+                  symbol: Optional[str] = None,
+                  name: Optional[str] = None,
+                  maxsize: Optional[int] = None,
+                  policy: Union[OverflowPolicy, str, None] = None,
+                  conflate_key: Optional[Callable[[Event], Any]] = None,
+                  batch_size: Optional[int] = None,
+                  batch_wait: Optional[float] = None) -> Subscription:
+        """
+        Register a subscriber for events of ``event_cls`` (including subclasses), optionally only for one symbol.
+
+        :param event_cls: Event class to receive.
+        :param handler: Optional callable (sync or async). If given, a task is started that calls it for
+                        every delivered event, so this must be called from within a running event loop.
+        :param symbol: Optional symbol filter. Events without a ``symbol`` attribute only reach subscribers
+                       without a filter.
+        :param name: Optional name used in logs.
+        :param maxsize: Capacity of the subscriber's queue. Defaults to the bus's ``maxsize``.
+        :param policy: OverflowPolicy when the queue is full. Defaults to the bus's ``policy``.
+        :param conflate_key: Key function for OverflowPolicy.CONFLATE. Defaults to (event class, symbol, timeframe).
+        :param batch_size: Batch-handler mode: the handler is called with a list of up to ``batch_size`` events,
+                           taking everything queued in one wakeup instead of one await per event.
+        :param batch_wait: In batch-handler mode, how long to keep collecting before calling the handler
+                           (None: call it as soon as at least one event is available). If nothing arrives
+                           within ``batch_wait`` (at once for values <= 0) the handler task waits for the next event.
+        :return: The Subscription. Read it with ``await sub.get()`` unless a handler was given.
+        """
+        if not (isinstance(event_cls, type) and issubclass(event_cls, Event)):
+            raise TypeError(f"event_cls must be an Event subclass, got {event_cls!r}")
+        if batch_size is not None and (handler is None or batch_size <= 0):
+            raise ValueError("batch_size requires a handler and must be positive")
+        subscription = Subscription(self, event_cls, symbol, handler, name,
+                                    self.maxsize if maxsize is None else maxsize,
+                                    self.policy if policy is None else policy, conflate_key,
+                                    batch_size, batch_wait)
+        if handler is not None:
+            runner = subscription._run_batch_handler() if batch_size else subscription._run_handler()
+            subscription._task = asyncio.get_running_loop().create_task(
+                runner, name=f"{self.name}:{subscription.name}")
+        self._subscriptions.append(subscription)
+        self._routes.clear()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """
+        Stop routing events to ``subscription``. Events already in its queue stay there.
+        """
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+            self._routes.clear()
+        subscription.active = False
+        if subscription._task is not None:
+            subscription._task.cancel()
+
+    @property
+    def subscriptions(self) -> Tuple[Subscription, ...]:
+        return tuple(self._subscriptions)
+
+    def _route(self, event_cls: type, symbol: Optional[str]) -> Tuple[Subscription, ...]:
+        key = (event_cls, symbol)
+        route = self._routes.get(key)
+        if route is None:
+            route = tuple(s for s in self._subscriptions if s.matches(event_cls, symbol))
+            self._routes[key] = route
+        return route
+
+    def publish_nowait(self, event: Event) -> int:
+        """
+        Fan ``event`` out to every matching subscriber without copying it and without waiting.
+        Full BLOCK subscribers drop the event (counted in their ``dropped`` counter).
+
+        :return: Number of subscribers that queued the event.
+        """
+        delivered = 0
+        for subscription in self._route(type(event), getattr(event, 'symbol', None)):
+            delivered += subscription._queue.offer(event)
+        return delivered
+
+    async def publish(self, event: Event) -> int:
+        """
+        Fan ``event`` out to every matching subscriber without copying it.
+        Waits for space in full BLOCK subscribers (backpressure); other policies never wait.
+
+        :return: Number of subscribers that queued the event.
+        """
+        delivered = 0
+        for subscription in self._route(type(event), getattr(event, 'symbol', None)):
+            queue = subscription._queue
+            if queue._blocking and not queue.has_room():
+                delivered += await queue.put_event(event)
+            else:
+                delivered += queue.offer(event)
+        return delivered
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Counters of the legacy queue (key ``'<legacy>'``) and of every subscription, keyed by subscription name.
+        """
+        stats = {'<legacy>': self._queue.stats()}
+        for subscription in self._subscriptions:
+            stats[subscription.name] = subscription.stats()
+        return stats
+
+    async def close(self):
+        """
+        Unsubscribe everyone and wait for handler tasks to finish cancelling.
+        """
+        tasks = [s._task for s in self._subscriptions if s._task is not None]
+        for subscription in list(self._subscriptions):
+            self.unsubscribe(subscription)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # --- Legacy single-queue API ---
+    def _feeds_legacy_queue(self) -> bool:
+        return self._legacy_consumer or not self._subscriptions
 
     async def put(self, event: Event):
         """
         Put an event into the bus.
+        It is also published to topic subscribers.
+        The legacy queue receives it only if there are no topic subscribers or a legacy consumer
+        has started reading (``get``/``get_batch``); start legacy consumers before producing.
         """
-        await self._queue.put(event)
+        if self._feeds_legacy_queue():
+            await self._queue.put_event(event)
+        if isinstance(event, Event):
+            await self.publish(event)
 
     async def get(self) -> Event:
         """
         Get an event from the bus. Blocks until an event is available.
         """
+        self._legacy_consumer = True
         return await self._queue.get()
 
-    def task_done(self):
+    async def get_batch(self, max_n: int = 1000, max_wait: Optional[float] = None) -> List[Event]:
         """
-        Signal that a formerly enqueued task is complete.
+        Get up to ``max_n`` events from the bus with a single wakeup.
+        With ``max_wait=None`` it blocks until at least one event is available and returns everything
+        already queued (up to ``max_n``). Otherwise it collects for at most ``max_wait`` seconds.
+        """
+        self._legacy_consumer = True
+        return await self._queue.get_batch(max_n, max_wait)
+
+    def task_done(self, n: int = 1):
+        """
+        Signal that ``n`` formerly enqueued tasks are complete.
         Used for queue management.
         """
-        self._queue.task_done()
+        self._queue.task_done(n)
 
     async def join(self):
         """
@@ -163,3 +667,224 @@ class EventBus:
         Check if the event bus is empty.
         """
         return self._queue.empty()
+
+
+if __name__ == '__main__':
+    import gc
+    import time
+    import timeit
+
+    async def demo():
+        print("--- EventBus topic fan-out ---")
+        bus = EventBus()
+        all_market = bus.subscribe(MarketEvent, name="all-market")
+        btc_only = bus.subscribe(MarketEvent, symbol="BTC/USDT", name="btc-market")
+        everything = bus.subscribe(Event, name="everything")
+        fills_seen = []
+        bus.subscribe(FillEvent, handler=fills_seen.append, name="fill-handler")
+        regimes_seen = []
+
+        async def on_regime(event: RegimeChangeEvent):
+            regimes_seen.append(event.regime)
+        bus.subscribe(RegimeChangeEvent, handler=on_regime, symbol="ETH/USDT")
+
+        btc_bar = MarketEvent("BTC/USDT", "1m", {'timestamp': 1, 'close': 50_000.0})
+        await bus.publish(btc_bar)
+        await bus.publish(MarketEvent("ETH/USDT", "1m", {'timestamp': 1, 'close': 3_000.0}))
+        await bus.publish(FillEvent(1, "demo", "BTC/USDT", "buy", 0.1, 50_000.0, 5.0, "USDT", "o1"))
+        await bus.publish(RegimeChangeEvent(1, "ETH/USDT", "1h", MarketRegime.TRENDING_UP))
+        await bus.publish(RegimeChangeEvent(1, "BTC/USDT", "1h", MarketRegime.RANGING))
+        legacy_consumer = asyncio.create_task(bus.get()) # legacy consumers must start before the producer
+        await asyncio.sleep(0)
+        await bus.put(MarketEvent("SOL/USDT", "1m", {'timestamp': 1, 'close': 20.0})) # legacy producer
+        await asyncio.sleep(0) # let handler tasks run
+
+        print(f"  all-market: {all_market.qsize()} (expect 3), btc-market: {btc_only.qsize()} (expect 1), "
+              f"everything: {everything.qsize()} (expect 6)")
+        print(f"  fill handler got {len(fills_seen)} (expect 1), ETH regime handler got {regimes_seen}")
+        print(f"  same object delivered everywhere: {all_market.get_nowait() is btc_only.get_nowait() is btc_bar}")
+        legacy = await legacy_consumer
+        print(f"  legacy get(): {legacy.type} {legacy.symbol}")
+        await bus.close()
+
+        # Without a legacy consumer, put() only publishes: a bounded BLOCK legacy queue cannot fill up
+        bus = EventBus(maxsize=2)
+        topic_only = bus.subscribe(MarketEvent, handler=lambda event: None)
+        await asyncio.wait_for(asyncio.gather(*(bus.put(MarketEvent("BTC/USDT", "1m", None, i)) for i in range(5))), 1.0)
+        await asyncio.sleep(0)
+        print(f"  5 puts on EventBus(maxsize=2) with topic subscribers only: legacy queue size "
+              f"{bus.stats()['<legacy>']['qsize']} (expect 0), subscriber got {topic_only.stats()['delivered']}")
+        await bus.close()
+
+        print("--- Fan-out throughput ---")
+        n_events, n_subscribers = 100_000, 32
+        bus = EventBus()
+        subs = [bus.subscribe(MarketEvent) for _ in range(n_subscribers // 2)]
+        subs += [bus.subscribe(MarketEvent, symbol=s) for s in ("BTC/USDT", "ETH/USDT") for _ in range(n_subscribers // 4)]
+        events = [MarketEvent("BTC/USDT" if i % 2 else "ETH/USDT", "1m", None, i) for i in range(n_events)]
+        t0 = time.perf_counter()
+        deliveries = 0
+        for event in events:
+            deliveries += bus.publish_nowait(event)
+        publish_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for sub in subs:
+            while not sub.empty():
+                sub.get_nowait()
+                sub.task_done()
+        drain_s = time.perf_counter() - t0
+        print(f"  {n_events:,} events -> {deliveries:,} deliveries to {n_subscribers} subscribers: "
+              f"publish {publish_s:.2f}s ({deliveries / publish_s / 1e6:.1f}M deliveries/s), drain {drain_s:.2f}s")
+        await bus.close()
+
+        print("--- Burst draining: get() per event vs get_batch() ---")
+        burst = [MarketEvent(f"SYM{i % 50}/USDT", None, None, i) for i in range(200_000)]
+        for mode in ("get", "get_batch"):
+            bus = EventBus()
+            sub = bus.subscribe(MarketEvent)
+            processed = 0
+
+            async def consumer():
+                nonlocal processed
+                while processed < len(burst):
+                    if mode == "get":
+                        await sub.get()
+                        processed += 1
+                        sub.task_done()
+                    else:
+                        batch = await sub.get_batch(1000)
+                        processed += len(batch)
+                        sub.task_done(len(batch))
+
+            task = asyncio.create_task(consumer())
+            t0 = time.perf_counter()
+            for start in range(0, len(burst), 5_000): # bursts of 5,000 events
+                for event in burst[start:start + 5_000]:
+                    bus.publish_nowait(event)
+                await asyncio.sleep(0)
+            await task
+            print(f"  {mode:10s} {len(burst):,} events in {time.perf_counter() - t0:.2f}s")
+            await bus.close()
+
+        bus = EventBus()
+        batch_sizes = []
+        done = asyncio.Event()
+
+        def on_batch(events: List[MarketEvent]):
+            batch_sizes.append(len(events))
+            if sum(batch_sizes) == 10_000:
+                done.set()
+        bus.subscribe(MarketEvent, handler=on_batch, batch_size=2_000)
+        for event in burst[:10_000]:
+            bus.publish_nowait(event)
+        await done.wait()
+        print(f"  batch handler: 10,000 events in {len(batch_sizes)} calls {batch_sizes}")
+        print(f"  get_batch(10, max_wait=0.05) on an empty queue -> {await bus.get_batch(10, max_wait=0.05)}")
+        zero_wait_batches = []
+        bus.subscribe(MarketEvent, handler=zero_wait_batches.append, batch_size=100, batch_wait=0)
+        await asyncio.sleep(0.05) # an idle batch_wait=0 handler must suspend, not spin the loop
+        for event in burst[:250]:
+            bus.publish_nowait(event)
+        await asyncio.sleep(0)
+        print(f"  batch_wait=0 handler after idling: {sum(map(len, zero_wait_batches))} events in "
+              f"{len(zero_wait_batches)} calls (expect 250)")
+        await bus.close()
+
+        print("--- Market-data spike with a slow consumer (capacity 100 per subscriber) ---")
+        bus = EventBus(maxsize=100)
+        symbols = [f"SYM{i}/USDT" for i in range(20)]
+        spike = [MarketEvent(symbols[i % len(symbols)], None, {'timestamp': i, 'last': float(i)}) for i in range(50_000)]
+        by_policy = {policy: bus.subscribe(MarketEvent, name=policy.value, policy=policy)
+                     for policy in (OverflowPolicy.DROP_OLDEST, OverflowPolicy.DROP_NEWEST, OverflowPolicy.CONFLATE)}
+        blocking = bus.subscribe(MarketEvent, name="block", policy=OverflowPolicy.BLOCK)
+        consumed = 0
+
+        async def slow_consumer():
+            nonlocal consumed
+            while True:
+                await blocking.get()
+                consumed += 1
+                blocking.task_done()
+                if consumed % 10 == 0:
+                    await asyncio.sleep(0) # yield less often than the producer publishes
+
+        consumer = asyncio.create_task(slow_consumer())
+        t0 = time.perf_counter()
+        for event in spike:
+            await bus.publish(event)
+        await blocking.join()
+        elapsed = time.perf_counter() - t0
+        consumer.cancel()
+        for name, stats in bus.stats().items():
+            if name != '<legacy>':
+                print(f"  {name:12s} {stats}")
+        latest = {}
+        while not by_policy[OverflowPolicy.CONFLATE].empty():
+            event = by_policy[OverflowPolicy.CONFLATE].get_nowait()
+            latest[event.symbol] = event.data['last']
+        print(f"  conflated queue holds the latest tick of every symbol: "
+              f"{latest == {e.symbol: e.data['last'] for e in spike[-len(symbols):]}}")
+        print(f"  block: every one of {len(spike):,} events consumed ({consumed:,}) in {elapsed:.2f}s, "
+              f"queue never above {blocking.stats()['high_water']}")
+        await bus.close()
+
+    asyncio.run(demo())
+
+    print("--- Event construction and dispatch micro-benchmark ---")
+    class DictMarketEvent:
+        """The previous MarketEvent layout: per-instance __dict__ and a computed type property."""
+        def __init__(self, symbol, timeframe=None, data=None, timestamp=None):
+            self.symbol = symbol
+            self.timeframe = timeframe
+            self.data = data
+            self.timestamp = timestamp if timestamp is not None else (int(data['timestamp']) if isinstance(data, dict) and 'timestamp' in data else 0)
+
+        @property
+        def type(self) -> str:
+            return self.__class__.__name__
+
+    bar = {'timestamp': 1, 'close': 50_000.0}
+    slotted, plain = MarketEvent("BTC/USDT", "1m", bar), DictMarketEvent("BTC/USDT", "1m", bar)
+    pool = EventPool(MarketEvent)
+    pool.release(MarketEvent("BTC/USDT"))
+
+    def pooled():
+        pool.release(pool.acquire("BTC/USDT", "1m", bar))
+
+    n = 500_000
+    held = [] # keep constructed events alive briefly, as queued events are, so allocations reach the GC
+    def construct_dict():
+        held.append(DictMarketEvent("BTC/USDT", "1m", bar))
+        if len(held) > 1000: held.clear()
+    def construct_slots():
+        held.append(MarketEvent("BTC/USDT", "1m", bar))
+        if len(held) > 1000: held.clear()
+
+    gc_runs = {}
+    results = {}
+    for label, fn in (('construct (__dict__)', construct_dict), ('construct (__slots__)', construct_slots),
+                      ('acquire+release (EventPool)', pooled)):
+        collections_before = gc.get_stats()[0]['collections']
+        results[label] = timeit.timeit(fn, 'gc.enable()', number=n, globals={'gc': gc}) # timeit disables GC by default
+        gc_runs[label] = gc.get_stats()[0]['collections'] - collections_before
+    results.update({
+        'event.type (property)': timeit.timeit(lambda: plain.type, number=n),
+        'event.type (class attribute)': timeit.timeit(lambda: slotted.type, number=n),
+    })
+    bus = EventBus()
+    subs = [bus.subscribe(MarketEvent) for _ in range(4)]
+
+    def dispatch():
+        bus.publish_nowait(slotted)
+        for sub in subs:
+            sub.get_nowait()
+            sub.task_done()
+    results['publish to 4 subscribers + drain'] = timeit.timeit(dispatch, number=n // 5) * 5
+    for label, seconds in results.items():
+        gc_note = f"  ({gc_runs[label]} gen-0 GC runs)" if label in gc_runs else ""
+        print(f"  {label:34s} {seconds / n * 1e9:7.0f} ns/op{gc_note}")
+    dict_bytes = sys.getsizeof(plain) + sys.getsizeof(plain.__dict__)
+    print(f"  instance size: __dict__ {dict_bytes} bytes vs __slots__ {sys.getsizeof(slotted)} bytes; "
+          f"pool created {pool.created}, reused {pool.reused:,}")
+    print(f"  type tags interned: {MarketEvent.type is sys.intern('MarketEvent')}, "
+          f"no instance __dict__: {not hasattr(slotted, '__dict__')}")
@@ -135,6 +135,6 @@ class AllStreamsDemoStrategy(Strategy):
             print(f"  策略 [{self.name}]: 无需对 {symbol or 'GLOBAL'} 进行特定平仓操作。")
 
         # This strategy might decide to stop itself if a critical stream fails
-        # self._active = False # This would prevent further on_bar/on_trade/on_ticker calls
+        # self.active = False # This would prevent further on_bar/on_trade/on_ticker calls
         # print(f"策略 [{self.name}] 已将自身标记为非活动 due to stream failure.")
         pass
@@ -2,7 +2,7 @@ import pandas as pd
 import numpy as np
 from typing import Optional, Type, Dict, Any, List # For Pydantic and type hints
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, validator, ValidationError
 
 # Adjust path to import Strategy base class
 import sys
@@ -13,6 +13,7 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from strategy import Strategy # Base class
+from indicators import SMA
 
 # --- Pydantic Model for SimpleSMAStrategy Parameters ---
 class SimpleSMAParams(BaseModel):
@@ -20,6 +21,7 @@ class SimpleSMAParams(BaseModel):
     long_sma_period: int = Field(20, gt=0, description="Long-term SMA period.")
     subscribe_trades: bool = False
     subscribe_ticker: bool = False
+    order_amount: Optional[float] = Field(None, gt=0, description="If set, go long this amount on a golden cross and flatten on a death cross. None = signals only.")
     # Add any other parameters specific to SimpleSMAStrategy here with types and validation
 
     @validator('long_sma_period')
@@ -37,6 +39,7 @@ class SimpleSMAStrategy(Strategy):
     A simple moving average crossover strategy.
     - Generates a buy signal when the short-term SMA crosses above the long-term SMA.
     - Generates a sell signal when the short-term SMA crosses below the long-term SMA.
+    - If `order_amount` is set, trades the signals with market orders (long `order_amount` / flat).
     """
 
     @classmethod
@@ -68,6 +71,7 @@ class SimpleSMAStrategy(Strategy):
             self.long_sma_period = self.params.long_sma_period
             self.subscribe_trades = self.params.subscribe_trades
             self.subscribe_ticker = self.params.subscribe_ticker
+            self.order_amount = self.params.order_amount
         elif isinstance(self.params, dict):
             # If config_loader passed a dict (current setup), or for direct instantiation with a dict.
             # We can choose to validate it here using the strategy's own model.
@@ -77,6 +81,7 @@ class SimpleSMAStrategy(Strategy):
                 self.long_sma_period = validated_params_model.long_sma_period
                 self.subscribe_trades = validated_params_model.subscribe_trades
                 self.subscribe_ticker = validated_params_model.subscribe_ticker
+                self.order_amount = validated_params_model.order_amount
                 # Replace self.params with the validated model instance for consistency
                 self.params = validated_params_model
             except ValidationError as e:
@@ -89,9 +94,13 @@ class SimpleSMAStrategy(Strategy):
             raise TypeError(f"策略 [{self.name}] 的参数类型未知: {type(self.params)}")
 
 
-        self.close_prices: Dict[str, List[float]] = {}
-        self.short_sma_values: Dict[str, List[Optional[float]]] = {}
-        self.long_sma_values: Dict[str, List[Optional[float]]] = {}
+        # 均线优先来自引擎的共享指标注册表 (on_start 或首根K线时获取)；没有注册表时 (例如单独调用 on_bar)
+        # 使用策略自己的 SMA 实例。这里只保存上一根K线的均线值用于判断交叉
+        self.short_smas: Dict[str, Any] = {}
+        self.long_smas: Dict[str, Any] = {}
+        self._local_sma_symbols: set = set() # 使用自有 SMA 的交易对，由 on_bar 自行推进
+        self.prev_short_sma: Dict[str, Optional[float]] = {}
+        self.prev_long_sma: Dict[str, Optional[float]] = {}
 
         print(f"策略 [{self.name}] 初始化完成。")
         print(f"  交易对: {self.symbols}")
@@ -103,10 +112,23 @@ class SimpleSMAStrategy(Strategy):
         if self.subscribe_ticker:
             print(f"  策略 [{self.name}] 已配置请求 Ticker 数据流。")
 
-    def _calculate_sma(self, prices: List[float], period: int) -> Optional[float]:
-        if len(prices) < period:
-            return None
-        return np.mean(prices[-period:])
+    def on_start(self):
+        super().on_start()
+        for symbol in self.symbols:
+            self._attach_smas(symbol)
+
+    def _attach_smas(self, symbol: str):
+        """从引擎的指标注册表获取均线；没有关联引擎或引擎没有注册表时创建自有的 SMA。"""
+        if getattr(self._engine, 'indicators', None) is not None:
+            self.short_smas[symbol] = self.acquire_indicator(symbol, 'sma', period=self.short_sma_period)
+            self.long_smas[symbol] = self.acquire_indicator(symbol, 'sma', period=self.long_sma_period)
+            self._local_sma_symbols.discard(symbol)
+        else:
+            self.short_smas[symbol] = SMA(self.short_sma_period)
+            self.long_smas[symbol] = SMA(self.long_sma_period)
+            self._local_sma_symbols.add(symbol)
+        self.prev_short_sma[symbol] = None
+        self.prev_long_sma[symbol] = None
 
     async def on_bar(self, symbol: str, bar: pd.Series):
         # ... (rest of on_bar logic remains the same as previous version) ...
@@ -114,25 +136,23 @@ class SimpleSMAStrategy(Strategy):
         timestamp_ms = bar['timestamp']
         timestamp_dt = pd.to_datetime(timestamp_ms, unit='ms')
 
-        if symbol not in self.close_prices:
-            self.close_prices[symbol] = []
-            self.short_sma_values[symbol] = []
-            self.long_sma_values[symbol] = []
-
-        self.close_prices[symbol].append(close_price)
-
-        short_sma = self._calculate_sma(self.close_prices[symbol], self.short_sma_period)
-        long_sma = self._calculate_sma(self.close_prices[symbol], self.long_sma_period)
-
-        self.short_sma_values[symbol].append(short_sma)
-        self.long_sma_values[symbol].append(long_sma)
-
-        if short_sma is None or long_sma is None or len(self.short_sma_values[symbol]) < 2:
+        if symbol not in self.short_smas: # 未经 on_start (例如单独使用策略) 时在首根K线上获取均线
+            self._attach_smas(symbol)
+        if symbol in self._local_sma_symbols:
+            short_sma = self.short_smas[symbol].update(close_price)
+            long_sma = self.long_smas[symbol].update(close_price)
+        else: # 引擎在调用 on_bar 之前已用这根K线更新了共享指标
+            short_sma = self.short_smas[symbol].value
+            long_sma = self.long_smas[symbol].value
+
+        prev_short_sma = self.prev_short_sma[symbol]
+        prev_long_sma = self.prev_long_sma[symbol]
+        self.prev_short_sma[symbol] = short_sma
+        self.prev_long_sma[symbol] = long_sma
+
+        if short_sma is None or long_sma is None:
             return
 
-        prev_short_sma = self.short_sma_values[symbol][-2]
-        prev_long_sma = self.long_sma_values[symbol][-2]
-
         if prev_short_sma is None or prev_long_sma is None: # Ensure previous SMAs are also valid
             return
 
@@ -140,21 +160,40 @@ class SimpleSMAStrategy(Strategy):
         if prev_short_sma <= prev_long_sma and short_sma > long_sma:
             print(f"策略 [{self.name}] ({symbol}): === 买入信号 (金叉) @ {timestamp_dt.strftime('%Y-%m-%d %H:%M:%S')} ===")
             print(f"  价格: {close_price}, ShortSMA: {short_sma:.2f}, LongSMA: {long_sma:.2f}")
-            # Add actual buy order logic here if desired, e.g.
-            # if self.engine and self.engine.order_executor.exchange.apiKey:
-            #     try: await self.buy(symbol, amount_to_buy, close_price)
-            #     except Exception as e: print(f"Error buying: {e}")
+            if self.order_amount:
+                amount_to_buy = self.order_amount - self.get_position(symbol)
+                if amount_to_buy > 0:
+                    await self.buy(symbol, amount_to_buy, order_type='market')
 
         # Death Cross
         elif prev_short_sma >= prev_long_sma and short_sma < long_sma:
             print(f"策略 [{self.name}] ({symbol}): === 卖出信号 (死叉) @ {timestamp_dt.strftime('%Y-%m-%d %H:%M:%S')} ===")
             print(f"  价格: {close_price}, ShortSMA: {short_sma:.2f}, LongSMA: {long_sma:.2f}")
-            # Add actual sell order logic here
-            # if self.engine and self.engine.order_executor.exchange.apiKey:
-            #     current_pos = self.get_position(symbol)
-            #     if current_pos > 0:
-            #         try: await self.sell(symbol, current_pos, close_price)
-            #         except Exception as e: print(f"Error selling: {e}")
+            if self.order_amount:
+                current_pos = self.get_position(symbol)
+                if current_pos > 0:
+                    await self.sell(symbol, current_pos, order_type='market')
+
+    def generate_signals(self, df: pd.DataFrame) -> pd.Series:
+        """
+        Vectorized equivalent of on_bar for the VectorizedBacktester.
+        Target position is `order_amount` after a golden cross and 0 after a death cross,
+        evaluated on each bar's close exactly like the event-driven path.
+        """
+        close = df['close']
+        short_sma = close.rolling(self.short_sma_period).mean()
+        long_sma = close.rolling(self.long_sma_period).mean()
+        prev_short, prev_long = short_sma.shift(1), long_sma.shift(1)
+
+        # NaN comparisons are False, so warm-up bars never trigger (same as the None checks in on_bar)
+        golden = (prev_short <= prev_long) & (short_sma > long_sma)
+        death = (prev_short >= prev_long) & (short_sma < long_sma)
+
+        amount = self.order_amount or 0.0
+        target = pd.Series(np.nan, index=df.index)
+        target[golden] = amount
+        target[death] = 0.0
+        return target.ffill().fillna(0.0)
 
     # on_order_update, on_fill, on_stream_failed can use base class implementations or be overridden
     # For this simple strategy, we'll let them use base class pass-throughs or simple logging.
@@ -236,6 +275,20 @@ if __name__ == '__main__':
     except ValueError as e:
         print(f"  Caught ValueError in on_init (EXPECTED): {e}")
 
+    print("\nTest standalone on_bar (no engine, no on_start):")
+    import asyncio
+    rng = np.random.default_rng(5)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 300)))
+    bars = pd.DataFrame({'timestamp': 1_672_531_200_000 + np.arange(300) * 3_600_000, 'close': closes})
+
+    async def feed_bars():
+        for _, bar in bars.iterrows():
+            await test_strat_valid.on_bar("BTC/USDT", bar)
+    asyncio.run(feed_bars())
+    expected = (bars['close'].rolling(7).mean().iloc[-1], bars['close'].rolling(14).mean().iloc[-1])
+    got = (test_strat_valid.prev_short_sma["BTC/USDT"], test_strat_valid.prev_long_sma["BTC/USDT"])
+    print(f"  SMAs match pandas rolling mean: {np.allclose(got, expected)}")
+
     # If config_loader passes a dict, and SimpleSMAStrategy expects a Pydantic model,
     # then direct attribute access (e.g., self.params.short_sma_period) would fail in on_init
     # if the fallback dict access self.params.get() was removed.
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 import pandas as pd
+import numpy as np
 from typing import List, Dict, Optional, Type, Any, Union # Added Any, Union
 from pydantic import BaseModel # For type hinting get_params_model
 
@@ -31,6 +32,7 @@ class Strategy(ABC):
         self._engine = engine
         self._active = False
         self.position: Dict[str, float] = {}
+        self._indicator_handles: list = [] # 从引擎指标注册表获取的共享指标，停止时释放
 
         # self.params can now be a Pydantic model instance or a dict
         self.params: Union[Dict[str, Any], BaseModel] = params if params is not None else {}
@@ -62,6 +64,17 @@ class Strategy(ABC):
     def active(self) -> bool:
         return self._active
 
+    @active.setter
+    def active(self, value: bool):
+        """设置活动状态。状态变化时通知引擎 (如果引擎维护路由表)，使其立即更新数据路由。"""
+        value = bool(value)
+        if value == self._active:
+            return
+        self._active = value
+        notify = getattr(self._engine, 'on_strategy_active_changed', None)
+        if notify is not None:
+            notify(self)
+
     def on_init(self):
         """
         策略初始化时调用。
@@ -75,7 +88,7 @@ class Strategy(ABC):
         """
         策略引擎启动此策略实例时调用。
         """
-        self._active = True
+        self.active = True
         print(f"策略 [{self.name}]：正在执行 on_start。")
         pass
 
@@ -83,7 +96,7 @@ class Strategy(ABC):
         """
         策略引擎停止此策略实例时调用。
         """
-        self._active = False
+        self.active = False
         print(f"策略 [{self.name}]：正在执行 on_stop。")
         pass
 
@@ -98,6 +111,50 @@ class Strategy(ABC):
         """
         pass
 
+    async def on_bar_update(self, symbol: str, bar: pd.Series):
+        """
+        (可选) 当前正在形成的K线发生变化时调用。
+        只有在策略引擎以 emit_bar_updates=True 创建时才会被调用；on_bar 只接收已收盘的K线。
+
+        :param symbol: 交易对。
+        :param bar: 尚未收盘的K线，结构与 on_bar 中的 bar 相同，后续可能继续更新。
+        """
+        pass
+
+    def generate_signals(self, df: pd.DataFrame) -> Union[pd.Series, np.ndarray]:
+        """
+        (可选) 向量化信号接口，供 backtest.vectorized.VectorizedBacktester 使用。
+        一次性接收某个交易对的全部K线，返回每根K线收盘后的目标持仓。
+
+        :param df: 单个交易对的K线 DataFrame，列为 'timestamp', 'open', 'high', 'low', 'close', 'volume'，
+                   按时间升序排列。df.attrs['symbol'] 为对应的交易对。
+        :return: 与 df 等长的目标持仓序列 (基础货币数量，正为多，负为空)。
+                 向量化引擎在目标持仓变化的K线上以收盘价调仓。
+        """
+        raise NotImplementedError(f"策略 [{self.name}] ({type(self).__name__}) 未实现 generate_signals，无法用于向量化回测。")
+
+    # --- 共享指标 ---
+    def acquire_indicator(self, symbol: str, name: str, **params):
+        """
+        从引擎的指标注册表获取一个共享指标 (见 indicators.IndicatorRegistry)，通常在 on_start 中调用。
+        相同 (交易对, 周期, 指标, 参数) 的指标在所有策略间只计算一次，引擎在调用 on_bar 之前已用当前K线更新它。
+
+        :param symbol: 交易对。
+        :param name: 指标名称，例如 'sma', 'ema', 'std', 'atr', 'rsi'。
+        :param params: 指标参数，例如 period=20。
+        :return: 只读的 IndicatorHandle，通过 .value 读取最新值 (数据不足时为None)。
+        """
+        handle = self.engine.indicators.acquire(symbol, self.timeframe, name, **params)
+        self._indicator_handles.append(handle)
+        return handle
+
+    def release_indicators(self):
+        """释放本策略获取的全部共享指标。引擎在策略停止 (on_stop 之后) 时调用。"""
+        handles, self._indicator_handles = self._indicator_handles, []
+        if handles and self._engine is not None:
+            for handle in handles:
+                self._engine.indicators.release(handle)
+
     # --- 交易辅助方法 ---
     # 这些方法是对 StrategyEngine 中交易方法的封装，方便策略直接调用
 
@@ -2,12 +2,14 @@ import asyncio
 import pandas as pd
 from collections import defaultdict
 import ccxt.pro as ccxtpro
-from typing import List, Dict, Any, Optional, Tuple, Callable
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterable
 
 from data_fetcher import DataFetcher
 from account_manager import AccountManager
 from order_executor import OrderExecutor
 from strategy import Strategy
+from bar_tracker import OHLCVBarTracker
+from indicators import IndicatorRegistry
 from risk_manager import RiskManagerBase
 from config_models import StrategyConfigItem # Assuming this is where on_stream_failure_action is defined for a strategy config
 
@@ -18,7 +20,12 @@ class StrategyEngine:
                  order_executor: OrderExecutor,
                  risk_manager: RiskManagerBase,
                  strategy_configs: Optional[List[StrategyConfigItem]] = None, # Pass full config items
+                 emit_bar_updates: bool = False,
                  **kwargs):
+        """
+        :param emit_bar_updates: 为True时，正在形成的K线每次变化都会调用策略的 on_bar_update；
+                                 on_bar 始终只在K线收盘时调用一次。
+        """
         self.data_fetcher = data_fetcher
         self.account_manager = account_manager
         self.order_executor = order_executor
@@ -32,7 +39,16 @@ class StrategyEngine:
         self._system_tasks: List[asyncio.Task] = []
 
         self._market_data_cache: Dict[Tuple[str, str, str], Any] = {}
+        self.emit_bar_updates = emit_bar_updates
+        self._bar_trackers: Dict[Tuple[str, str], OHLCVBarTracker] = {}
+        self.indicators = IndicatorRegistry() # 策略间共享的指标，每根收盘K线只计算一次
         self._stream_subscriptions: Dict[Tuple[str, str], set[str]] = defaultdict(set)
+        # (symbol, stream_id) -> 当前活动的订阅策略 (按添加顺序)，由 _rebuild_routing_table 维护，分发时直接遍历。
+        # 策略的 active 状态一变化 (Strategy.active setter -> on_strategy_active_changed) 就会重建
+        self._routing_table: Dict[Tuple[str, str], Tuple[Strategy, ...]] = {}
+        self._strategy_order: Dict[str, int] = {} # 策略名 -> 添加顺序，路由表按此排序
+        self._strategies_by_name: Dict[str, Strategy] = {}
+        self._stream_keys_by_strategy: Dict[str, set] = defaultdict(set) # 策略名 -> 它订阅的 (symbol, stream_id)
         self.order_to_strategy_map: Dict[str, Strategy] = {}
 
         print("策略引擎初始化完毕 (集成风险管理, 支持多类型数据流, 可配置流失败响应)。")
@@ -43,6 +59,8 @@ class StrategyEngine:
 
         strategy_instance.engine = self
         self.strategies.append(strategy_instance)
+        self._strategy_order.setdefault(strategy_instance.name, len(self._strategy_order))
+        self._strategies_by_name[strategy_instance.name] = strategy_instance
         if strategy_config_item: # Store the config item if provided
             self.strategy_config_map[strategy_instance.name] = strategy_config_item
 
@@ -72,49 +90,99 @@ class StrategyEngine:
                 self._stream_subscriptions[(symbol, 'ticker')].add(strategy_instance.name)
                 print(f"  策略 [{strategy_instance.name}] 请求订阅 Ticker for {symbol}")
 
+        for symbol in strategy_instance.symbols:
+            for stream_id in (f"ohlcv:{strategy_instance.timeframe}", 'trades', 'ticker'):
+                if strategy_instance.name in self._stream_subscriptions.get((symbol, stream_id), ()):
+                    self._stream_keys_by_strategy[strategy_instance.name].add((symbol, stream_id))
+        self._rebuild_routing_table(self._stream_keys_by_strategy[strategy_instance.name])
+
+    def _rebuild_routing_table(self, stream_keys: Optional[Iterable[Tuple[str, str]]] = None):
+        """
+        根据订阅关系和策略的活动状态重建路由表。
+        只在策略添加或活动状态变化时调用，数据分发时不再遍历全部策略。
+
+        :param stream_keys: 只重建这些 (symbol, stream_id) 的路由；默认重建全部。
+        """
+        if stream_keys is None:
+            self._routing_table = {}
+            stream_keys = self._stream_subscriptions.keys()
+        order, by_name = self._strategy_order, self._strategies_by_name
+        for stream_key in stream_keys:
+            strat_names = self._stream_subscriptions.get(stream_key, ())
+            routed = sorted((by_name[n] for n in strat_names if n in by_name and by_name[n].active),
+                            key=lambda s: order[s.name])
+            if routed:
+                self._routing_table[stream_key] = tuple(routed)
+            else:
+                self._routing_table.pop(stream_key, None)
+
+    def on_strategy_active_changed(self, strategy: Strategy):
+        """Strategy.active 变化时由策略调用 (包括策略在自身回调中启动或停止自己)，只重建它订阅的数据流的路由。"""
+        if self._strategies_by_name.get(strategy.name) is strategy:
+            self._rebuild_routing_table(self._stream_keys_by_strategy.get(strategy.name, ()))
+
+    async def _deactivate_strategy(self, strategy: Strategy):
+        """停止单个策略 (调用其 on_stop) 并将其从路由表中移除。"""
+        if strategy.active:
+            strategy.active = False # 立即从路由表中移除
+            try:
+                result = strategy.on_stop()
+                if asyncio.iscoroutine(result): await result
+            except Exception as e_stop: print(f"  停止策略 [{strategy.name}] 时发生错误: {e_stop}")
+            strategy.release_indicators()
+
+    @staticmethod
+    def _ohlcv_to_series(ohlcv_data: list) -> pd.Series:
+        return pd.Series({
+            'timestamp': ohlcv_data[0], 'open': ohlcv_data[1], 'high': ohlcv_data[2],
+            'low': ohlcv_data[3], 'close': ohlcv_data[4], 'volume': ohlcv_data[5]
+        })
 
     async def _handle_ohlcv_from_stream(self, symbol: str, timeframe: str, ohlcv_list: list):
-        for ohlcv_data in ohlcv_list:
-            if not ohlcv_data: continue
-            try:
-                bar_series = pd.Series({
-                    'timestamp': ohlcv_data[0], 'open': ohlcv_data[1], 'high': ohlcv_data[2],
-                    'low': ohlcv_data[3], 'close': ohlcv_data[4], 'volume': ohlcv_data[5]
-                })
-                stream_id = f"ohlcv:{timeframe}"
-                # cache_key = (symbol, stream_id, 'latest_bar_ts') # Not used currently
-                # last_processed_ts = self._market_data_cache.get(cache_key)
-                # if last_processed_ts is None or bar_series['timestamp'] > last_processed_ts:
-                # self._market_data_cache[cache_key] = bar_series['timestamp']
-                subscribed_strategy_names = self._stream_subscriptions.get((symbol, stream_id), set())
-                for strategy in self.strategies:
-                    if strategy.name in subscribed_strategy_names and strategy.active:
-                        await strategy.on_bar(symbol, bar_series.copy())
-            except Exception as e:
-                print(f"引擎：处理OHLCV数据时发生错误 ({symbol}@{timeframe}): {e}")
+        try:
+            # watch_ohlcv 每次返回整个K线缓存：由 tracker 去重，只把新收盘的K线交给 on_bar
+            tracker = self._bar_trackers.get((symbol, timeframe))
+            if tracker is None:
+                tracker = self._bar_trackers[(symbol, timeframe)] = OHLCVBarTracker(symbol, timeframe)
+            closed_bars, forming_bar = tracker.update([c for c in ohlcv_list if c])
+
+            route_key = (symbol, f"ohlcv:{timeframe}")
+            for ohlcv_data in closed_bars:
+                self.indicators.update(symbol, timeframe, ohlcv_data[0], ohlcv_data[2], ohlcv_data[3], ohlcv_data[4])
+                bar_series = self._ohlcv_to_series(ohlcv_data)
+                # 每根K线重新取路由：策略在回调中停止/启动时路由表已被重建。
+                # 遍历期间 (await 时) 被其他任务或前面的策略停止的策略直接跳过
+                for strategy in self._routing_table.get(route_key, ()):
+                    if not strategy.active: continue
+                    await strategy.on_bar(symbol, bar_series.copy())
+
+            if self.emit_bar_updates and forming_bar is not None:
+                bar_series = self._ohlcv_to_series(forming_bar)
+                for strategy in self._routing_table.get(route_key, ()):
+                    if not strategy.active: continue
+                    await strategy.on_bar_update(symbol, bar_series.copy())
+        except Exception as e:
+            print(f"引擎：处理OHLCV数据时发生错误 ({symbol}@{timeframe}): {e}")
 
     async def _handle_trades_from_stream(self, symbol: str, trades_list: list):
         try:
-            subscribed_strategy_names = self._stream_subscriptions.get((symbol, 'trades'), set())
-            if subscribed_strategy_names:
-                for strategy in self.strategies:
-                    if strategy.name in subscribed_strategy_names and strategy.active:
-                        await strategy.on_trade(symbol, trades_list)
+            for strategy in self._routing_table.get((symbol, 'trades'), ()):
+                if not strategy.active: continue
+                await strategy.on_trade(symbol, trades_list)
         except Exception as e: print(f"引擎：处理Trades数据时发生错误 ({symbol}): {e}")
 
     async def _handle_ticker_from_stream(self, symbol: str, ticker_data: dict):
         try:
-            subscribed_strategy_names = self._stream_subscriptions.get((symbol, 'ticker'), set())
-            if subscribed_strategy_names:
-                for strategy in self.strategies:
-                    if strategy.name in subscribed_strategy_names and strategy.active:
-                        await strategy.on_ticker(symbol, ticker_data)
+            for strategy in self._routing_table.get((symbol, 'ticker'), ()):
+                if not strategy.active: continue
+                await strategy.on_ticker(symbol, ticker_data)
         except Exception as e: print(f"引擎：处理Ticker数据时发生错误 ({symbol}): {e}")
 
     async def _handle_order_update_from_stream(self, order_data: dict):
         order_id = order_data.get('id')
         if not order_id: return
         strategy_instance = self.order_to_strategy_map.get(order_id)
+        if order_data.get('filled'): self.account_manager.apply_fill(order_data) # 与策略状态无关，余额都已变化
         if not strategy_instance or not strategy_instance.active: return
         try:
             await strategy_instance.on_order_update(order_data.copy())
@@ -156,10 +224,7 @@ class StrategyEngine:
             strategies_to_notify_or_stop = [s for s in self.strategies if s.active]
             print(f"  关键订单流失败，将影响所有 {len(strategies_to_notify_or_stop)} 个活动策略。")
         elif affected_symbol_for_lookup:
-            subscribed_strategy_names = self._stream_subscriptions.get((affected_symbol_for_lookup, stream_id_lookup), set())
-            for strat_name in subscribed_strategy_names:
-                strategy_instance = next((s for s in self.strategies if s.name == strat_name and s.active), None)
-                if strategy_instance: strategies_to_notify_or_stop.append(strategy_instance)
+            strategies_to_notify_or_stop = list(self._routing_table.get((affected_symbol_for_lookup, stream_id_lookup), ()))
 
         if not strategies_to_notify_or_stop and failed_stream_type_key != 'ORDERS':
             print(f"  未找到活动策略订阅失败的流 {stream_id_lookup} for {affected_symbol_for_lookup}。")
@@ -185,12 +250,7 @@ class StrategyEngine:
 
             if action == 'stop_strategy':
                 print(f"  根据配置，正在停止策略 [{strat_instance.name}]...")
-                if strat_instance.active:
-                    strat_instance._active = False
-                    try:
-                        result = strat_instance.on_stop()
-                        if asyncio.iscoroutine(result): await result
-                    except Exception as e_stop: print(f"  停止策略 [{strat_instance.name}] 时发生错误: {e_stop}")
+                await self._deactivate_strategy(strat_instance)
             elif action == 'log_only':
                 print(f"  根据配置，策略 [{strat_instance.name}] 将仅记录日志并继续运行（除非其on_stream_failed自行停止）。")
             elif action == 'stop_engine' and failed_stream_type_key == 'ORDERS': # Only stop engine for critical global stream
@@ -199,16 +259,18 @@ class StrategyEngine:
                 return # No need to process other strategies if engine is stopping
             elif action == 'stop_engine':
                  print(f"  根据配置，数据流 {failed_stream_type_key} for {affected_symbol_for_lookup} 失败，但 'stop_engine' 行为通常保留给全局流。将此视为 'stop_strategy'。")
-                 if strat_instance.active: strat_instance._active = False; await strat_instance.on_stop()
+                 await self._deactivate_strategy(strat_instance)
 
 
     async def start(self):
         if self._running: print("策略引擎已经在运行中。"); return
         print("正在启动策略引擎 (多数据流模式, 含风险管理, 可配置流失败响应)...")
         self._running = True; self._system_tasks = []; self.order_to_strategy_map = {}
+        self._bar_trackers = {}
         for strategy in self.strategies:
             result = strategy.on_start();
             if asyncio.iscoroutine(result): await result
+        self._rebuild_routing_table()
 
         tasks_to_create_info = defaultdict(list)
         for (symbol, stream_id_full), strat_names in self._stream_subscriptions.items():
@@ -256,6 +318,10 @@ class StrategyEngine:
                 if task: self._system_tasks.append(task)
             except Exception as e: print(f"引擎：启动全局订单流时发生错误: {e}")
         else: print("引擎：OrderExecutor 未配置API Key 或交易所不支持 watch_orders，订单事件将不会被实时处理。")
+        try:
+            task = await self.account_manager.start_balance_sync()
+            if task: self._system_tasks.append(task)
+        except Exception as e: print(f"引擎：启动余额同步时发生错误: {e}")
         active_tasks_count = len([t for t in self._system_tasks if t and not t.done()])
         print(f"策略引擎已启动，共监控 {active_tasks_count} 个实时流。")
 
@@ -275,6 +341,7 @@ class StrategyEngine:
                 if isinstance(result, Exception) and not isinstance(result, asyncio.CancelledError):
                     print(f"  - 流任务 #{i} 异常结束: {type(result).__name__}: {result}")
         self._system_tasks = []
+        if hasattr(self.account_manager, 'stop_balance_sync'): await self.account_manager.stop_balance_sync()
         if hasattr(self.data_fetcher, 'stop_all_streams'): await self.data_fetcher.stop_all_streams()
         if hasattr(self.order_executor, 'stop_all_order_streams'): await self.order_executor.stop_all_order_streams()
 
@@ -282,13 +349,15 @@ class StrategyEngine:
         for strategy in self.strategies:
             result = strategy.on_stop() # Assuming on_stop is not always async, or handle appropriately
             if asyncio.iscoroutine(result): await result
+            strategy.release_indicators()
+        self._rebuild_routing_table()
         print("策略引擎已停止。")
 
     async def create_order(self, symbol: str, side: str, order_type: str, amount: float, price: float = None, params={}, strategy_name: str = "UnknownStrategy"):
         calling_strategy = next((s for s in self.strategies if s.name == strategy_name), None)
         if not calling_strategy: print(f"引擎错误：无法找到名为 '{strategy_name}' 的策略实例。"); return None
         # print(f"引擎：策略 [{strategy_name}] 请求创建订单: {side.upper()} {amount} {symbol} @ {price or 'Market'}")
-        balance_data = await self.account_manager.get_balance()
+        balance_data = await self.account_manager.get_cached_balance() # 进程内快照，过期时才会回退到 fetch_balance
         available_balance = 0.0
         quote_currency = symbol.split('/')[-1] if '/' in symbol else "USDT"
         if balance_data and balance_data.get('free') and quote_currency in balance_data['free']:
@@ -314,6 +383,7 @@ class StrategyEngine:
         except Exception as e: print(f"引擎：OrderExecutor下单时发生错误: {e}"); return None
         if order_object and 'id' in order_object:
             self.order_to_strategy_map[order_object['id']] = calling_strategy
+            if order_object.get('filled'): self.account_manager.apply_fill(order_object) # 例如立即成交的市价单
             # print(f"引擎：订单 {order_object['id']} 已创建并映射到策略 [{strategy_name}]。")
         # else: print(f"引擎：订单创建失败或未返回ID。") # Too verbose
         return order_object
@@ -325,6 +395,11 @@ class StrategyEngine:
     async def get_account_balance(self): return await self.account_manager.get_balance()
 
 if __name__ == '__main__':
+    import os
+    from risk_manager import BasicRiskManager
+    from exchange_pool import default_exchange_pool
+    from markets_cache import MarketsCache
+    default_exchange_pool.markets_cache = MarketsCache() # 重启后直接使用磁盘上的市场数据，立即开始订阅
     # ... (AllStreamDemoStrategy and run_multistream_engine_example remain for testing) ...
     class AllStreamDemoStrategy(Strategy):
         def on_init(self):
@@ -364,9 +439,11 @@ if __name__ == '__main__':
 
         data_fetcher=None; account_manager=None; order_executor=None; engine=None # Init for finally block
         try:
-            data_fetcher = DataFetcher(exchange_id=exchange_id)
-            account_manager = AccountManager(exchange_id=exchange_id, api_key=api_key, secret_key=secret, password=password)
-            order_executor = OrderExecutor(exchange_id=exchange_id, api_key=api_key, secret_key=secret, password=password, sandbox_mode=True)
+            # 三个组件从同一个池中获取交易所实例：共用连接和限速器，市场数据只加载一次
+            credentials = {k: v for k, v in {'apiKey': api_key, 'secret': secret, 'password': password}.items() if v}
+            data_fetcher = DataFetcher(exchange_id=exchange_id, config=credentials, exchange_pool=default_exchange_pool, sandbox_mode=True)
+            account_manager = AccountManager(exchange_id=exchange_id, config=credentials, exchange_pool=default_exchange_pool, sandbox_mode=True)
+            order_executor = OrderExecutor(exchange_id=exchange_id, config=credentials, sandbox_mode=True, exchange_pool=default_exchange_pool)
             risk_manager = BasicRiskManager(params=global_risk_p)
 
             # Assuming config_loader.py and config_models.py are set up for on_stream_failure_action
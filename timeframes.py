@@ -0,0 +1,18 @@
+"""K线周期相关的通用工具 (下载器、回测引擎等共用)。"""
+
+_TIMEFRAME_UNIT_MS = {
+    's': 1000,
+    'm': 60 * 1000,
+    'h': 60 * 60 * 1000,
+    'd': 24 * 60 * 60 * 1000,
+    'w': 7 * 24 * 60 * 60 * 1000,
+    'M': 30 * 24 * 60 * 60 * 1000, # 与 ccxt.parse_timeframe 的约定一致
+    'y': 365 * 24 * 60 * 60 * 1000,
+}
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """把 '1m', '4h', '1d' 这样的K线周期转换为毫秒数。"""
+    amount, unit = timeframe[:-1], timeframe[-1]
+    if unit not in _TIMEFRAME_UNIT_MS or not amount.isdigit():
+        raise ValueError(f"无法识别的K线周期: '{timeframe}'")
+    return int(amount) * _TIMEFRAME_UNIT_MS[unit]